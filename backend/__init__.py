@@ -3,21 +3,54 @@ import os
 from flask import Flask
 
 from backend.config import Config
-from backend.extensions import cors, db, jwt, limiter, mail, migrate, talisman
+from backend.extensions import (
+    apple_jwks,
+    cors,
+    db,
+    google_jwks,
+    jwt,
+    limiter,
+    mail,
+    mail_queue,
+    migrate,
+    password_hasher,
+    revocation_cache,
+    stripe_gateway,
+    talisman,
+    verified_tokens,
+)
 
 
-def create_app(config_class: Config):
+def create_app(config_class: type[Config] | str):
 
     app = Flask(
         __name__,
     )
 
     app.config.from_object(config_class)
+    if not app.config.get("SQLALCHEMY_DATABASE_URI"):
+        raise ValueError("DATABASE_URL environment variable is required for production")
     jwt.init_app(app)
+    from backend.src.db_engine import configure_engine, instrument_engines
+    from backend.src.replica import configure_replica
+
+    configure_engine(app)
+    configure_replica(app)
     db.init_app(app)
+    instrument_engines(app, db)
+    from backend.src.metrics import init_metrics
+
+    init_metrics(app)
     migrations_dir = os.path.join(app.root_path, "migrations")
     migrate.init_app(app, db, directory=migrations_dir)
     mail.init_app(app)
+    mail_queue.init_app(app)
+    revocation_cache.init_app(app)
+    password_hasher.init_app(app)
+    stripe_gateway.init_app(app)
+    apple_jwks.init_app(app)
+    google_jwks.init_app(app)
+    verified_tokens.init_app(app)
 
     # Initialize CORS with configurable origins and credentials support
     cors.init_app(
@@ -27,6 +60,9 @@ def create_app(config_class: Config):
     )
 
     # Initialize security extensions
+    from backend.src.limiter_storage import configure_storage
+
+    configure_storage(app)
     limiter.init_app(app)
     talisman.init_app(
         app,
@@ -34,10 +70,28 @@ def create_app(config_class: Config):
         content_security_policy=None,  # Start with a permissive CSP
     )
 
+    from backend.src.http_caching import init_compression
+    from backend.src.json_provider import init_json
+
+    init_compression(app)
+    init_json(app)
+
     # Import blueprints
     from backend.routes import api_bp, base_bp
 
     # Register blueprints
     app.register_blueprint(api_bp)
     app.register_blueprint(base_bp)
+
+    from backend.cli import register_commands
+
+    register_commands(app)
+
+    from backend.src.blocklist_pruner import init_pruner
+
+    init_pruner(app)
+
+    from backend.src.webhook_queue import init_webhook_workers
+
+    init_webhook_workers(app)
     return app
@@ -3,20 +3,14 @@ import os
 from dotenv import load_dotenv
 
 from backend import create_app
-from backend.config import DevelopmentConfig, ProductionConfig, TestingConfig
+from backend.config import CONFIGS
 
 load_dotenv(override=True)
 
 
 def deploy_app():
-    config_map = {
-        "dev": DevelopmentConfig,
-        "prod": ProductionConfig,
-        "test": TestingConfig,
-    }
-
     env = os.environ.get("ENV", "dev")
-    app = create_app(config_map[env]())
+    app = create_app(CONFIGS[env])
     return app
 
 
@@ -0,0 +1,115 @@
+"""
+Benchmarks for the backend hot paths.
+
+Each module runs standalone against a throwaway SQLite database, e.g.::
+
+    python -m backend.benchmarks.revocation_cache
+
+and prints its results as JSON.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from backend import create_app
+from backend.config import TestingConfig
+from backend.extensions import db
+
+
+def bench_app(**overrides):
+    """Create an app bound to a fresh file-backed SQLite database."""
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    settings = {
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(workdir, "bench.db"),
+        "RATELIMIT_ENABLED": False,
+        **overrides,
+    }
+    config = type("BenchConfig", (TestingConfig,), settings)
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@contextmanager
+def count_queries(engine, table=None):
+    """
+    Count statements sent to ``engine``, optionally only those naming ``table``.
+
+    Yields a dict with the running ``count`` and the matching ``statements``.
+    """
+    counter = {"count": 0, "statements": []}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if table is None or table in statement:
+            counter["count"] += 1
+            counter["statements"].append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class LocalServer:
+    """
+    Serve ``self.wsgi_app`` on a free local port for the duration of a
+    ``with`` block; the base URL is ``self.url``. Stand-ins for third-party
+    APIs subclass this.
+    """
+
+    def __init__(self):
+        self._server = make_server(
+            "127.0.0.1", 0, self.wsgi_app, threaded=True, request_handler=_QuietHandler
+        )
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wsgi_app(self, environ, start_response):
+        raise NotImplementedError
+
+
+def latency_summary(latencies, seconds):
+    """
+    Throughput and latency percentiles (ms) of ``latencies``, per-operation
+    durations in seconds, completed within ``seconds``.
+    """
+    ordered = sorted(latencies)
+    if not ordered:
+        return {"ops": 0, "ops_per_sec": 0.0}
+
+    def percentile(p):
+        return round(ordered[min(int(p * len(ordered)), len(ordered) - 1)] * 1000, 3)
+
+    return {
+        "ops": len(ordered),
+        "ops_per_sec": round(len(ordered) / seconds, 1),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def report(name, results):
+    print(json.dumps({"benchmark": name, "results": results}, indent=2))
@@ -0,0 +1,75 @@
+"""
+Per-call cost of verifying a Sign in with Apple identity token, with the
+signing keys already cached: the previous flow (header parse, an unverified
+payload decode, then the verifying decode), a first sighting of a token under
+``validate_apple_token`` (header parse and one verifying decode) and a
+resubmitted token served from the verified-token memo.
+
+    python -m backend.benchmarks.apple_token [--calls 2000]
+"""
+
+import argparse
+import time
+
+import jwt
+
+from backend.benchmarks import bench_app, report
+from backend.benchmarks.fake_jwks import FakeJWKS
+from backend.extensions import apple_jwks, verified_tokens
+from backend.src.auth import validate_apple_token
+
+BUNDLE_ID = "com.example.bench"
+
+
+def _claims(n):
+    return {"iss": "https://appleid.apple.com", "aud": BUNDLE_ID, "sub": f"user-{n}"}
+
+
+def previous(token):
+    kid = jwt.get_unverified_header(token).get("kid")
+    key = apple_jwks.get_key(kid)
+    jwt.decode(token, options={"verify_signature": False})
+    return jwt.decode(
+        token,
+        key,
+        algorithms=["RS256"],
+        audience=BUNDLE_ID,
+        options={"verify_sub": True, "verify_exp": True},
+    )
+
+
+def _per_call_us(fn, tokens):
+    start = time.perf_counter()
+    for token in tokens:
+        fn(token)
+    return round((time.perf_counter() - start) / len(tokens) * 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    with FakeJWKS() as idp:
+        app = bench_app(
+            APPLE_JWKS_URL=idp.jwks_url, VERIFIED_TOKEN_CACHE_SIZE=args.calls
+        )
+        app.debug = False
+        tokens = [idp.sign(_claims(n)) for n in range(args.calls)]
+        with app.test_request_context():
+            apple_jwks.get_key(idp.kid)  # Warm the key cache
+            results = {
+                "previous_us": _per_call_us(previous, tokens),
+                "cold_us": _per_call_us(
+                    lambda token: validate_apple_token(token, BUNDLE_ID), tokens
+                ),
+            }
+            results["warm_us"] = _per_call_us(
+                lambda token: validate_apple_token(token, BUNDLE_ID), tokens
+            )
+            results["memo"] = dict(verified_tokens.stats)
+    report("apple_token", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Throughput and p50/p95/p99 latency of the auth hot paths.
+
+    python -m backend.benchmarks.auth [--concurrency 8] [--seconds 3]
+        [--database-url postgresql://localhost/bench]
+        [--output auth.json] [--baseline auth.json --threshold 0.25]
+
+``micro`` times single operations in one thread: issuing an access/refresh
+pair, verifying an access token, the blocklist check run for every
+protected request, the database lookup the revocation cache replaces, and
+a bcrypt verification. ``macro`` runs ``/auth/login``, ``/auth/me``,
+``/auth/refresh`` and ``/auth/logout`` for ``--seconds`` each, with
+``--concurrency`` threads each using its own test client. Only successful
+requests count towards throughput and latency. Logins the password hasher
+sheds with a ``503`` are reported as ``rejected``.
+
+Results go to a throwaway SQLite file unless ``--database-url`` names a
+local database. On a server database the tables are created and dropped
+again. Rate limiting is off. Save a run with ``--output`` and compare a
+later one with ``--baseline``. Any p50/p95/p99 or throughput that got
+worse by more than ``--threshold`` is listed under ``regressions``, and the
+exit status is 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+from flask_jwt_extended import create_access_token, decode_token, get_csrf_token
+
+from backend.benchmarks import bench_app, latency_summary, report
+from backend.extensions import db, password_hasher
+from backend.models.user import TokenBlocklist, User, check_if_token_revoked
+from backend.routes.auth import _issue_tokens
+
+PASSWORD = "correct horse battery staple"
+USERS = 50
+REVOKED = 1000
+COMPARED = ("ops_per_sec", "p50_ms", "p95_ms", "p99_ms")
+
+
+def setup(database_url, concurrency):
+    # Hash in the process pool, as in production, not inline as in tests
+    settings = {"WSGI_THREADS": concurrency, "PASSWORD_HASH_WORKERS": None}
+    if database_url:
+        settings["SQLALCHEMY_DATABASE_URI"] = database_url
+    app = bench_app(**settings)
+    app.debug = False
+    with app.app_context():
+        first = User(email="user0@example.com", name="User 0")
+        first.set_password(PASSWORD)
+        db.session.add(first)
+        # One bcrypt hash for everyone keeps setup fast; verifying costs the same
+        db.session.add_all(
+            User(
+                email=f"user{n}@example.com",
+                name=f"User {n}",
+                password_hash=first.password_hash,
+            )
+            for n in range(1, USERS)
+        )
+        for _ in range(REVOKED):
+            TokenBlocklist.revoke(decode_token(create_access_token("0"))["jti"])
+        db.session.commit()
+        users = db.session.execute(db.select(User.id, User.email)).all()
+    return app, users
+
+
+def _timed(fn, iterations):
+    for i in range(max(iterations // 10, 1)):  # Warm caches and connections
+        fn(i)
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    return latency_summary(latencies, sum(latencies))
+
+
+def micro(app, users, iterations, bcrypt_iterations):
+    with app.app_context():
+        user = db.session.get(User, users[0].id)
+        access, _ = _issue_tokens(user)
+        revoked = TokenBlocklist.query.first().jti
+        jtis = [decode_token(_issue_tokens(user)[0])["jti"] for _ in range(100)]
+        jtis[::10] = [revoked] * 10  # Mostly valid tokens, as in production
+
+        def blocklist_query(i):
+            db.session.query(TokenBlocklist.id).filter_by(jti=jtis[i % 100]).first()
+
+        return {
+            "issue_tokens": _timed(lambda i: _issue_tokens(user), iterations),
+            "verify_access_token": _timed(lambda i: decode_token(access), iterations),
+            "blocklist_check": _timed(
+                lambda i: check_if_token_revoked(None, {"jti": jtis[i % 100]}),
+                iterations,
+            ),
+            "blocklist_query": _timed(blocklist_query, iterations),
+            "bcrypt_verify": _timed(
+                lambda i: user.check_password(PASSWORD), bcrypt_iterations
+            ),
+        }
+
+
+def _sign_in(app, client, user):
+    """Give ``client`` a fresh token pair without paying for bcrypt."""
+    with app.app_context():
+        access, refresh = _issue_tokens(db.session.get(User, user.id))
+        client.set_cookie("access_token_cookie", access)
+        client.set_cookie("csrf_access_token", get_csrf_token(access))
+        client.set_cookie("refresh_token_cookie", refresh)
+        client.set_cookie("csrf_refresh_token", get_csrf_token(refresh))
+
+
+def _csrf(client, name):
+    return {"X-CSRF-TOKEN": client.get_cookie(name).value}
+
+
+def _login(client, user):
+    credentials = {"email": user.email, "password": PASSWORD}
+    return client.post("/api/auth/login", json=credentials)
+
+
+def _me(client, user):
+    return client.get("/api/auth/me")
+
+
+def _refresh(client, user):
+    return client.post("/api/auth/refresh", headers=_csrf(client, "csrf_refresh_token"))
+
+
+def _logout(client, user):
+    return client.post("/api/auth/logout", headers=_csrf(client, "csrf_access_token"))
+
+
+# Endpoint -> (request, whether each request needs a fresh token pair first)
+SCENARIOS = {
+    "POST /api/auth/login": (_login, False),
+    "GET /api/auth/me": (_me, False),
+    "POST /api/auth/refresh": (_refresh, False),
+    "POST /api/auth/logout": (_logout, True),
+}
+
+
+def macro(app, users, scenario, concurrency, seconds):
+    send, fresh_tokens = SCENARIOS[scenario]
+    latencies, statuses = [], []
+    start = threading.Barrier(concurrency + 1)
+
+    def worker(n):
+        client = app.test_client()
+        user = users[n % len(users)]
+        try:
+            _sign_in(app, client, user)
+        except BaseException:
+            start.abort()  # Fail the run instead of leaving the others waiting
+            raise
+        start.wait()
+        while time.monotonic() < deadline:
+            if fresh_tokens:
+                _sign_in(app, client, user)
+            began = time.perf_counter()
+            response = send(client, user)
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - began)
+                continue
+            statuses.append(response.status_code)
+            # Back off as a client would, rather than spin and starve bcrypt
+            retry_after = float(response.headers.get("Retry-After", 0))
+            time.sleep(min(retry_after, max(deadline - time.monotonic(), 0)))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + seconds
+    start.wait()
+    began = time.monotonic()
+    for thread in threads:
+        thread.join()
+    return {
+        **latency_summary(latencies, time.monotonic() - began),
+        # 503: shed by the password hasher when bcrypt is saturated
+        "rejected": statuses.count(503),
+        "errors": len(statuses) - statuses.count(503),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Metrics in ``results`` worse than in ``baseline`` by over ``threshold``."""
+    regressions = []
+    for section in ("micro", "macro"):
+        for name, current in results[section].items():
+            before = baseline.get(section, {}).get(name, {})
+            for metric in COMPARED:
+                old, new = before.get(metric), current.get(metric)
+                if not old or not new:
+                    continue
+                # Latency should not grow, throughput should not shrink
+                change = new / old - 1 if metric.endswith("_ms") else old / new - 1
+                if change > threshold:
+                    regressions.append(
+                        {
+                            "section": section,
+                            "name": name,
+                            "metric": metric,
+                            "baseline": old,
+                            "current": new,
+                            "worse_by": f"{change:.0%}",
+                        }
+                    )
+    return regressions
+
+
+def _meta(args, app):
+    commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(__file__),
+    ).stdout.strip()
+    with app.app_context():
+        database = db.engine.url.get_backend_name()
+    return {
+        "commit": commit or None,
+        "database": database,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "concurrency": args.concurrency,
+        "seconds": args.seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3, help="Per endpoint.")
+    parser.add_argument("--iterations", type=int, default=2000, help="Per micro op.")
+    parser.add_argument("--bcrypt-iterations", type=int, default=10)
+    parser.add_argument("--database-url", help="A local database; default SQLite.")
+    parser.add_argument("--output", help="Also write the results to this file.")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare.")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    app, users = setup(args.database_url, args.concurrency)
+    try:
+        results = {
+            "meta": _meta(args, app),
+            "micro": micro(app, users, args.iterations, args.bcrypt_iterations),
+            "macro": {
+                scenario: macro(app, users, scenario, args.concurrency, args.seconds)
+                for scenario in SCENARIOS
+            },
+        }
+    finally:
+        password_hasher.shutdown()
+        if args.database_url:
+            with app.app_context():
+                db.drop_all()
+
+    if baseline is not None:
+        for key in ("database", "concurrency"):
+            if baseline["meta"].get(key) != results["meta"][key]:
+                sys.exit(f"Baseline {key} {baseline['meta'].get(key)!r} differs")
+        results["baseline_commit"] = baseline["meta"].get("commit")
+        results["regressions"] = compare(results, baseline, args.threshold)
+
+    report("auth", results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "auth", "results": results}, f, indent=2)
+    if results.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Bytes, CPU time and queries per poll of the endpoints clients poll, with
+and without conditional GETs.
+
+    python -m backend.benchmarks.conditional_get [--polls 500] [--transactions 50]
+
+Each endpoint is polled in three ways. ``full`` sends no validators.
+``gzip`` also sends ``Accept-Encoding: gzip``. ``revalidate`` sends the
+ETag from the previous response, as a browser does with
+``Cache-Control: no-cache``.
+"""
+
+import argparse
+import time
+
+from backend.benchmarks import bench_app, count_queries, report
+from backend.extensions import db
+from backend.models.billing import TransactionType, UserBalance
+from backend.models.user import User
+
+ENDPOINTS = (
+    "/api/billing/balance",
+    "/api/billing/transactions?limit=50",
+    "/api/auth/me?fresh=1",
+)
+
+
+def setup(transactions):
+    app = bench_app()
+    with app.app_context():
+        user = User(email="poll@example.com", name="Poller")
+        user.set_password("password")
+        db.session.add(user)
+        db.session.commit()
+        for i in range(transactions):
+            UserBalance.record(
+                user.id,
+                "1.00",
+                TransactionType.PURCHASE,
+                application="bench",
+                operation="topup",
+                transaction_metadata={"note": f"purchase {i}"},
+            )
+        db.session.commit()
+    client = app.test_client()
+    client.post("/api/auth/login", json={"email": "poll@example.com", "password": "password"})
+    return app, client
+
+
+def poll(app, client, url, mode, polls):
+    headers = {"Accept-Encoding": "gzip"} if mode != "full" else {}
+    if mode == "revalidate":
+        headers["If-None-Match"] = client.get(url, headers=headers).headers["ETag"]
+    sent = 0
+    with app.app_context():
+        with count_queries(db.engine) as queries:
+            start = time.process_time()
+            for _ in range(polls):
+                response = client.get(url, headers=headers)
+                sent += len(response.data)
+            cpu = time.process_time() - start
+    return {
+        "endpoint": url,
+        "mode": mode,
+        "status": response.status_code,
+        "bytes_per_poll": round(sent / polls),
+        "cpu_us_per_poll": round(cpu / polls * 1e6),
+        "queries_per_poll": round(queries["count"] / polls, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--polls", type=int, default=500)
+    parser.add_argument("--transactions", type=int, default=50)
+    args = parser.parse_args()
+
+    app, client = setup(args.transactions)
+    results = [
+        poll(app, client, url, mode, args.polls)
+        for url in ENDPOINTS
+        for mode in ("full", "gzip", "revalidate")
+    ]
+    report("conditional_get", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Throughput of concurrent balance reads and writes on a SQLite file under
+different engine configurations.
+
+    python -m backend.benchmarks.db_engine [--threads 4 16] [--seconds 3]
+
+Each thread runs a request-shaped loop: four reads (balance and a page of
+transactions) for every write (a credit recorded in the ledger), each in its
+own app context, as a request would. ``rollback-journal`` is the old
+configuration: SQLite's default journal, ``synchronous=FULL``, no mmap and
+SQLAlchemy's default pool of 5 + 10. The others use backend/src/db_engine.py.
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from backend.benchmarks import bench_app, report
+from backend.extensions import db
+from backend.models.billing import Transaction, TransactionType, UserBalance
+from backend.models.user import User
+from backend.src.db_engine import pool_stats
+
+USERS = 200
+
+CONFIGS = {
+    "rollback-journal": {
+        "SQLITE_WAL": False,
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_MMAP_SIZE": 0,
+        "DB_POOL_SIZE": 5,
+        "DB_MAX_OVERFLOW": 10,
+    },
+    "wal": {},
+}
+
+
+def seed(app):
+    with app.app_context():
+        db.session.execute(
+            User.__table__.insert(),
+            [{"email": f"u{i}@example.com", "name": "Bench"} for i in range(USERS)],
+        )
+        db.session.execute(
+            UserBalance.__table__.insert(),
+            [{"user_id": i + 1, "balance": "100.00"} for i in range(USERS)],
+        )
+        db.session.commit()
+
+
+def _read(user_id):
+    UserBalance.query.filter_by(user_id=user_id).first()
+    Transaction.page(user_id, limit=20)
+
+
+def _write(user_id):
+    UserBalance.record(
+        user_id, "1.00", TransactionType.PURCHASE, application="bench", operation="topup"
+    )
+    db.session.commit()
+
+
+def run(name, settings, threads, seconds):
+    app = bench_app(WSGI_THREADS=threads, **settings)
+    seed(app)
+    latencies = {"read": [], "write": []}
+    errors = []
+    deadline = time.monotonic() + seconds
+
+    def worker(seed_value):
+        rng = random.Random(seed_value)
+        while time.monotonic() < deadline:
+            kind = "write" if rng.random() < 0.2 else "read"
+            user_id = rng.randint(1, USERS)
+            start = time.perf_counter()
+            try:
+                with app.app_context():
+                    (_write if kind == "write" else _read)(user_id)
+            except Exception as e:
+                errors.append(type(e).__name__)
+                continue
+            latencies[kind].append(time.perf_counter() - start)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    stats = pool_stats(app)["default"]
+    done = sum(len(values) for values in latencies.values())
+    return {
+        "config": name,
+        "threads": threads,
+        "ops_per_sec": round(done / seconds, 1),
+        "writes_per_sec": round(len(latencies["write"]) / seconds, 1),
+        "read_p95_ms": _p95_ms(latencies["read"]),
+        "write_p95_ms": _p95_ms(latencies["write"]),
+        "errors": len(errors),
+        "pool_size": stats["size"],
+        "peak_checked_out": stats["peak_checked_out"],
+        "connects": stats["connects"],
+    }
+
+
+def _p95_ms(values):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[int(len(values) * 0.95)] * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    results = [
+        run(name, settings, threads, args.seconds)
+        for threads in args.threads
+        for name, settings in CONFIGS.items()
+    ]
+    report("db_engine", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+A local JWKS endpoint standing in for an identity provider (Apple, Google).
+
+Holds RSA signing keys, serves their public halves at ``/auth/keys`` and
+signs ID tokens with them::
+
+    with FakeJWKS() as idp:
+        cache = JWKSCache(idp.jwks_url)
+        token = idp.sign({"iss": ..., "aud": ..., "sub": ...})
+        idp.rotate()        # Publish a new key and sign with it
+        idp.failing = True  # Answer 503 to every fetch
+"""
+
+import json
+import threading
+import time
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+from werkzeug.wrappers import Response
+
+from backend.benchmarks import LocalServer
+
+
+class FakeJWKS(LocalServer):
+    def __init__(self, latency=0.0, max_age=None):
+        self.latency = latency
+        self.max_age = max_age
+        self.failing = False
+        self.fetches = 0
+        self._keys = []
+        self._lock = threading.Lock()
+        self.rotate()
+        super().__init__()
+
+    @property
+    def jwks_url(self):
+        return f"{self.url}/auth/keys"
+
+    @property
+    def kid(self):
+        return self._keys[-1][0]
+
+    def rotate(self):
+        """Publish a new signing key alongside the old ones and sign with it."""
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        with self._lock:
+            self._keys.append((f"key-{len(self._keys) + 1}", key))
+
+    def sign(self, claims, kid=None, expires_in=600):
+        kid = kid or self.kid
+        key = dict(self._keys)[kid]
+        now = int(time.time())
+        payload = {"iat": now, "exp": now + expires_in, **claims}
+        return jwt.encode(payload, key, algorithm="RS256", headers={"kid": kid})
+
+    def wsgi_app(self, environ, start_response):
+        with self._lock:
+            self.fetches += 1
+        time.sleep(self.latency)
+        if self.failing:
+            return Response("unavailable", status=503)(environ, start_response)
+        keys = []
+        for kid, key in self._keys:
+            jwk = json.loads(RSAAlgorithm.to_jwk(key.public_key()))
+            keys.append({**jwk, "kid": kid, "use": "sig", "alg": "RS256"})
+        response = Response(json.dumps({"keys": keys}), mimetype="application/json")
+        if self.max_age is not None:
+            response.headers["Cache-Control"] = f"public, max-age={self.max_age}"
+        return response(environ, start_response)
@@ -0,0 +1,79 @@
+"""
+A local stand-in for Google's OAuth endpoints, for tests and benchmarks.
+
+Extends ``FakeJWKS`` (which serves the signing certs) with the token and
+userinfo endpoints. Codes are registered up front with the profile they sign
+in as::
+
+    with FakeGoogle(client_id="client") as google:
+        app.config.update(google.config())
+        google.codes["abc"] = {"sub": "g1", "email": "a@example.com", ...}
+        client.get("/api/auth/callback/google?code=abc")
+        google.calls  # [("POST", "/token"), ...]
+"""
+
+import json
+import secrets
+import threading
+import time
+
+from werkzeug.wrappers import Request, Response
+
+from backend.benchmarks.fake_jwks import FakeJWKS
+
+
+class FakeGoogle(FakeJWKS):
+    def __init__(self, client_id="client", latency=0.0):
+        self.client_id = client_id
+        self.codes = {}
+        self.calls = []
+        self.send_id_token = True
+        self.id_token_claims = {}  # Added to (or overriding) every id_token
+        self.token_latency = latency
+        self._access_tokens = {}
+        self._calls_lock = threading.Lock()
+        super().__init__()
+
+    def config(self):
+        """App settings pointing the Google provider at this server."""
+        return {
+            "OAUTH_CREDENTIALS": {"google": {"id": self.client_id, "secret": "s3cret"}},
+            "GOOGLE_OAUTH_AUTHORIZE_URL": f"{self.url}/authorize",
+            "GOOGLE_OAUTH_TOKEN_URL": f"{self.url}/token",
+            "GOOGLE_OAUTH_USERINFO_URL": f"{self.url}/userinfo",
+            "GOOGLE_JWKS_URL": self.jwks_url,
+        }
+
+    def _token(self, request):
+        profile = self.codes.pop(request.form.get("code"), None)
+        if profile is None or request.form.get("client_id") != self.client_id:
+            return {"error": "invalid_grant"}, 400
+        access_token = secrets.token_urlsafe(16)
+        self._access_tokens[access_token] = profile
+        tokens = {"access_token": access_token, "token_type": "Bearer"}
+        if self.send_id_token:
+            claims = {"iss": "https://accounts.google.com", "aud": self.client_id}
+            claims.update(profile, **self.id_token_claims)
+            tokens["id_token"] = self.sign(claims)
+        return tokens, 200
+
+    def _userinfo(self, request):
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        profile = self._access_tokens.get(token)
+        if scheme != "Bearer" or profile is None:
+            return {"error": "invalid_token"}, 401
+        return {"id": profile["sub"], **profile}, 200
+
+    def wsgi_app(self, environ, start_response):
+        request = Request(environ)
+        with self._calls_lock:
+            self.calls.append((request.method, request.path))
+        if request.path == "/token":
+            time.sleep(self.token_latency)
+            body, status = self._token(request)
+        elif request.path == "/userinfo":
+            body, status = self._userinfo(request)
+        else:
+            return super().wsgi_app(environ, start_response)
+        response = Response(json.dumps(body), status=status, mimetype="application/json")
+        return response(environ, start_response)
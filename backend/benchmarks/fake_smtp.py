@@ -0,0 +1,110 @@
+"""
+A local SMTP server standing in for the mail relay, for tests and benchmarks.
+
+Speaks just enough SMTP for ``smtplib`` (no TLS or AUTH) and records what it
+receives::
+
+    with FakeSMTP(latency=0.01) as relay:
+        app.config.update(MAIL_SERVER="127.0.0.1", MAIL_PORT=relay.port, ...)
+        ...
+        relay.messages     # [(mail_from, [rcpt, ...], data), ...]
+        relay.connections  # SMTP sessions opened so far
+        relay.fail_next = 2  # Answer 451 to the next two messages
+        relay.reject = True  # Answer 550 to every message
+"""
+
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        relay = self.server.relay
+        with relay.lock:
+            relay.connections += 1
+        self.reply("220 fake-smtp ready")
+        mail_from, rcpt_to = None, []
+        for raw in self.rfile:
+            command = raw.decode("utf-8").rstrip("\r\n")
+            verb = command[:4].upper()
+            if verb in ("HELO", "EHLO"):
+                self.reply("250 fake-smtp")
+            elif verb == "MAIL":
+                mail_from, rcpt_to = command.split(":", 1)[1].strip(), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                rcpt_to.append(command.split(":", 1)[1].strip())
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                for line in self.rfile:
+                    if line == b".\r\n":
+                        break
+                    lines.append(line)
+                time.sleep(relay.latency)
+                self.reply(relay.accept(mail_from, rcpt_to, b"".join(lines)))
+            elif verb == "RSET":
+                mail_from, rcpt_to = None, []
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeSMTP:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = []
+        self.connections = 0
+        self.fail_next = 0
+        self.reject = False
+        self.lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.relay = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def accept(self, mail_from, rcpt_to, data):
+        with self.lock:
+            if self.reject:
+                return "550 Mailbox unavailable"
+            if self.fail_next:
+                self.fail_next -= 1
+                return "451 Try again later"
+            self.messages.append((mail_from, rcpt_to, data))
+        return "250 OK: queued"
+
+    def config(self):
+        """App settings sending mail through this server."""
+        return {
+            "MAIL_SERVER": "127.0.0.1",
+            "MAIL_PORT": self.port,
+            "MAIL_USE_TLS": False,
+            "MAIL_USE_SSL": False,
+            "MAIL_USERNAME": None,
+            "MAIL_PASSWORD": None,
+            "MAIL_SUPPRESS_SEND": False,
+            "MAIL_DEBUG": False,
+        }
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,83 @@
+"""
+A local stand-in for the Stripe API, for tests and benchmarks.
+
+Serves the handful of endpoints the billing routes use, adds a fixed
+``latency`` to every call to mimic a real round trip, honours
+``Idempotency-Key`` like Stripe does and records what it was asked::
+
+    with FakeStripe(latency=0.05) as fake:
+        app.config["STRIPE_API_BASE"] = fake.url
+        ...
+        fake.calls  # [("POST", "/v1/customers", idempotency_key), ...]
+"""
+
+import itertools
+import json
+import threading
+import time
+
+from werkzeug.wrappers import Request, Response
+
+from backend.benchmarks import LocalServer
+
+_OBJECTS = {
+    "/v1/customers": ("customer", "cus"),
+    "/v1/ephemeral_keys": ("ephemeral_key", "ephkey"),
+    "/v1/payment_intents": ("payment_intent", "pi"),
+}
+
+
+class FakeStripe(LocalServer):
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self.max_concurrency = 0
+        self._active = 0
+        self._ids = itertools.count(1)
+        self._replies = {}
+        self._lock = threading.Lock()
+        super().__init__()
+
+    def _object(self, request):
+        path = request.path
+        if request.method == "GET" and path.startswith("/v1/customers/"):
+            return {"id": path.rsplit("/", 1)[1], "object": "customer"}
+        kind, prefix = _OBJECTS[path]
+        n = next(self._ids)
+        obj = {"id": f"{prefix}_{n}", "object": kind, **request.form.to_dict()}
+        if kind == "ephemeral_key":
+            obj["secret"] = f"ek_test_{n}"
+        elif kind == "payment_intent":
+            obj["client_secret"] = f"pi_{n}_secret_{n}"
+            obj["amount"] = int(request.form.get("amount", 0))
+        return obj
+
+    def wsgi_app(self, environ, start_response):
+        request = Request(environ)
+        key = request.headers.get("Idempotency-Key")
+        with self._lock:
+            self.calls.append((request.method, request.path, key))
+            self._active += 1
+            self.max_concurrency = max(self.max_concurrency, self._active)
+        try:
+            time.sleep(self.latency)
+            with self._lock:
+                if key and (request.path, key) in self._replies:
+                    obj = self._replies[(request.path, key)]
+                else:
+                    try:
+                        obj = self._object(request)
+                    except KeyError:
+                        response = Response(
+                            json.dumps({"error": {"message": "Unknown path"}}),
+                            status=404,
+                            mimetype="application/json",
+                        )
+                        return response(environ, start_response)
+                    if key:
+                        self._replies[(request.path, key)] = obj
+            response = Response(json.dumps(obj), mimetype="application/json")
+            return response(environ, start_response)
+        finally:
+            with self._lock:
+                self._active -= 1
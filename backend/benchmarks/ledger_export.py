@@ -0,0 +1,136 @@
+"""
+Throughput and peak memory of the streaming ledger export, against loading
+the ledger with ``.all()`` and ``to_dict()``.
+
+    python -m backend.benchmarks.ledger_export [--rows 2000000] [--format csv]
+
+Each export runs in a fresh process so its peak RSS is not inflated by the
+seeding done here.
+"""
+
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+
+from backend.benchmarks import bench_app, report
+from backend.extensions import db
+from backend.models.billing import (
+    Transaction,
+    TransactionStatus,
+    TransactionType,
+    UserBalance,
+)
+from backend.models.user import User
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def seed(app, rows, users=100, batch=50_000):
+    with app.app_context():
+        db.session.add_all(User(email=f"u{i}@example.com", name="Bench") for i in range(users))
+        db.session.commit()
+        user_ids = db.session.scalars(db.select(User.id)).all()
+        for user_id in user_ids:
+            UserBalance.get_or_create(user_id)
+        db.session.commit()
+        balances = dict(db.session.execute(db.select(UserBalance.user_id, UserBalance.id)).all())
+
+        table = Transaction.__table__
+        for start in range(0, rows, batch):
+            db.session.execute(
+                table.insert(),
+                [
+                    {
+                        "user_id": user_ids[i % users],
+                        "balance_id": balances[user_ids[i % users]],
+                        "application": "speech" if i % 3 else "autodraft",
+                        "amount": "1.25",
+                        "transaction_type": TransactionType.USAGE.name,
+                        "status": TransactionStatus.COMPLETED.name,
+                        "transaction_metadata": {"tokens": i % 1000},
+                    }
+                    for i in range(start, min(start + batch, rows))
+                ],
+            )
+            db.session.commit()
+
+
+def _export(uri, mode, fmt, queue):
+    from backend.src.ledger_export import export_transactions, gzip_chunks
+
+    app = bench_app(SQLALCHEMY_DATABASE_URI=uri)
+    with app.app_context():
+        baseline = _peak_rss_mb()
+        start = time.perf_counter()
+        written = 0
+        if mode == "all":
+            transactions = Transaction.query.order_by(Transaction.id).all()
+            rows = len(transactions)
+            written = sum(len(str(t.to_dict())) + 1 for t in transactions)
+        else:
+            chunks = export_transactions(fmt)
+            if mode == "gzip":
+                chunks = gzip_chunks(chunks)
+            for chunk in chunks:
+                written += len(chunk)
+        elapsed = time.perf_counter() - start
+        if mode != "all":
+            rows = Transaction.query.count()
+    queue.put(
+        {
+            "mode": mode,
+            "rows": rows,
+            "seconds": round(elapsed, 2),
+            "rows_per_sec": round(rows / elapsed, 1),
+            "output_mb": round(written / (1024 * 1024), 1),
+            "peak_rss_mb": _peak_rss_mb(),
+            "rss_growth_mb": round(_peak_rss_mb() - baseline, 1),
+        }
+    )
+
+
+def run(uri, mode, fmt):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_export, args=(uri, mode, fmt, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument(
+        "--skip-all", action="store_true", help="Skip the .all() baseline."
+    )
+    args = parser.parse_args()
+
+    app = bench_app()
+    start = time.perf_counter()
+    seed(app, args.rows)
+    seeded = time.perf_counter() - start
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+
+    results = {
+        "rows": args.rows,
+        "format": args.format,
+        "seed_seconds": round(seeded, 1),
+        "streaming": run(uri, "stream", args.format),
+        "streaming_gzip": run(uri, "gzip", args.format),
+    }
+    if not args.skip_all:
+        results["all_then_to_dict"] = run(uri, "all", args.format)
+    report("ledger_export", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Per-request cost of rate limiting with N worker processes hitting the limiter
+at once: Flask-Limiter's per-process memory storage against the host-shared
+``HostStorage`` file. The benchmark also reports how many hits each storage
+admits on one "100/minute" key across all workers: memory admits 100 per
+worker, the shared file admits 100 in total.
+
+    python -m backend.benchmarks.limiter_storage [--hits 20000] [--workers 4 8 16]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+
+from backend.benchmarks import report
+from backend.src import limiter_storage  # noqa: F401 - registers hostfile://
+
+OPEN_LIMIT = parse("1000000/minute")
+SHARED_LIMIT = parse("100/minute")
+
+
+def _worker(uri, hits, start, queue):
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(uri))
+    start.wait()
+    began = time.perf_counter()
+    for i in range(hits):
+        limiter.hit(OPEN_LIMIT, "bench", f"10.0.{i % 256}.{i % 100}")
+    elapsed = time.perf_counter() - began
+    admitted = sum(limiter.hit(SHARED_LIMIT, "login", "1.2.3.4") for _ in range(200))
+    queue.put((elapsed, admitted))
+
+
+def run(uri, workers, hits):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    start = context.Event()
+    processes = [
+        context.Process(target=_worker, args=(uri, hits, start, queue))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    time.sleep(1)  # Let every worker finish importing
+    start.set()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    slowest = max(elapsed for elapsed, _ in results)
+    return {
+        "us_per_hit": round(
+            sum(elapsed for elapsed, _ in results) / (workers * hits) * 1e6, 2
+        ),
+        "hits_per_sec": round(workers * hits / slowest),
+        "admitted_of_100": sum(admitted for _, admitted in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hits", type=int, default=20_000, help="Per worker.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 8, 16])
+    args = parser.parse_args()
+
+    results = {"cpus": os.cpu_count(), "hits_per_worker": args.hits}
+    for workers in args.workers:
+        path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "limits.bin")
+        results[f"{workers}_workers"] = {
+            "memory": run("memory://", workers, args.hits),
+            "hostfile": run(f"hostfile://{path}", workers, args.hits),
+        }
+    report("limiter_storage", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Throughput and peak memory of ``flask billing notify-low-balance`` over a
+large user table: a dry-run scan of every balance under the threshold, then
+a real run sending to a local SMTP server.
+
+    python -m backend.benchmarks.low_balance [--users 1000000] [--low 0.01]
+
+Each run happens in a fresh process so its peak RSS is not inflated by the
+seeding done here.
+"""
+
+import argparse
+import multiprocessing
+import time
+
+from backend.benchmarks import bench_app, report
+from backend.benchmarks.fake_smtp import FakeSMTP
+from backend.benchmarks.ledger_export import _peak_rss_mb
+from backend.extensions import db
+from backend.models.billing import UserBalance
+from backend.models.user import User
+
+
+def seed(app, users, low, batch=50_000):
+    every = max(int(1 / low), 1) if low else 0
+    with app.app_context():
+        for start in range(0, users, batch):
+            stop = min(start + batch, users)
+            db.session.execute(
+                User.__table__.insert(),
+                [{"email": f"u{i}@example.com", "name": "Bench"} for i in range(start, stop)],
+            )
+            db.session.execute(
+                UserBalance.__table__.insert(),
+                [
+                    {
+                        "user_id": i + 1,
+                        "balance": "0.50" if every and i % every == 0 else "5.00",
+                    }
+                    for i in range(start, stop)
+                ],
+            )
+            db.session.commit()
+
+
+def _notify(uri, settings, dry_run, queue):
+    from backend.src.low_balance import notify_low_balances
+
+    app = bench_app(SQLALCHEMY_DATABASE_URI=uri, **settings)
+    with app.app_context():
+        baseline = _peak_rss_mb()
+        result = notify_low_balances(threshold=1, rate=0, dry_run=dry_run)
+    queue.put(
+        {
+            **result,
+            "peak_rss_mb": _peak_rss_mb(),
+            "rss_growth_mb": round(_peak_rss_mb() - baseline, 1),
+        }
+    )
+
+
+def run(uri, settings, dry_run):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_notify, args=(uri, settings, dry_run, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--low", type=float, default=0.01, help="Share of low balances.")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    app = bench_app()
+    start = time.perf_counter()
+    seed(app, args.users, args.low)
+    seeded = time.perf_counter() - start
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+
+    with FakeSMTP() as relay:
+        settings = {
+            **relay.config(),
+            "LOW_BALANCE_SMTP_CONNECTIONS": args.connections,
+            "LOW_BALANCE_CHUNK_SIZE": args.chunk_size,
+        }
+        results = {
+            "users": args.users,
+            "seed_seconds": round(seeded, 1),
+            "scan": run(uri, settings, dry_run=True),
+            "send": run(uri, settings, dry_run=False),
+            "smtp_connections": relay.connections,
+        }
+    report("low_balance", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Blocklist queries per 10k authenticated requests, without the shared
+revocation cache, with it and its default cross-host sync window, and with
+it in the strict sync-before-every-lookup mode.
+
+    python -m backend.benchmarks.revocation_cache [--requests 10000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from flask_jwt_extended import create_access_token, decode_token
+
+from backend.benchmarks import bench_app, count_queries, report
+from backend.extensions import db
+from backend.models.user import TokenBlocklist, User
+
+
+def run(requests, revoked_fraction, cache_enabled, sync_seconds=None):
+    settings = {
+        "REVOCATION_CACHE_ENABLED": cache_enabled,
+        "REVOCATION_CACHE_PATH": os.path.join(tempfile.mkdtemp(), "revocations.bin"),
+    }
+    if sync_seconds is not None:
+        settings["REVOCATION_CACHE_SYNC_SECONDS"] = sync_seconds
+    app = bench_app(**settings)
+    client = app.test_client()
+    with app.app_context():
+        user = User(email="bench@example.com", name="Bench")
+        db.session.add(user)
+        db.session.commit()
+        tokens = [create_access_token(identity=str(user.id)) for _ in range(500)]
+        revoked = set(random.sample(tokens, int(len(tokens) * revoked_fraction)))
+        for token in revoked:
+            TokenBlocklist.revoke(decode_token(token)["jti"])
+        db.session.commit()
+
+        rejected = 0
+        with count_queries(db.engine, "token_blocklist") as queries:
+            start = time.perf_counter()
+            for _ in range(requests):
+                token = random.choice(tokens)
+                client.set_cookie("access_token_cookie", token)
+                if client.get("/api/auth/me").status_code == 401:
+                    rejected += 1
+            elapsed = time.perf_counter() - start
+
+    jti_lookups = sum(
+        "token_blocklist.jti =" in statement for statement in queries["statements"]
+    )
+    return {
+        "cache_enabled": cache_enabled,
+        "sync_seconds": app.config["REVOCATION_CACHE_SYNC_SECONDS"],
+        "requests": requests,
+        "rejected": rejected,
+        "blocklist_queries": queries["count"],
+        "jti_lookups": jti_lookups,
+        "blocklist_queries_per_10k": round(queries["count"] * 10_000 / requests, 1),
+        "requests_per_sec": round(requests / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=10_000)
+    parser.add_argument("--revoked-fraction", type=float, default=0.02)
+    args = parser.parse_args()
+
+    random.seed(0)
+    baseline = run(args.requests, args.revoked_fraction, cache_enabled=False)
+    random.seed(0)
+    cached = run(args.requests, args.revoked_fraction, cache_enabled=True)
+    random.seed(0)
+    strict = run(
+        args.requests, args.revoked_fraction, cache_enabled=True, sync_seconds=0
+    )
+
+    def removed_per_10k(result):
+        removed = baseline["blocklist_queries"] - result["blocklist_queries"]
+        return round(removed * 10_000 / args.requests, 1)
+
+    report(
+        "revocation_cache",
+        {
+            "without_cache": baseline,
+            "with_cache": cached,
+            "with_cache_strict_sync": strict,
+            "db_hits_removed_per_10k": removed_per_10k(cached),
+            # In strict mode each jti lookup becomes a primary-key probe that
+            # normally returns no rows
+            "db_hits_removed_per_10k_strict_sync": removed_per_10k(strict),
+        },
+    )
+
+
+if __name__ == "__main__":
+    main()
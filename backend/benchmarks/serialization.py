@@ -0,0 +1,111 @@
+"""
+CPU time to build and serialize one page of the transaction history.
+
+    python -m backend.benchmarks.serialization [--pages 300] [--limit 50]
+
+``orm`` is the old path: load ``Transaction`` instances, convert each value
+in ``to_dict`` (``float``, ``isoformat``, enum ``.value``) and encode with
+the standard library. ``projection`` selects ``API_COLUMNS`` into dicts and
+encodes with the app's provider, once with orjson and once with its
+standard-library fallback. Each result splits the time into query and
+encode.
+"""
+
+import argparse
+import time
+
+from backend.benchmarks import bench_app, report
+from backend.extensions import db
+from backend.models.billing import Transaction, TransactionType, UserBalance
+from backend.models.user import User
+from backend.src.json_provider import FastJSONProvider
+
+
+def legacy_dict(t):
+    """``Transaction.to_dict`` before the projection serializers."""
+    return {
+        "id": t.id,
+        "application": t.application,
+        "amount": float(t.amount),
+        "transaction_type": t.transaction_type.value,
+        "operation": t.operation,
+        "status": t.status.value,
+        "reference_id": t.reference_id,
+        "transaction_metadata": t.transaction_metadata,
+        "created_at": t.created_at.isoformat(),
+    }
+
+
+def setup(limit):
+    app = bench_app()
+    with app.app_context():
+        user = User(email="ledger@example.com", name="Ledger")
+        db.session.add(user)
+        db.session.commit()
+        for i in range(limit):
+            UserBalance.record(
+                user.id,
+                "2.50",
+                TransactionType.PURCHASE,
+                application="store",
+                operation="topup",
+                transaction_metadata={"note": f"purchase {i}", "sku": "credits-25"},
+            )
+        db.session.commit()
+        return app, user.id
+
+
+def orm_page(user_id, limit):
+    rows = db.session.scalars(
+        db.select(Transaction)
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.created_at.desc(), Transaction.id.desc())
+        .limit(limit)
+    ).all()
+    return {"transactions": [legacy_dict(t) for t in rows]}
+
+
+def projection_page(user_id, limit):
+    return {"transactions": Transaction.api_dicts(Transaction.page(user_id, limit=limit))}
+
+
+def run(app, name, build, provider, user_id, pages, limit):
+    query = encode = 0.0
+    with app.app_context():
+        for _ in range(pages):
+            start = time.process_time()
+            payload = build(user_id, limit)
+            built = time.process_time()
+            body = provider.response(payload).get_data()
+            encode += time.process_time() - built
+            query += built - start
+            db.session.remove()  # Each page is a fresh request
+    return {
+        "path": name,
+        "rows": limit,
+        "bytes": len(body),
+        "query_us_per_page": round(query / pages * 1e6),
+        "encode_us_per_page": round(encode / pages * 1e6),
+        "total_us_per_page": round((query + encode) / pages * 1e6),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    app, user_id = setup(args.limit)
+    stdlib = FastJSONProvider(app, use_orjson=False)
+    fast = FastJSONProvider(app)
+    results = [
+        run(app, "orm", orm_page, stdlib, user_id, args.pages, args.limit),
+        run(app, "projection+json", projection_page, stdlib, user_id, args.pages, args.limit),
+        run(app, "projection+orjson", projection_page, fast, user_id, args.pages, args.limit),
+    ]
+    report("serialization", results)
+
+
+if __name__ == "__main__":
+    main()
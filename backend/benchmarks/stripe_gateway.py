@@ -0,0 +1,80 @@
+"""
+Payment sheet latency for a returning customer against a fake Stripe with a
+fixed per-call latency: the previous serial flow (global ``stripe.api_key``,
+``Customer.retrieve``, then EphemeralKey and PaymentIntent one after the
+other) against ``StripeGateway``.
+
+    python -m backend.benchmarks.stripe_gateway [--requests 50] [--latency 0.05]
+"""
+
+import argparse
+import statistics
+import time
+
+import stripe
+
+from backend.benchmarks import bench_app, report
+from backend.benchmarks.fake_stripe import FakeStripe
+from backend.extensions import stripe_gateway
+
+
+def _summary(samples, calls):
+    samples = sorted(samples)
+    return {
+        "requests": len(samples),
+        "stripe_calls_per_sheet": round(calls / len(samples), 1),
+        "p50_ms": round(statistics.median(samples) * 1000, 1),
+        "p95_ms": round(samples[int(0.95 * (len(samples) - 1))] * 1000, 1),
+    }
+
+
+def serial(fake, requests):
+    stripe.api_key = "sk_test_fake"
+    stripe.api_base = fake.url
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        stripe.api_key = "sk_test_fake"
+        customer = stripe.Customer.retrieve("cus_bench")
+        stripe.EphemeralKey.create(customer=customer.id, stripe_version=stripe.api_version)
+        stripe.PaymentIntent.create(
+            amount=1000,
+            currency="usd",
+            customer=customer.id,
+            metadata={"user_id": "1", "type": "add_funds"},
+            automatic_payment_methods={"enabled": True},
+        )
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def gateway(fake, requests):
+    app = bench_app(STRIPE_API_BASE=fake.url, STRIPE_SECRET_KEY="sk_test_fake")
+    samples = []
+    with app.app_context():
+        for _ in range(requests):
+            start = time.perf_counter()
+            stripe_gateway.payment_sheet(
+                "cus_bench", 1000, metadata={"user_id": "1", "type": "add_funds"}
+            )
+            samples.append(time.perf_counter() - start)
+    stripe_gateway.shutdown()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    results = {"latency_per_call_ms": args.latency * 1000}
+    for name, flow in (("serial", serial), ("gateway", gateway)):
+        with FakeStripe(latency=args.latency) as fake:
+            samples = flow(fake, args.requests)
+            results[name] = _summary(samples, len(fake.calls))
+    report("stripe_gateway", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import json
+import os
+import sys
+
+import click
+from flask.cli import AppGroup
+
+blocklist_cli = AppGroup("blocklist", help="Maintain the revoked token blocklist.")
+
+
+@blocklist_cli.command("prune")
+@click.option("--batch-size", default=1000, show_default=True)
+@click.option("--max-batches", type=int, default=None, help="Stop after N batches.")
+@click.option(
+    "--pause", default=0.0, show_default=True, help="Seconds to sleep between batches."
+)
+def prune_blocklist(batch_size, max_batches, pause):
+    """Delete blocklist rows whose tokens have expired."""
+    from backend.src.blocklist_pruner import prune_expired_tokens
+
+    report = prune_expired_tokens(batch_size, max_batches=max_batches, pause=pause)
+    click.echo(json.dumps(report))
+
+
+@blocklist_cli.command("stats")
+def blocklist_stats():
+    """Show the blocklist table size."""
+    from backend.src.blocklist_pruner import blocklist_stats
+
+    click.echo(json.dumps(blocklist_stats()))
+
+
+billing_cli = AppGroup("billing", help="Billing and ledger maintenance.")
+
+
+@billing_cli.command("export")
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), default="ndjson")
+@click.option("--user-id", type=int, default=None, help="Only this user's ledger.")
+@click.option("--application", default=None, help="Only this application.")
+@click.option("--since", type=click.DateTime(), default=None, help="Inclusive.")
+@click.option("--until", type=click.DateTime(), default=None, help="Exclusive.")
+@click.option("--gzip", "compress", is_flag=True, help="Write gzip-compressed output.")
+@click.option("--chunk-size", default=1000, show_default=True)
+@click.option(
+    "--output", "-o", type=click.Path(dir_okay=False), default=None, help="Default: stdout."
+)
+def export_ledger(fmt, user_id, application, since, until, compress, chunk_size, output):
+    """Stream the transaction ledger (all users by default)."""
+    from backend.src.ledger_export import export_transactions, gzip_chunks
+
+    chunks = export_transactions(
+        fmt,
+        user_id=user_id,
+        application=application,
+        since=since,
+        until=until,
+        chunk_size=chunk_size,
+    )
+    if compress:
+        chunks = gzip_chunks(chunks)
+    else:
+        chunks = (chunk.encode("utf-8") for chunk in chunks)
+
+    stream = open(output, "wb") if output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            stream.write(chunk)
+    finally:
+        if output:
+            stream.close()
+        else:
+            stream.flush()
+
+
+@billing_cli.command("rebuild-summary")
+def rebuild_summary():
+    """Recompute the usage rollup behind /billing/summary from the ledger."""
+    from backend.extensions import db
+    from backend.models.billing import UsageRollup
+
+    rows = UsageRollup.rebuild()
+    db.session.commit()
+    click.echo(json.dumps({"rollup_rows": rows}))
+
+
+@billing_cli.command("drain-webhooks")
+@click.option("--batch-size", type=int, default=None, help="Default: WEBHOOK_BATCH_SIZE.")
+@click.option("--workers", default=1, show_default=True, help="Worker threads.")
+@click.option(
+    "--follow", is_flag=True, help="Keep polling for new events instead of exiting."
+)
+@click.option("--interval", default=1.0, show_default=True, help="Poll interval with --follow.")
+def drain_webhooks(batch_size, workers, follow, interval):
+    """Apply queued Stripe webhook events."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from flask import current_app
+
+    from backend.src import webhook_queue
+
+    app = current_app._get_current_object()
+    if follow:
+        threads = webhook_queue.start_workers(app, workers, interval)
+        for thread in threads:
+            thread.join()
+        return
+
+    def drain_in_thread():
+        with app.app_context():
+            return webhook_queue.drain(batch_size)
+
+    with ThreadPoolExecutor(workers) as pool:
+        reports = list(pool.map(lambda _: drain_in_thread(), range(workers)))
+    click.echo(
+        json.dumps(
+            {
+                key: sum(report[key] for report in reports)
+                for key in ("processed", "retrying", "dead", "lease_lost", "batches")
+            }
+        )
+    )
+
+
+@billing_cli.command("webhook-stats")
+def webhook_stats():
+    """Show the webhook queue size by status."""
+    from backend.src.webhook_queue import queue_stats
+
+    click.echo(json.dumps(queue_stats()))
+
+
+@billing_cli.command("requeue-webhooks")
+def requeue_webhooks():
+    """Retry every dead-lettered webhook event."""
+    from backend.src.webhook_queue import requeue_dead
+
+    click.echo(json.dumps({"requeued": requeue_dead()}))
+
+
+@billing_cli.command("purge-idempotency")
+@click.option("--batch-size", default=1000, show_default=True)
+def purge_idempotency(batch_size):
+    """Delete expired Idempotency-Key records."""
+    from datetime import datetime, timezone
+
+    from backend.models.billing import IdempotencyRecord
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    click.echo(json.dumps({"purged": IdempotencyRecord.purge_expired(now, batch_size)}))
+
+
+@billing_cli.command("notify-low-balance")
+@click.option("--threshold", type=float, default=None, help="Default: LOW_BALANCE_THRESHOLD.")
+@click.option("--chunk-size", type=int, default=None, help="Default: LOW_BALANCE_CHUNK_SIZE.")
+@click.option(
+    "--rate", type=float, default=None, help="Messages per second. Default: LOW_BALANCE_SEND_RATE."
+)
+@click.option(
+    "--connections", type=int, default=None, help="Default: LOW_BALANCE_SMTP_CONNECTIONS."
+)
+@click.option("--dry-run", is_flag=True, help="Count who would be warned; send nothing.")
+def notify_low_balance(threshold, chunk_size, rate, connections, dry_run):
+    """Email users whose balance is under the threshold."""
+    from backend.src.low_balance import notify_low_balances
+
+    report = notify_low_balances(
+        threshold=threshold,
+        chunk_size=chunk_size,
+        rate=rate,
+        connections=connections,
+        dry_run=dry_run,
+    )
+    click.echo(json.dumps(report))
+
+
+@click.command("startup-profile")
+@click.option(
+    "--config", "config_name", default=None, help="Config import path. Default: the one for $ENV."
+)
+@click.option("--top", default=15, show_default=True, help="Packages to list.")
+def startup_profile(config_name, top):
+    """Time `import backend` + create_app in a fresh interpreter."""
+    from flask import current_app
+
+    from backend.config import CONFIGS
+    from backend.src.startup_profile import profile_startup
+
+    report = profile_startup(config_name or CONFIGS[os.environ.get("ENV", "dev")], top)
+    report["budget_seconds"] = current_app.config["STARTUP_BUDGET_SECONDS"]
+    click.echo(json.dumps(report, indent=2))
+    if report["seconds"] > report["budget_seconds"] or report["deferred_loaded"]:
+        sys.exit(1)
+
+
+def register_commands(app):
+    app.cli.add_command(blocklist_cli)
+    app.cli.add_command(billing_cli)
+    app.cli.add_command(startup_profile)
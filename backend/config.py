@@ -55,6 +55,72 @@ class Config:
     # Ensure HttpOnly is always True. This prevents client-side JS from accessing the cookie.
     JWT_COOKIE_HTTPONLY = True
 
+    # Serve current_user from the profile claims embedded in access tokens and
+    # only load the User row when a handler reads something else. Profile
+    # changes and deletions then show up once the access token is refreshed.
+    # Set to false to load the row on every protected request.
+    LAZY_USER_LOOKUP = os.getenv("LAZY_USER_LOOKUP", "true").lower() in ["true", "on", "1"]
+
+    # Revoked-token cache shared by all workers on a host (see
+    # backend/src/revocation_cache.py). "auto" picks a file in the app's
+    # instance folder keyed by the database URI; None keeps the cache private
+    # to the process.
+    REVOCATION_CACHE_ENABLED = os.getenv("REVOCATION_CACHE_ENABLED", "true").lower() in ["true", "on", "1"]
+    REVOCATION_CACHE_PATH = os.getenv("REVOCATION_CACHE_PATH", "auto")
+    REVOCATION_CACHE_CAPACITY = int(os.getenv("REVOCATION_CACHE_CAPACITY", 1_000_000))
+    REVOCATION_CACHE_ERROR_RATE = 0.001
+    REVOCATION_CACHE_LRU_SIZE = 4096
+    # Seconds between catch-ups with rows revoked on *other* hosts (one
+    # primary-key probe per host, not per request). A token revoked on another
+    # host stays valid here for up to this long; revocations made on this
+    # host apply at once. 0 = catch up before every lookup, closing the window
+    # at the cost of one probe per protected request.
+    REVOCATION_CACHE_SYNC_SECONDS = float(os.getenv("REVOCATION_CACHE_SYNC_SECONDS", 1))
+
+    # Expired blocklist rows are pruned with `flask blocklist prune`. Set an
+    # interval (seconds) to also prune from a background thread in each
+    # serving worker; it starts on the worker's first request, never for CLI.
+    BLOCKLIST_PRUNE_INTERVAL = int(os.getenv("BLOCKLIST_PRUNE_INTERVAL", 0))
+    BLOCKLIST_PRUNE_BATCH_SIZE = 1000
+    BLOCKLIST_PRUNE_PAUSE = 0.05  # Seconds between batches
+
+    # WSGI server shape: gunicorn worker processes and threads per worker
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+    WSGI_THREADS = int(os.getenv("WSGI_THREADS", 1))
+
+    # Database connections per worker process (backend/src/db_engine.py).
+    # The pool defaults to one connection per WSGI thread plus DB_POOL_EXTRA
+    # for background threads, and as many again as overflow. Set
+    # DB_MAX_CONNECTIONS to the server's limit to cap all workers together.
+    DB_POOL_SIZE = int(os.environ["DB_POOL_SIZE"]) if os.environ.get("DB_POOL_SIZE") else None
+    DB_POOL_EXTRA = 2
+    DB_MAX_OVERFLOW = int(os.environ["DB_MAX_OVERFLOW"]) if os.environ.get("DB_MAX_OVERFLOW") else None
+    DB_MAX_CONNECTIONS = int(os.environ["DB_MAX_CONNECTIONS"]) if os.environ.get("DB_MAX_CONNECTIONS") else None
+    DB_POOL_TIMEOUT = 10  # Seconds a request waits for a free connection
+    DB_POOL_RECYCLE = 1800  # Seconds; below server/proxy idle timeouts
+    DB_POOL_PRE_PING = True
+    # Optional read replica (backend/src/replica.py). Views marked
+    # replica-safe read from it, except for REPLICA_STICKY_SECONDS after the
+    # same client wrote; keep that above the replica's usual lag.
+    SQLALCHEMY_REPLICA_URI = os.getenv("DATABASE_REPLICA_URL")
+    REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 5))
+    # SQLite files: WAL lets readers run alongside the writer; writers wait
+    # up to SQLITE_BUSY_TIMEOUT_MS for the lock instead of failing
+    SQLITE_WAL = True
+    SQLITE_SYNCHRONOUS = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS = 5000
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+
+    # At most PASSWORD_HASH_WORKERS bcrypt jobs run at once on the whole host
+    # (default: one per core; 0 hashes inline) and PASSWORD_HASH_QUEUE_SIZE
+    # more may wait (default: as many as run). Each worker also keeps one of
+    # its WSGI_THREADS free. Beyond that login/register/reset-password answer
+    # 503. The host-wide counts live in a lock file in the instance folder.
+    PASSWORD_HASH_WORKERS = int(os.environ["PASSWORD_HASH_WORKERS"]) if os.environ.get("PASSWORD_HASH_WORKERS") else None
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ["PASSWORD_HASH_QUEUE_SIZE"]) if os.environ.get("PASSWORD_HASH_QUEUE_SIZE") else None
+    PASSWORD_HASH_TIMEOUT = 10  # Seconds a request waits for its hash
+    PASSWORD_HASH_LOCK_PATH = os.getenv("PASSWORD_HASH_LOCK_PATH", "auto")
+
     # Flask-JWT-Extended will use sensible defaults for cookie names and paths
     # Removed custom JWT_ACCESS_COOKIE_NAME, JWT_REFRESH_COOKIE_NAME, JWT_COOKIE_PATH, etc.
 
@@ -75,6 +141,74 @@ class Config:
         import logging
         logging.warning("OAuth Google credentials incomplete: CLIENT_ID and CLIENT_SECRET must both be set")
 
+    # OAuth calls share one pooled session per worker (backend/src/OAuthSignIn.py)
+    OAUTH_POOL_SIZE = 10
+    OAUTH_CONNECT_TIMEOUT = 3  # Seconds
+    OAUTH_READ_TIMEOUT = 10
+    # Google endpoints; overridable to point at a local fake
+    GOOGLE_OAUTH_AUTHORIZE_URL = os.getenv("GOOGLE_OAUTH_AUTHORIZE_URL", "https://accounts.google.com/o/oauth2/auth")
+    GOOGLE_OAUTH_TOKEN_URL = os.getenv("GOOGLE_OAUTH_TOKEN_URL", "https://oauth2.googleapis.com/token")
+    GOOGLE_OAUTH_USERINFO_URL = os.getenv("GOOGLE_OAUTH_USERINFO_URL", "https://www.googleapis.com/oauth2/v1/userinfo")
+
+    # Rate-limit counters (backend/src/limiter_storage.py) live in a file
+    # shared by every worker on the host ("auto" = the instance folder), so a
+    # limit holds across workers and restarts. Set RATELIMIT_STORAGE_URI
+    # (e.g. redis://) to share them across hosts instead; None = per process.
+    RATELIMIT_STORAGE_PATH = os.getenv("RATELIMIT_STORAGE_PATH", "auto")
+    RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI")
+    RATELIMIT_STORAGE_SETS = 16384  # x 8 counters of 32 bytes = 4 MiB
+    RATELIMIT_STRATEGY = "sliding-window-counter"
+
+    # Identity provider signing keys (backend/src/jwks_cache.py). Keys are
+    # cached in memory and in the instance folder ("auto") so new workers
+    # start warm, refreshed in the background JWKS_REFRESH_AHEAD seconds
+    # before expiry, and served stale for up to JWKS_MAX_STALE seconds while
+    # the provider is unreachable.
+    APPLE_JWKS_URL = "https://appleid.apple.com/auth/keys"
+    APPLE_JWKS_PATH = os.getenv("APPLE_JWKS_PATH", "auto")
+    GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+    GOOGLE_JWKS_PATH = os.getenv("GOOGLE_JWKS_PATH", "auto")
+    JWKS_TTL = 24 * 3600  # Upper bound; a shorter Cache-Control max-age wins
+    JWKS_REFRESH_AHEAD = 3600
+    JWKS_TIMEOUT = 5
+    JWKS_MIN_REFETCH_INTERVAL = 30  # Also rate-limits refetches for unknown kids
+    JWKS_MAX_STALE = 7 * 24 * 3600
+
+    # Claims of recently verified identity tokens are reused when a client
+    # resubmits the same token, for at most this long and never past its exp
+    VERIFIED_TOKEN_CACHE_SIZE = 1024
+    VERIFIED_TOKEN_CACHE_TTL = 300
+
+    # /billing/transactions page size (?limit=) default and cap
+    TRANSACTIONS_PAGE_SIZE = 50
+    TRANSACTIONS_MAX_PAGE_SIZE = 200
+
+    # Idempotency-Key handling for /billing/balance/add and
+    # /billing/create-payment-sheet: how long a stored response is replayed,
+    # and how long a duplicate waits for the first request (after which a
+    # retry may take over from a request that died)
+    IDEMPOTENCY_TTL_SECONDS = 24 * 3600
+    IDEMPOTENCY_LOCK_SECONDS = 30
+
+    # Stripe client (backend/src/stripe_gateway.py). STRIPE_API_BASE points
+    # it at another server, e.g. a local fake for tests and benchmarks.
+    STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")
+    STRIPE_TIMEOUT = 10  # Seconds per request
+    STRIPE_POOL_SIZE = 10  # Pooled connections and concurrent calls per worker
+    STRIPE_MAX_NETWORK_RETRIES = 2
+
+    # Stripe webhooks are queued in the webhook_event table and applied by
+    # background threads in each serving worker, every interval (seconds) or
+    # as soon as one is queued. With 0, payments are only credited while
+    # `flask billing drain-webhooks --follow` runs somewhere.
+    WEBHOOK_WORKER_INTERVAL = float(os.getenv("WEBHOOK_WORKER_INTERVAL", 2))
+    WEBHOOK_WORKER_THREADS = int(os.getenv("WEBHOOK_WORKER_THREADS", 1))
+    WEBHOOK_BATCH_SIZE = 100
+    WEBHOOK_LEASE_SECONDS = 60  # A claimed event is retried after this if its worker dies
+    WEBHOOK_MAX_ATTEMPTS = 8  # Then the event is dead-lettered
+    WEBHOOK_RETRY_BASE_SECONDS = 5  # Doubles with each failed attempt
+    WEBHOOK_RETRY_MAX_SECONDS = 3600
+
     # Email configuration
     MAIL_SERVER = os.environ.get("MAIL_SERVER")
     MAIL_PORT = int(os.environ.get("MAIL_PORT", 587))
@@ -88,6 +222,48 @@ class Config:
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD")
     MAIL_DEFAULT_SENDER = os.environ.get("MAIL_DEFAULT_SENDER", "noreply@example.com")
 
+    # Mail is sent by a background thread in each worker over one kept-open
+    # SMTP connection (backend/src/mail_queue.py)
+    MAIL_QUEUE_MAX_SIZE = 10000
+    MAIL_QUEUE_BATCH_SIZE = 50
+    MAIL_QUEUE_IDLE_SECONDS = 30  # Close the connection after this long without mail
+    MAIL_QUEUE_MAX_ATTEMPTS = 5
+    MAIL_QUEUE_RETRY_BASE_SECONDS = 2  # Doubles with each failed attempt
+    MAIL_QUEUE_RETRY_MAX_SECONDS = 300
+    MAIL_QUEUE_DRAIN_TIMEOUT = 5  # Seconds an exiting worker spends sending what is left
+
+    # `flask billing notify-low-balance` warns users whose balance is under
+    # the threshold, at most once per LOW_BALANCE_RENOTIFY_DAYS
+    LOW_BALANCE_THRESHOLD = float(os.getenv("LOW_BALANCE_THRESHOLD", 1.00))
+    LOW_BALANCE_RENOTIFY_DAYS = 7
+    LOW_BALANCE_CHUNK_SIZE = 1000
+    LOW_BALANCE_SEND_RATE = 20  # Messages per second; 0 = unthrottled
+    LOW_BALANCE_SMTP_CONNECTIONS = 4
+
+    # Prometheus metrics at /metrics (backend/src/metrics.py). Set
+    # PROMETHEUS_MULTIPROC_DIR in the server's environment to aggregate all
+    # gunicorn workers; METRICS_TOKEN makes scrapes of /metrics and /health/*
+    # send it as a bearer token. With METRICS_REQUIRE_TOKEN and no token set,
+    # those endpoints answer 404.
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ["true", "on", "1"]
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    METRICS_REQUIRE_TOKEN = False
+
+    # Encode JSON with orjson when it is installed (backend/src/json_provider.py)
+    JSON_USE_ORJSON = True
+
+    # gzip JSON/text responses of at least COMPRESS_MIN_SIZE bytes for
+    # clients that accept it (backend/src/http_caching.py)
+    COMPRESS_RESPONSES = True
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_LEVEL = 6
+
+    # Seconds `import backend` + create_app may take in a fresh interpreter
+    # (`flask startup-profile`). Third-party SDKs such as stripe and Alembic
+    # are imported on first use to stay within it; test_startup.py checks
+    # that they stay unloaded.
+    STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", 1.5))
+
 
 class DevelopmentConfig(Config):
     ENV = "development"
@@ -108,16 +284,16 @@ class ProductionConfig(Config):
     # FRONTEND_URL = "https://PROJECT_NAME.com"
     DEBUG = False
     
-    # Production database URL is required
+    # Production database URL is required (checked by create_app, so merely
+    # importing this module never fails)
     DATABASE_URL = os.environ.get("DATABASE_URL")
-    if not DATABASE_URL:
-        raise ValueError("DATABASE_URL environment variable is required for production")
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     
     CACHE_TYPE = "FileSystemCache"
     CACHE_DIR = os.path.join(os.getenv("TEMP", "/tmp"), "flask_cache")
     JWT_COOKIE_SECURE = True
     JWT_COOKIE_CSRF_PROTECT = True
+    METRICS_REQUIRE_TOKEN = True  # Never serve /metrics and /health/* openly
     STRIPE_PUBLISHABLE_KEY = os.environ.get("STRIPE_PUBLISHABLE_KEY")
     STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY")
     
@@ -133,6 +309,21 @@ class TestingConfig(Config):
     STRIPE_PUBLISHABLE_KEY = os.environ.get("STRIPE_PUBLISHABLE_KEY_TESTING")
     STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY_TESTING")
     MAIL_SUPPRESS_SEND = True  # Do not send emails during tests
+    REVOCATION_CACHE_PATH = None  # Fresh in-process cache for every test app
+    PASSWORD_HASH_WORKERS = 0  # Hash inline; no process pool in tests
+    PASSWORD_HASH_LOCK_PATH = None
+    APPLE_JWKS_PATH = None
+    GOOGLE_JWKS_PATH = None
+    RATELIMIT_STORAGE_PATH = None
+    WEBHOOK_WORKER_INTERVAL = 0  # Tests drain the webhook queue themselves
     
     # Testing CORS origins
     CORS_ORIGINS = ["http://localhost:8000"]
+
+
+# ENV -> config class, as import strings for create_app / app.config.from_object
+CONFIGS = {
+    "dev": "backend.config.DevelopmentConfig",
+    "prod": "backend.config.ProductionConfig",
+    "test": "backend.config.TestingConfig",
+}
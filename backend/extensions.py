@@ -5,17 +5,32 @@ from flask_jwt_extended import JWTManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_mail import Mail
-from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from flask_talisman import Talisman
 
-db = SQLAlchemy()
+from backend.src.deferred_migrate import DeferredMigrate
+from backend.src.hashing import PasswordHasher
+from backend.src.jwks_cache import JWKSCache
+from backend.src.mail_queue import MailQueue
+from backend.src.replica import RoutingSession
+from backend.src.revocation_cache import RevocationCache
+from backend.src.stripe_gateway import StripeGateway
+from backend.src.token_memo import VerifiedTokenCache
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 jwt = JWTManager()
-migrate = Migrate(render_as_batch=True)
+migrate = DeferredMigrate(render_as_batch=True)
 cors = CORS(supports_credentials=True)
 talisman = Talisman()
 limiter = Limiter(get_remote_address)
 mail = Mail()
+revocation_cache = RevocationCache()
+password_hasher = PasswordHasher()
+stripe_gateway = StripeGateway()
+apple_jwks = JWKSCache("apple")
+google_jwks = JWKSCache("google")
+verified_tokens = VerifiedTokenCache()
+mail_queue = MailQueue()
 
 
 def create_logger(name, level="INFO"):
@@ -1,9 +1,16 @@
+from datetime import datetime, timedelta
 from decimal import Decimal
 from enum import Enum
 
+from sqlalchemy import literal, tuple_, update
+from sqlalchemy.dialects.sqlite import DATETIME as SQLITE_DATETIME
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 
 from backend.extensions import db
+from backend.models.serializers import APIColumns
+
+STARTING_BALANCE = Decimal("5.00")  # Free credit for new users
 
 
 class TransactionType(str, Enum):
@@ -22,16 +29,84 @@ class TransactionStatus(str, Enum):
     FAILED = "failed"
 
 
-class UserBalance(db.Model):
+class WebhookStatus(str, Enum):
+    """Processing state of a queued webhook event"""
+
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    DEAD = "dead"
+
+
+class _SQLiteTimestamp(SQLITE_DATETIME):
+    """
+    SQLite DATETIME that binds whole-second values without a fraction.
+
+    SQLite stores CURRENT_TIMESTAMP without fractional seconds, and compares
+    datetimes as text, so a bound ``12:00:00.000000`` would sort after a
+    stored ``12:00:00``. Keyset cursors built from stored values need the
+    same shape to round-trip.
+    """
+
+    _SECONDS = SQLITE_DATETIME(
+        storage_format="%(year)04d-%(month)02d-%(day)02d "
+        "%(hour)02d:%(minute)02d:%(second)02d"
+    )
+
+    def bind_processor(self, dialect):
+        fractional = super().bind_processor(dialect)
+        whole = self._SECONDS.bind_processor(dialect)
+
+        def process(value):
+            if isinstance(value, datetime) and not value.microsecond:
+                return whole(value)
+            return fractional(value)
+
+        return process
+
+
+class StoredTimestamp(TypeDecorator):
+    """A DateTime defaulted by the database; see ``_SQLiteTimestamp``."""
+
+    impl = db.DateTime
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(_SQLiteTimestamp())
+        return dialect.type_descriptor(db.DateTime())
+
+
+class InsufficientBalanceError(ValueError):
+    """A debit would take the balance below zero"""
+
+
+def _dialect_insert(model):
+    """INSERT construct supporting ON CONFLICT for the bound database."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Atomic balance updates not supported on {dialect}")
+    return insert(model)
+
+
+class UserBalance(APIColumns, db.Model):
     """Tracks user balance across all applications"""
 
+    API_COLUMNS = ("balance", "updated_at")
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(
         db.Integer, db.ForeignKey("user.id"), nullable=False, unique=True
     )
     balance = db.Column(
-        db.Numeric(10, 2), nullable=False, default=5.00
+        db.Numeric(10, 2), nullable=False, default=STARTING_BALANCE, index=True
     )  # Start with $5 free credit
+    # Last warning from `flask billing notify-low-balance`
+    low_balance_notified_at = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
     updated_at = db.Column(
         db.DateTime, nullable=False, default=db.func.now(), onupdate=db.func.now()
@@ -45,25 +120,168 @@ class UserBalance(db.Model):
         return self.balance >= Decimal(str(amount))
 
     def debit(self, amount):
-        """Remove money from balance"""
-        if not self.has_sufficient_balance(amount):
-            raise ValueError("Insufficient balance")
-        self.balance -= Decimal(str(amount))
+        """Remove money from balance in a single conditional UPDATE"""
+        self._debit(self.user_id, Decimal(str(amount)))
 
     def credit(self, amount):
-        """Add money to balance"""
-        self.balance += Decimal(str(amount))
+        """Add money to balance in a single UPDATE"""
+        self._credit(self.user_id, Decimal(str(amount)))
 
-    def to_dict(self):
-        return {
-            "balance": float(self.balance),
-            "updated_at": self.updated_at.isoformat(),
-        }
+    # Balance changes are single SQL statements evaluated by the database, so
+    # concurrent requests and webhooks can neither lose updates nor race to
+    # create the row. RETURNING refreshes the identity-mapped instance.
+
+    @classmethod
+    def get_or_create(cls, user_id):
+        """Return the user's balance row, creating it if needed"""
+        balance = cls.query.filter_by(user_id=user_id).first()
+        if balance is None:
+            db.session.execute(
+                _dialect_insert(cls)
+                .values(user_id=user_id, balance=STARTING_BALANCE)
+                .on_conflict_do_nothing(index_elements=["user_id"])
+            )
+            balance = cls.query.filter_by(user_id=user_id).one()
+        return balance
+
+    @classmethod
+    def _credit(cls, user_id, amount):
+        stmt = (
+            _dialect_insert(cls)
+            .values(user_id=user_id, balance=STARTING_BALANCE + amount)
+            .on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={"balance": cls.balance + amount, "updated_at": db.func.now()},
+            )
+            .returning(cls)
+            .execution_options(populate_existing=True)
+        )
+        return db.session.scalars(stmt).one()
+
+    @classmethod
+    def _debit(cls, user_id, amount):
+        stmt = (
+            update(cls)
+            .where(cls.user_id == user_id, cls.balance >= amount)
+            .values(balance=cls.balance - amount, updated_at=db.func.now())
+            .returning(cls)
+            .execution_options(populate_existing=True, synchronize_session=False)
+        )
+        balance = db.session.scalars(stmt).one_or_none()
+        if balance is None:
+            # Either the row is missing or the funds are; provision and retry once
+            cls.get_or_create(user_id)
+            balance = db.session.scalars(stmt).one_or_none()
+        if balance is None:
+            raise InsufficientBalanceError("Insufficient balance")
+        return balance
+
+    @classmethod
+    def record(
+        cls,
+        user_id,
+        amount,
+        transaction_type,
+        status=TransactionStatus.COMPLETED,
+        **fields,
+    ):
+        """
+        Apply a ledger entry to a user's balance and add its Transaction.
+
+        Completed purchases and refunds credit the balance, completed usage
+        debits it (raising InsufficientBalanceError if funds are short), and
+        pending or failed entries leave it untouched. The balance change is
+        one statement; the Transaction row and the rollup upsert follow as
+        separate statements (the ledger row needs the balance id RETURNING
+        supplies). All of them share the caller's database transaction, so
+        they commit or roll back together; the caller commits.
+        """
+        amount = Decimal(str(amount))
+        if status != TransactionStatus.COMPLETED:
+            balance = cls.get_or_create(user_id)
+        elif transaction_type == TransactionType.USAGE:
+            balance = cls._debit(user_id, amount)
+        else:
+            balance = cls._credit(user_id, amount)
+
+        transaction = Transaction(
+            user_id=user_id,
+            balance_id=balance.id,
+            amount=amount,
+            transaction_type=transaction_type,
+            status=status,
+            **fields,
+        )
+        db.session.add(transaction)
+        if status == TransactionStatus.COMPLETED:
+            UsageRollup.add(
+                user_id,
+                fields.get("application"),
+                fields.get("operation"),
+                transaction_type,
+                amount,
+            )
+        return transaction
+
+    @classmethod
+    def low_balance_chunk(cls, threshold, notified_before, after_id=0, limit=1000):
+        """
+        The next ``limit`` balances under ``threshold`` with id above
+        ``after_id``, as (id, balance, email, name) rows in id order.
+
+        Users without an email, and users warned at or after
+        ``notified_before``, are left out.
+        """
+        from backend.models.user import User
+
+        return db.session.execute(
+            db.select(cls.id, cls.balance, User.email, User.name)
+            .join(User, User.id == cls.user_id)
+            .where(
+                cls.balance < threshold,
+                cls.id > after_id,
+                User.email.is_not(None),
+                db.or_(
+                    cls.low_balance_notified_at.is_(None),
+                    cls.low_balance_notified_at < notified_before,
+                ),
+            )
+            .order_by(cls.id)
+            .limit(limit)
+        ).all()
 
+    @classmethod
+    def mark_low_balance_notified(cls, ids, now):
+        db.session.execute(
+            update(cls)
+            .where(cls.id.in_(ids))
+            .values(low_balance_notified_at=now)
+            .execution_options(synchronize_session=False)
+        )
 
-class Transaction(db.Model):
+    @classmethod
+    def version(cls, user_id):
+        """``(balance, updated_at)`` for the user's ETag, or None without a row."""
+        return db.session.execute(
+            db.select(cls.balance, cls.updated_at).filter_by(user_id=user_id)
+        ).first()
+
+
+class Transaction(APIColumns, db.Model):
     """Records all balance transactions across applications"""
 
+    API_COLUMNS = (
+        "id",
+        "application",
+        "amount",
+        "transaction_type",
+        "operation",
+        "status",
+        "reference_id",
+        "transaction_metadata",
+        "created_at",
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     balance_id = db.Column(db.Integer, db.ForeignKey("user_balance.id"), nullable=False)
@@ -82,21 +300,350 @@ class Transaction(db.Model):
     transaction_metadata = db.Column(
         db.JSON, nullable=True
     )  # For app-specific additional data
-    created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+    created_at = db.Column(StoredTimestamp, nullable=False, default=db.func.now())
 
     # Relationships
     user = relationship("User", backref="transactions")
     balance = relationship("UserBalance", backref="transactions")
 
+    # Serve per-user history newest first, with or without the application
+    # filter, straight from an index; the (user_id, id) index answers
+    # latest_id without touching the table
+    __table_args__ = (
+        db.Index("ix_transaction_user_created", "user_id", "created_at", "id"),
+        db.Index("ix_transaction_user_id", "user_id", "id"),
+        db.Index(
+            "ix_transaction_user_app_created",
+            "user_id",
+            "application",
+            "created_at",
+            "id",
+        ),
+    )
+
+    @classmethod
+    def page(cls, user_id, application=None, after=None, limit=50):
+        """
+        One page of a user's history, newest first, as rows of ``API_COLUMNS``.
+
+        ``after`` is the ``(created_at, id)`` of the last row of the previous
+        page; rows strictly older than it are returned (keyset pagination).
+        """
+        stmt = cls.api_select().where(cls.user_id == user_id)
+        if application:
+            stmt = stmt.where(cls.application == application)
+        if after is not None:
+            created_at, last_id = after
+            stmt = stmt.where(
+                tuple_(cls.created_at, cls.id)
+                < tuple_(literal(created_at, cls.created_at.type), last_id)
+            )
+        stmt = stmt.order_by(cls.created_at.desc(), cls.id.desc()).limit(limit)
+        return db.session.execute(stmt).all()
+
+    @classmethod
+    def latest_id(cls, user_id):
+        """The id of the user's newest transaction (0 if none); rows never change."""
+        latest = db.session.query(db.func.max(cls.id)).filter_by(user_id=user_id)
+        return latest.scalar() or 0
+
+    EXPORT_COLUMNS = (
+        "id",
+        "user_id",
+        "application",
+        "amount",
+        "transaction_type",
+        "operation",
+        "status",
+        "reference_id",
+        "transaction_metadata",
+        "created_at",
+    )
+
+    @classmethod
+    def export_rows(
+        cls, user_id=None, application=None, since=None, until=None, chunk_size=1000
+    ):
+        """
+        Iterate over ledger rows as tuples of ``EXPORT_COLUMNS``, oldest first.
+
+        Rows are read ``chunk_size`` at a time (a server-side cursor on
+        Postgres) and never become ORM instances, so memory stays flat however
+        large the ledger is. ``since`` is inclusive and ``until`` exclusive.
+        """
+        stmt = db.select(*(getattr(cls, name) for name in cls.EXPORT_COLUMNS))
+        if user_id is not None:
+            stmt = stmt.where(cls.user_id == user_id)
+        if application:
+            stmt = stmt.where(cls.application == application)
+        if since is not None:
+            stmt = stmt.where(cls.created_at >= since)
+        if until is not None:
+            stmt = stmt.where(cls.created_at < until)
+        stmt = stmt.order_by(cls.id).execution_options(yield_per=chunk_size)
+        for partition in db.session.execute(stmt).partitions():
+            yield from partition
+
+
+class UsageRollup(db.Model):
+    """
+    Completed ledger entries per user, day, application, operation and type.
+
+    Maintained by ``UserBalance.record`` in the same database transaction as
+    the entry itself, so ``/billing/summary`` never scans ``transaction``.
+    ``rebuild`` recomputes it from the ledger. Operation is stored as "" when
+    unset so the unique key also covers rows without one.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    application = db.Column(db.String(50), nullable=False)
+    operation = db.Column(db.String(50), nullable=False, default="")
+    transaction_type = db.Column(db.Enum(TransactionType), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "user_id",
+            "day",
+            "application",
+            "operation",
+            "transaction_type",
+            name="uq_usage_rollup_key",
+        ),
+    )
+
+    KEY = ("user_id", "day", "application", "operation", "transaction_type")
+
+    @classmethod
+    def add(cls, user_id, application, operation, transaction_type, amount):
+        """Fold one completed entry into today's bucket with a single upsert."""
+        stmt = (
+            _dialect_insert(cls)
+            # Same clock as Transaction.created_at's default
+            .values(
+                user_id=user_id,
+                day=db.func.date(db.func.now()),
+                application=application,
+                operation=operation or "",
+                transaction_type=transaction_type,
+                count=1,
+                total=amount,
+            )
+        )
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=list(cls.KEY),
+                set_={"count": cls.count + 1, "total": cls.total + amount},
+            )
+        )
+
+    @classmethod
+    def recompute(cls, user_id=None):
+        """The rollup rows as a full scan of the ledger would produce them."""
+        day = db.func.date(Transaction.created_at)
+        operation = db.func.coalesce(Transaction.operation, "")
+        stmt = (
+            db.select(
+                Transaction.user_id,
+                day,
+                Transaction.application,
+                operation,
+                Transaction.transaction_type,
+                db.func.count(),
+                db.func.sum(Transaction.amount),
+            )
+            .where(Transaction.status == TransactionStatus.COMPLETED)
+            .group_by(
+                Transaction.user_id,
+                day,
+                Transaction.application,
+                operation,
+                Transaction.transaction_type,
+            )
+        )
+        if user_id is not None:
+            stmt = stmt.where(Transaction.user_id == user_id)
+        return stmt
+
+    @classmethod
+    def rebuild(cls):
+        """Replace every rollup row with a fresh recompute; the caller commits."""
+        db.session.execute(db.delete(cls))
+        result = db.session.execute(
+            db.insert(cls).from_select(
+                [*cls.KEY, "count", "total"], cls.recompute()
+            )
+        )
+        return result.rowcount
+
+    @classmethod
+    def summary(cls, user_id, application=None, since=None, until=None):
+        """Daily rows and per-application totals for one user."""
+        query = cls.query.filter_by(user_id=user_id)
+        if application:
+            query = query.filter_by(application=application)
+        if since is not None:
+            query = query.filter(cls.day >= since)
+        if until is not None:
+            query = query.filter(cls.day < until)
+        rows = query.order_by(
+            cls.day, cls.application, cls.operation, cls.transaction_type
+        ).all()
+
+        applications = {}
+        for row in rows:
+            totals = applications.setdefault(
+                row.application, {"purchase": 0.0, "usage": 0.0, "refund": 0.0, "count": 0}
+            )
+            kind = row.transaction_type.value
+            totals[kind] = round(totals[kind] + float(row.total), 2)
+            totals["count"] += row.count
+        return {
+            "daily": [row.to_dict() for row in rows],
+            "applications": applications,
+        }
+
     def to_dict(self):
         return {
-            "id": self.id,
+            "day": self.day.isoformat(),
             "application": self.application,
-            "amount": float(self.amount),
+            "operation": self.operation or None,
             "transaction_type": self.transaction_type.value,
-            "operation": self.operation,
-            "status": self.status.value,
-            "reference_id": self.reference_id,
-            "transaction_metadata": self.transaction_metadata,
-            "created_at": self.created_at.isoformat(),
+            "count": self.count,
+            "total": float(self.total),
+        }
+
+
+class WebhookEvent(db.Model):
+    """
+    Outbox of verified Stripe webhook events awaiting processing.
+
+    The webhook endpoint only inserts here; ``backend/src/webhook_queue.py``
+    applies the events. ``event_id`` is unique so Stripe's retries and
+    replays of an event are stored once.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(255), nullable=False, unique=True)
+    event_type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # Raw event JSON
+    status = db.Column(
+        db.Enum(WebhookStatus), nullable=False, default=WebhookStatus.PENDING
+    )
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    # Earliest time a worker may (re)claim the event: retry backoff for
+    # pending events, lease expiry for events being processed
+    available_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    @classmethod
+    def enqueue(cls, event_id, event_type, payload, now):
+        """Store an event unless it is already queued; the caller commits."""
+        db.session.execute(
+            _dialect_insert(cls)
+            .values(
+                event_id=event_id,
+                event_type=event_type,
+                payload=payload,
+                status=WebhookStatus.PENDING,
+                attempts=0,
+                available_at=now,
+            )
+            .on_conflict_do_nothing(index_elements=["event_id"])
+        )
+
+
+class IdempotencyRecord(db.Model):
+    """
+    Stored outcome of a request made with an ``Idempotency-Key`` header.
+
+    A row is claimed (``response_status`` null) before the request runs and
+    filled in once it has; see ``backend/src/idempotency.py``. Keys are
+    scoped to the user and expire after ``IDEMPOTENCY_TTL_SECONDS``.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    # Hash of method, path and body: a key may not be reused for another request
+    fingerprint = db.Column(db.String(64), nullable=False)
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    response_mimetype = db.Column(db.String(100), nullable=True)
+    # While in progress: when another request may take over from a crashed one
+    locked_until = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "key", name="uq_idempotency_user_key"),
+    )
+
+    @property
+    def completed(self):
+        return self.response_status is not None
+
+    @classmethod
+    def claim(cls, user_id, key, fingerprint, now, lock_seconds, ttl_seconds):
+        """
+        Try to become the request that executes ``key``; commits.
+
+        Succeeds for a new key, an expired one, or one whose executing
+        request stopped holding its lock (it crashed).
+        """
+        values = {
+            "fingerprint": fingerprint,
+            "response_status": None,
+            "response_body": None,
+            "response_mimetype": None,
+            "locked_until": now + timedelta(seconds=lock_seconds),
+            "expires_at": now + timedelta(seconds=ttl_seconds),
         }
+        claimed = db.session.execute(
+            _dialect_insert(cls)
+            .values(user_id=user_id, key=key, **values)
+            .on_conflict_do_nothing(index_elements=["user_id", "key"])
+        ).rowcount
+        if not claimed:
+            claimed = db.session.execute(
+                update(cls)
+                .where(
+                    cls.user_id == user_id,
+                    cls.key == key,
+                    db.or_(
+                        cls.expires_at < now,
+                        (cls.response_status.is_(None)) & (cls.locked_until < now),
+                    ),
+                )
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        db.session.commit()
+        return bool(claimed)
+
+    @classmethod
+    def find(cls, user_id, key):
+        return db.session.scalars(
+            db.select(cls)
+            .filter_by(user_id=user_id, key=key)
+            .execution_options(populate_existing=True)
+        ).one_or_none()
+
+    @classmethod
+    def purge_expired(cls, now, batch_size=1000):
+        """Delete expired records in batches; returns how many were removed."""
+        removed = 0
+        while True:
+            ids = db.session.scalars(
+                db.select(cls.id).where(cls.expires_at < now).limit(batch_size)
+            ).all()
+            if not ids:
+                return removed
+            db.session.execute(db.delete(cls).where(cls.id.in_(ids)))
+            db.session.commit()
+            removed += len(ids)
@@ -0,0 +1,28 @@
+"""
+Column-projection serializers for the API models.
+
+A model lists the columns of its API representation in ``API_COLUMNS``.
+``to_dict`` returns their raw values (``Decimal``, ``datetime``, enums), and
+the app's JSON provider (``backend/src/json_provider.py``) encodes them.
+List endpoints select just those columns with ``api_select()`` and turn the
+rows into dicts with ``api_dicts()``. That way no ORM instance is built and
+no value is converted in Python, row by row.
+"""
+
+from backend.extensions import db
+
+
+class APIColumns:
+    API_COLUMNS = ()
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.API_COLUMNS}
+
+    @classmethod
+    def api_select(cls):
+        return db.select(*(getattr(cls, name) for name in cls.API_COLUMNS))
+
+    @classmethod
+    def api_dicts(cls, rows):
+        keys = cls.API_COLUMNS
+        return [dict(zip(keys, row)) for row in rows]
@@ -1,14 +1,21 @@
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 from flask import current_app
 from itsdangerous import URLSafeTimedSerializer
-from passlib.hash import bcrypt
 
-from backend.extensions import db, jwt
+from backend.extensions import db, jwt, password_hasher, revocation_cache
+from backend.models.serializers import APIColumns
+from backend.src.replica import replica_reads
 
 
-class User(db.Model):
+# Access-token claim holding the User.to_dict() payload
+USER_CLAIM = "user"
+
+
+class User(APIColumns, db.Model):
+    API_COLUMNS = ("id", "name", "email", "image")
+
     id = db.Column(db.Integer, primary_key=True)
     google_id = db.Column(db.String(255), nullable=True)
     apple_id = db.Column(db.String(255), nullable=True)
@@ -36,12 +43,13 @@ class User(db.Model):
     group = db.Column(db.String(50), nullable=True)
 
     def set_password(self, password):
-        self.password_hash = bcrypt.hash(password)
+        # bcrypt runs in the shared hashing pool; raises HashingBusyError when full
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
         if not self.password_hash:
             return False
-        return bcrypt.verify(password, self.password_hash)
+        return password_hasher.verify(password, self.password_hash)
 
     def get_reset_token(self, expires_sec=1800):
         s = URLSafeTimedSerializer(current_app.config["SECRET_KEY"])
@@ -56,13 +64,18 @@ class User(db.Model):
             return None
         return User.query.get(user_id)
 
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "email": self.email,
-            "image": self.image,
-        }
+    @classmethod
+    def version(cls, user_id):
+        """The user's ETag version: the ``to_dict`` columns and ``updated_at``."""
+        return db.session.execute(
+            db.select(cls.updated_at, cls.name, cls.email, cls.image).filter_by(
+                id=user_id
+            )
+        ).first()
+
+    def jwt_claims(self):
+        """Profile fields embedded in access tokens for ``LazyUser``."""
+        return {USER_CLAIM: self.to_dict()}
 
     def __repr__(self):
         return f"<User {self.id}>"
@@ -71,10 +84,93 @@ class User(db.Model):
         return f"<User {self.id}>"
 
 
+class LazyUser:
+    """
+    Stand-in for ``current_user`` built from the access token's claims.
+
+    Profile fields embedded at issuance (see ``User.jwt_claims``) are served
+    straight from the token. Reading any other attribute loads the ``User``
+    row once per request and delegates to it. Tokens issued without the
+    claim simply load on first use.
+    """
+
+    __slots__ = ("id", "_claims", "_user", "_loaded")
+
+    def __init__(self, user_id, claims=None):
+        object.__setattr__(self, "id", user_id)
+        object.__setattr__(self, "_claims", dict(claims or {}))
+        object.__setattr__(self, "_user", None)
+        object.__setattr__(self, "_loaded", False)
+
+    def load(self):
+        """Return the ``User`` row (or None if it no longer exists)."""
+        if not self._loaded:
+            # The JWT user lookup; a stale profile is harmless, and a client
+            # that just wrote reads from the primary anyway
+            with replica_reads():
+                user = db.session.get(User, self.id)
+            object.__setattr__(self, "_user", user)
+            object.__setattr__(self, "_loaded", True)
+        return self._user
+
+    def to_dict(self):
+        if not self._loaded and self._claims:
+            return dict(self._claims)
+        user = self.load()
+        return user.to_dict() if user else dict(self._claims)
+
+    def __getattr__(self, name):
+        claims = object.__getattribute__(self, "_claims")
+        if name in claims:
+            return claims[name]
+        user = self.load()
+        if user is None:
+            raise AttributeError(f"User {self.id} no longer exists")
+        return getattr(user, name)
+
+    def __setattr__(self, name, value):
+        # Writes go to the real row; the claim would now be stale
+        self._claims.pop(name, None)
+        setattr(self.load(), name, value)
+
+    def __repr__(self):
+        return f"<LazyUser {self.id}>"
+
+
 class TokenBlocklist(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     jti = db.Column(db.String(36), nullable=False, index=True)
     created_at = db.Column(db.DateTime, nullable=False, default=db.func.now())
+    # When the revoked token itself expires (naive UTC); the row can be pruned
+    # after that. Null for rows written before expiry was recorded.
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    @classmethod
+    def revoke(cls, jti, expires=None):
+        """
+        Add a blocklist row for ``jti``; the caller commits the session.
+
+        ``expires`` is the token's ``exp`` claim (seconds since the epoch).
+        """
+        # Update the shared cache first so no worker can see the committed row
+        # before the cache knows about it
+        revocation_cache.add(jti)
+        expires_at = None
+        if expires is not None:
+            expires_at = datetime.fromtimestamp(expires, timezone.utc).replace(
+                tzinfo=None
+            )
+        db.session.add(cls(jti=jti, expires_at=expires_at))
+
+    @classmethod
+    def rows_after(cls, after_id):
+        """Yield ``(id, jti)`` for blocklist rows newer than ``after_id``."""
+        return (
+            db.session.query(cls.id, cls.jti)
+            .filter(cls.id > after_id)
+            .order_by(cls.id)
+            .yield_per(1000)
+        )
 
 
 @jwt.user_lookup_loader
@@ -82,12 +178,25 @@ def user_lookup_callback(_jwt_header, jwt_data):
     # decode the jwt_data
     identity = jwt_data["sub"]
     # Convert string identity back to integer for database lookup
-    return User.query.filter_by(id=int(identity)).one_or_none()
+    user = LazyUser(int(identity), jwt_data.get(USER_CLAIM))
+    if not current_app.config.get("LAZY_USER_LOOKUP", True):
+        # Eager mode: load now so a deleted user fails the request up front
+        return user if user.load() is not None else None
+    return user
 
 
 # Tell Flask-JWT-Extended to check this table for every protected request
 @jwt.token_in_blocklist_loader
 def check_if_token_revoked(_jwt_header, jwt_payload):
     jti = jwt_payload["jti"]
-    token = TokenBlocklist.query.filter_by(jti=jti).one_or_none()
-    return token is not None
+    revocation_cache.sync(TokenBlocklist.rows_after)
+    cached = revocation_cache.lookup(jti)
+    if cached is not None:
+        return cached
+
+    revoked = (
+        db.session.query(TokenBlocklist.id).filter_by(jti=jti).first() is not None
+    )
+    if revoked:
+        revocation_cache.remember(jti)
+    return revoked
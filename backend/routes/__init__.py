@@ -1,4 +1,8 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, current_app, jsonify
+
+from backend.extensions import password_hasher
+from backend.src.db_engine import pool_stats
+from backend.src.metrics import metrics_response, token_required
 
 from backend.routes.auth import auth_bp
 from backend.routes.billing import billing_bp
@@ -22,3 +26,24 @@ def index():
 def index():
     """API root, returns basic status."""
     return jsonify({"status": "healthy", "message": "Welcome to the API!"})
+
+
+@base_bp.route("/health/hashing")
+@token_required
+def hashing_health():
+    """Password hashing queue depth and latency for this worker."""
+    return jsonify(password_hasher.metrics())
+
+
+@base_bp.route("/health/db")
+@token_required
+def db_health():
+    """Connection pool size, use and counters for this worker."""
+    return jsonify(pool_stats(current_app))
+
+
+@base_bp.route("/metrics")
+@token_required
+def metrics():
+    """Prometheus metrics for all workers on this host."""
+    return metrics_response()
@@ -1,7 +1,6 @@
 import json
 from decimal import Decimal
 
-import stripe
 from flask import Blueprint, current_app, jsonify, make_response, redirect, request
 from flask_jwt_extended import (
     create_access_token,
@@ -16,13 +15,35 @@ from flask_jwt_extended import (
 )
 
 from backend.extensions import db, limiter
-from backend.models.user import TokenBlocklist, User
+from backend.models.user import USER_CLAIM, TokenBlocklist, User
 from backend.src.email_service import send_password_reset_email
+from backend.src.hashing import HashingBusyError
+from backend.src.http_caching import conditional
+from backend.src.mail_queue import MailQueueFullError
 from backend.src.OAuthSignIn import OAuthSignIn
+from backend.src.replica import replica_safe
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
 
 
+def _issue_tokens(user):
+    """Create an access/refresh pair; the access token carries the profile."""
+    identity = str(user.id)
+    access_token = create_access_token(
+        identity=identity, additional_claims=user.jwt_claims()
+    )
+    refresh_token = create_refresh_token(identity=identity)
+    return access_token, refresh_token
+
+
+@auth_bp.errorhandler(HashingBusyError)
+def hashing_busy(e):
+    # Shed password work instead of letting it queue up behind every worker
+    response = jsonify(msg="Server busy, please try again shortly")
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
 @auth_bp.route("/register", methods=["POST"])
 @limiter.limit("5 per minute")
 def register():
@@ -60,8 +81,7 @@ def login():
     if not user or not user.check_password(password):
         return jsonify(msg="Bad email or password"), 401
 
-    access_token = create_access_token(identity=str(user.id))
-    refresh_token = create_refresh_token(identity=str(user.id))
+    access_token, refresh_token = _issue_tokens(user)
 
     response = jsonify(user=user.to_dict())
     set_access_cookies(response, access_token)
@@ -75,8 +95,8 @@ def logout():
     response = jsonify(msg="logout successful")
 
     # Revoke access token
-    access_jti = get_jwt()["jti"]
-    db.session.add(TokenBlocklist(jti=access_jti))
+    token = get_jwt()
+    TokenBlocklist.revoke(token["jti"], token.get("exp"))
     db.session.commit()
 
     unset_jwt_cookies(response)
@@ -89,8 +109,8 @@ def logout_refresh():
     response = jsonify(msg="refresh token revoked")
 
     # Revoke refresh token
-    refresh_jti = get_jwt()["jti"]
-    db.session.add(TokenBlocklist(jti=refresh_jti))
+    token = get_jwt()
+    TokenBlocklist.revoke(token["jti"], token.get("exp"))
     db.session.commit()
 
     unset_jwt_cookies(response)
@@ -100,29 +120,48 @@ def logout_refresh():
 @auth_bp.route("/refresh", methods=["POST"])
 @jwt_required(refresh=True)
 def refresh():
-    identity = get_jwt_identity()
+    # Reload the row so profile changes reach the new access token's claims
+    user = current_user.load()
+    if not user:
+        return jsonify(msg="User not found"), 404
+
+    # Create new tokens before the commit expires the user's attributes
+    new_access_token, new_refresh_token = _issue_tokens(user)
 
     # Revoke the old refresh token
-    old_refresh_jti = get_jwt()["jti"]
-    db.session.add(TokenBlocklist(jti=old_refresh_jti))
+    token = get_jwt()
+    TokenBlocklist.revoke(token["jti"], token.get("exp"))
     db.session.commit()
 
-    # Create new tokens
-    new_access_token = create_access_token(identity=identity)
-    new_refresh_token = create_refresh_token(identity=identity)
-
     response = jsonify(msg="token refreshed")
     set_access_cookies(response, new_access_token)
     set_refresh_cookies(response, new_refresh_token)
     return response, 200
 
 
+def _me_version():
+    # Without ?fresh the profile comes from the token itself: no query
+    claims = get_jwt().get(USER_CLAIM)
+    if claims and request.args.get("fresh", "").lower() not in ["true", "on", "1"]:
+        return sorted(claims.items())
+    return User.version(int(get_jwt_identity()))
+
+
 @auth_bp.route("/me", methods=["GET"])
 @jwt_required()
+@replica_safe
+@conditional(_me_version)
 def get_me():
-    # current_user is populated by our user_lookup_loader
-    if not current_user:
-        return jsonify(msg="User not found"), 404
+    # current_user is a LazyUser answered from the token's claims, so this
+    # normally runs without a query. The claims are only as current as the
+    # access token: a user deleted since it was issued still gets 200 until
+    # it expires (JWT_ACCESS_TOKEN_EXPIRES), and /refresh then answers 404.
+    # ?fresh=1 reads the row instead and is the authoritative check.
+    if request.args.get("fresh", "").lower() in ["true", "on", "1"]:
+        user = current_user.load()
+        if not user:
+            return jsonify(msg="User not found"), 404
+        return jsonify(user=user.to_dict()), 200
     return jsonify(user=current_user.to_dict()), 200
 
 
@@ -133,7 +172,11 @@ def forgot_password():
     email = data.get("email")
     user = User.query.filter_by(email=email).first()
     if user:
-        send_password_reset_email(user)
+        try:
+            send_password_reset_email(user)
+        except MailQueueFullError:
+            # Answer as usual: an error here would reveal the account exists
+            current_app.logger.error("Password reset email dropped: mail queue full")
     # Always return a success message to prevent email enumeration
     return (
         jsonify(
@@ -167,16 +210,19 @@ def reset_password(token):
 @auth_bp.route("/authorize/<provider>")
 def oauth_authorize(provider):
     # Check if OAuth is configured for this provider
-    if provider not in current_app.config.get("OAUTH_CREDENTIALS", {}):
-        return jsonify(error="OAuth not configured for this provider"), 400
-    
     oauth = OAuthSignIn.get_provider(provider)
+    if oauth is None:
+        return jsonify(error="OAuth not configured for this provider"), 400
+
     return oauth.authorize()
 
 
 @auth_bp.route("/callback/<provider>")
 def oauth_callback(provider):
     oauth = OAuthSignIn.get_provider(provider)
+    if oauth is None:
+        return jsonify(error="OAuth not configured for this provider"), 400
+
     social_id, name, email, picture = oauth.callback()
 
     if social_id is None:
@@ -201,8 +247,7 @@ def oauth_callback(provider):
 
     # User exists and is using the correct OAuth provider, or a new user was created.
     # Proceed with login.
-    access_token = create_access_token(identity=str(user.id))
-    refresh_token = create_refresh_token(identity=str(user.id))
+    access_token, refresh_token = _issue_tokens(user)
 
     redirect_url = f"{current_app.config['FRONTEND_URL']}/auth/callback"
     response = make_response(redirect(redirect_url))
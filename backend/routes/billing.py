@@ -1,18 +1,32 @@
+import base64
 import json
+from datetime import date, datetime
 from decimal import Decimal
 
-import stripe
-from flask import Blueprint, current_app, jsonify, request
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    g,
+    jsonify,
+    request,
+    stream_with_context,
+)
 from flask_jwt_extended import get_jwt_identity, jwt_required
 
-from backend.extensions import create_logger, db
+from backend.extensions import create_logger, db, stripe_gateway
 from backend.models.billing import (
     Transaction,
-    TransactionStatus,
     TransactionType,
+    UsageRollup,
     UserBalance,
 )
 from backend.models.user import User
+from backend.src import idempotency, webhook_queue
+from backend.src.http_caching import conditional
+from backend.src.idempotency import idempotent
+from backend.src.ledger_export import FORMATS, export_transactions, gzip_chunks
+from backend.src.replica import replica_safe
 
 billing_bp = Blueprint("billing", __name__, url_prefix="/billing")
 logger = create_logger(__name__, level="DEBUG")
@@ -20,37 +34,129 @@ logger = create_logger(__name__, level="DEBUG")
 
 @billing_bp.route("/balance", methods=["GET"])
 @jwt_required()
+@replica_safe
+@conditional(lambda: UserBalance.version(get_jwt_identity()))
 def get_balance():
     """Get current user's balance"""
-    user_id = get_jwt_identity()
-    balance = UserBalance.query.filter_by(user_id=user_id).first()
+    # Creates the initial $5.00 balance for new users
+    balance = UserBalance.get_or_create(get_jwt_identity())
+    payload = balance.to_dict()  # Before the commit expires the row
+    db.session.commit()
+
+    return jsonify(payload)
 
-    if not balance:
-        # Create initial balance with $5.00 for new users
-        balance = UserBalance(user_id=user_id)
-        db.session.add(balance)
-        db.session.commit()
 
-    return jsonify(balance.to_dict())
+def _encode_cursor(transaction):
+    raw = json.dumps([transaction.created_at.isoformat(), transaction.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    created_at, transaction_id = json.loads(raw)
+    return datetime.fromisoformat(created_at), int(transaction_id)
 
 
 @billing_bp.route("/transactions", methods=["GET"])
 @jwt_required()
+@replica_safe
+@conditional(lambda: Transaction.latest_id(get_jwt_identity()))
 def get_transactions():
-    """Get user's transaction history"""
+    """Get a page of the user's transaction history, newest first"""
     user_id = get_jwt_identity()
     application = request.args.get("application")  # Optional filter by application
 
-    query = Transaction.query.filter_by(user_id=user_id)
-    if application:
-        query = query.filter_by(application=application)
+    max_limit = current_app.config["TRANSACTIONS_MAX_PAGE_SIZE"]
+    limit = request.args.get(
+        "limit", current_app.config["TRANSACTIONS_PAGE_SIZE"], type=int
+    )
+    limit = min(max(limit, 1), max_limit)
+
+    after = None
+    if request.args.get("cursor"):
+        try:
+            after = _decode_cursor(request.args["cursor"])
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid cursor"}), 400
+
+    # Fetch one extra row to learn whether another page exists
+    transactions = Transaction.page(user_id, application, after, limit + 1)
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        next_cursor = _encode_cursor(transactions[-1])
+
+    return jsonify(
+        {
+            "transactions": Transaction.api_dicts(transactions),
+            "next_cursor": next_cursor,
+        }
+    )
+
 
-    transactions = query.order_by(Transaction.created_at.desc()).all()
-    return jsonify([t.to_dict() for t in transactions])
+@billing_bp.route("/transactions/export", methods=["GET"])
+@jwt_required()
+def export_user_transactions():
+    """Stream the user's full transaction history as NDJSON or CSV"""
+    user_id = get_jwt_identity()
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in FORMATS:
+        return jsonify({"error": "Invalid format"}), 400
+
+    try:
+        # ISO dates or datetimes; since is inclusive, until exclusive
+        since, until = (
+            datetime.fromisoformat(request.args[name]) if request.args.get(name) else None
+            for name in ("since", "until")
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid date"}), 400
+
+    chunks = export_transactions(
+        fmt,
+        user_id=user_id,
+        application=request.args.get("application"),
+        since=since,
+        until=until,
+    )
+    headers = {
+        "Content-Disposition": f"attachment; filename=transactions.{fmt}",
+        "Cache-Control": "no-store",
+    }
+    if request.args.get("gzip", "").lower() in ["true", "on", "1"]:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+
+    # The generator runs after this view returns; keep the request context
+    return Response(
+        stream_with_context(chunks), mimetype=FORMATS[fmt], headers=headers
+    )
+
+
+@billing_bp.route("/summary", methods=["GET"])
+@jwt_required()
+def get_summary():
+    """Spend per application, operation, type and day from the usage rollup"""
+    user_id = get_jwt_identity()
+    try:
+        # ISO dates; since is inclusive, until exclusive
+        since, until = (
+            date.fromisoformat(request.args[name]) if request.args.get(name) else None
+            for name in ("since", "until")
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid date"}), 400
+
+    return jsonify(
+        UsageRollup.summary(
+            user_id, request.args.get("application"), since=since, until=until
+        )
+    )
 
 
 @billing_bp.route("/balance/add", methods=["POST"])
 @jwt_required()
+@idempotent
 def add_funds():
     """Add funds to user's balance"""
     user_id = get_jwt_identity()
@@ -60,30 +166,21 @@ def add_funds():
     if amount <= 0:
         return jsonify({"error": "Invalid amount"}), 400
 
-    balance = UserBalance.query.filter_by(user_id=user_id).first()
-    if not balance:
-        balance = UserBalance(user_id=user_id)
-        db.session.add(balance)
-
-    # Create transaction record
-    transaction = Transaction(
-        user_id=user_id,
-        balance_id=balance.id,
+    # Credit the balance and record the transaction atomically
+    transaction = UserBalance.record(
+        user_id,
+        amount,
+        TransactionType.PURCHASE,
         application=data.get(
             "application", "platform"
         ),  # Track which app initiated the purchase
-        amount=amount,
-        transaction_type=TransactionType.PURCHASE,
-        status=TransactionStatus.COMPLETED,
         transaction_metadata=data.get("metadata"),
     )
-    db.session.add(transaction)
-
-    # Update balance
-    balance.credit(amount)
-    db.session.commit()
+    idempotency.commit()
 
-    return jsonify({"balance": balance.to_dict(), "transaction": transaction.to_dict()})
+    return jsonify(
+        {"balance": transaction.balance.to_dict(), "transaction": transaction.to_dict()}
+    )
 
 
 @billing_bp.route("/stripe/publishable_key", methods=["GET"])
@@ -93,6 +190,7 @@ def fetch_stripe_publishable_key():
 
 @billing_bp.route("/create-payment-sheet", methods=["POST"])
 @jwt_required()
+@idempotent
 def create_payment_sheet():
     """Create a Stripe PaymentSheet with customer and ephemeral key"""
     try:
@@ -104,44 +202,33 @@ def create_payment_sheet():
 
         # Amount should be in cents for Stripe
         stripe_amount = int(float(amount) * 100)
-
-        # Initialize Stripe with secret key
-        stripe.api_key = current_app.config["STRIPE_SECRET_KEY"]
+        idempotency_key = g.get("idempotency_key")
 
         # Get user
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = db.session.get(User, int(user_id))
 
-        # Get or create Stripe customer
+        # Create the Stripe customer on first use; afterwards the stored id is
+        # all we need, so there is no Customer.retrieve round trip
         if not user.stripe_customer_id:
-            customer = stripe.Customer.create(
-                email=user.email, metadata={"user_id": user_id}
+            user.stripe_customer_id = stripe_gateway.create_customer(
+                user.email, user_id, idempotency_key
             )
-            user.stripe_customer_id = customer.id
-            db.session.commit()
-        else:
-            customer = stripe.Customer.retrieve(user.stripe_customer_id)
-
-        # Create ephemeral key
-        ephemeral_key = stripe.EphemeralKey.create(
-            customer=customer.id,
-            stripe_version=stripe.api_version,
-        )
+            idempotency.commit()
 
-        # Create payment intent
-        payment_intent = stripe.PaymentIntent.create(
-            amount=stripe_amount,
-            currency="usd",
-            customer=customer.id,
+        # Ephemeral key and payment intent are created concurrently
+        ephemeral_key, payment_intent = stripe_gateway.payment_sheet(
+            user.stripe_customer_id,
+            stripe_amount,
             metadata={"user_id": user_id, "type": "add_funds"},
-            automatic_payment_methods={"enabled": True},
+            idempotency_key=idempotency_key,
         )
 
         return jsonify(
             {
                 "paymentIntent": payment_intent.client_secret,
                 "ephemeralKey": ephemeral_key.secret,
-                "customer": customer.id,
+                "customer": user.stripe_customer_id,
                 "publishableKey": current_app.config["STRIPE_PUBLISHABLE_KEY"],
             }
         )
@@ -160,14 +247,13 @@ def stripe_webhook():
     event = None
     payload = request.data
     sig_header = request.headers.get("stripe-signature")
-    endpoint_secret = current_app.config["STRIPE_WEBHOOK_SECRET"]
+    endpoint_secret = current_app.config.get("STRIPE_WEBHOOK_SECRET")
 
     try:
-        # Initialize Stripe with secret key
-        stripe.api_key = current_app.config["STRIPE_SECRET_KEY"]
-
         if endpoint_secret:
             # Only verify the event if there is an endpoint secret defined
+            import stripe
+
             try:
                 event = stripe.Webhook.construct_event(
                     payload, sig_header, endpoint_secret
@@ -187,89 +273,23 @@ def stripe_webhook():
                 logger.error(f"⚠️  Webhook error while parsing basic request: {str(e)}")
                 return jsonify(success=False), 400
 
-        # Handle the event
-        if event["type"] == "payment_intent.succeeded":
-            payment_intent = event["data"]["object"]
-            current_app.logger.info(f"Payment for {payment_intent['amount']} succeeded")
-
-            # Get user ID from metadata
-            user_id = int(payment_intent["metadata"].get("user_id"))
-            amount = float(payment_intent["amount"]) / 100  # Convert cents to dollars
-
-            # Update user balance
-            balance = UserBalance.query.filter_by(user_id=user_id).first()
-            if not balance:
-                balance = UserBalance(user_id=user_id)
-                db.session.add(balance)
-
-            # Create transaction record
-            transaction = Transaction(
-                user_id=user_id,
-                balance_id=balance.id,
-                application="platform",
-                amount=amount,
-                transaction_type=TransactionType.PURCHASE,
-                status=TransactionStatus.COMPLETED,
-                transaction_metadata={
-                    "stripe_payment_intent": payment_intent["id"],
-                    "stripe_payment_method": payment_intent.get("payment_method"),
-                    "stripe_customer": payment_intent.get("customer"),
-                },
-            )
-            db.session.add(transaction)
-
-            # Update balance
-            balance.credit(amount)
-            db.session.commit()
-
-        elif event["type"] == "payment_intent.payment_failed":
-            payment_intent = event["data"]["object"]
-            current_app.logger.error(f"❌ Payment failed: {payment_intent['id']}")
-
-            # Get user ID from metadata
-            user_id = int(payment_intent["metadata"].get("user_id"))
-            amount = float(payment_intent["amount"]) / 100
-
-            # Create failed transaction record
-            transaction = Transaction(
-                user_id=user_id,
-                balance_id=UserBalance.query.filter_by(user_id=user_id).first().id,
-                application="platform",
-                amount=amount,
-                transaction_type=TransactionType.PURCHASE,
-                status=TransactionStatus.FAILED,
-                transaction_metadata={
-                    "stripe_payment_intent": payment_intent["id"],
-                    "stripe_error": payment_intent.get("last_payment_error"),
-                },
-            )
-            db.session.add(transaction)
+        # Queue balance-affecting events for the webhook workers and ack at
+        # once; Stripe's retries and replays of an event are stored once
+        if event["type"] in webhook_queue.HANDLERS:
+            webhook_queue.enqueue(event, payload.decode("utf-8"))
             db.session.commit()
-
-        elif event["type"] == "payment_intent.created":
-            payment_intent = event["data"]["object"]
+            webhook_queue.notify()
+            logger.debug(f"Queued Stripe event {event['id']} ({event['type']})")
+        elif event["type"] in (
+            "payment_intent.created",
+            "charge.succeeded",
+            "charge.updated",
+            "payment_method.attached",
+        ):
+            # Informational; payment_intent.succeeded updates the balance
             current_app.logger.info(
-                f"Payment intent {payment_intent['id']} created for amount {payment_intent['amount']}"
+                f"Stripe event {event['type']} for {event['data']['object']['id']}"
             )
-
-        elif event["type"] == "charge.succeeded":
-            charge = event["data"]["object"]
-            current_app.logger.info(
-                f"Charge {charge['id']} succeeded for amount {charge['amount']}"
-            )
-            # The payment_intent.succeeded event is already handling the balance update,
-            # so we just log this event
-
-        elif event["type"] == "charge.updated":
-            charge = event["data"]["object"]
-            current_app.logger.info(
-                f"Charge {charge['id']} was updated. New status: {charge['status']}"
-            )
-
-        elif event["type"] == "payment_method.attached":
-            payment_method = event["data"]["object"]
-            current_app.logger.info(f"Payment method {payment_method['id']} attached")
-
         else:
             # Unexpected event type
             current_app.logger.warning(f"Unhandled event type {event['type']}")
@@ -1,17 +1,67 @@
-import json
+"""
+OAuth sign-in providers.
 
+Providers are built once per app, under a lock, on first use, and share one
+keep-alive ``requests`` session per process with explicit connect/read
+timeouts (``OAUTH_CONNECT_TIMEOUT``, ``OAUTH_READ_TIMEOUT``), so a slow
+provider cannot hold a worker thread indefinitely.
+
+Google's callback costs a single round trip: the code is exchanged for
+tokens, and the profile is read from the returned ``id_token`` after checking
+its signature against Google's cached certs (``google_jwks``). The userinfo
+endpoint is only called when no id_token comes back or the certs cannot be
+obtained. The endpoint URLs are configurable, so tests can point them at
+``backend/benchmarks/fake_oauth.py``.
+"""
+
+import os
+import threading
+from urllib.parse import urlencode
+
+import jwt
 from flask import current_app, redirect, request, url_for
-from rauth import OAuth2Service
+
+from backend.extensions import google_jwks
+from backend.src.jwks_cache import JWKSError
+from backend.src.metrics import timed_call
+
+_lock = threading.Lock()
+_http = {"pid": None, "session": None}
+
+
+class OAuthError(Exception):
+    """The provider rejected the sign-in or could not be reached."""
+
+
+def http_session():
+    """The process-wide pooled session used for every provider call."""
+    # Per process: a session inherited across a gunicorn fork would share
+    # sockets with the parent
+    with _lock:
+        if _http["session"] is None or _http["pid"] != os.getpid():
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            pool_size = current_app.config.get("OAUTH_POOL_SIZE", 10)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http.update(pid=os.getpid(), session=session)
+        return _http["session"]
 
 
 class OAuthSignIn(object):
-    providers = None
+    provider_name = None
 
-    def __init__(self, provider_name):
-        self.provider_name = provider_name
-        credentials = current_app.config["OAUTH_CREDENTIALS"][provider_name]
+    def __init__(self):
+        credentials = current_app.config["OAUTH_CREDENTIALS"][self.provider_name]
         self.consumer_id = credentials["id"]
         self.consumer_secret = credentials["secret"]
+        self.timeout = (
+            current_app.config.get("OAUTH_CONNECT_TIMEOUT", 3),
+            current_app.config.get("OAUTH_READ_TIMEOUT", 10),
+        )
 
     def authorize(self):
         pass
@@ -20,63 +70,127 @@ class OAuthSignIn(object):
         pass
 
     def get_callback_url(self):
-        print(f"getting callback url for {self.provider_name}")
-        url = url_for(
+        return url_for(
             "api.auth.oauth_callback", provider=self.provider_name, _external=True
         )
-        print(f"callback url: {url}")
-        return url
+
+    def request(self, method, url, operation, **kwargs):
+        """
+        Call the provider through the shared pool; raises OAuthError.
+
+        ``operation`` names the call in the ``external_call_duration_seconds``
+        metric.
+        """
+        import requests
+
+        try:
+            with timed_call(self.provider_name, operation):
+                response = http_session().request(
+                    method, url, timeout=self.timeout, **kwargs
+                )
+                response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise OAuthError(f"{self.provider_name}: {e}") from e
 
     @classmethod
-    def get_provider(self, provider_name):
-        if self.providers is None:
-            self.providers = {}
-            for provider_class in self.__subclasses__():
-                provider = provider_class()
-                self.providers[provider.provider_name] = provider
-        return self.providers[provider_name]
+    def get_provider(cls, provider_name):
+        """The app's provider instance for ``provider_name``, or None."""
+        providers = current_app.extensions.setdefault("oauth_providers", {})
+        provider = providers.get(provider_name)
+        if provider is None:
+            with _lock:
+                provider = providers.get(provider_name)
+                if provider is None:
+                    if provider_name not in current_app.config.get(
+                        "OAUTH_CREDENTIALS", {}
+                    ):
+                        return None
+                    for provider_class in cls.__subclasses__():
+                        if provider_class.provider_name == provider_name:
+                            provider = providers[provider_name] = provider_class()
+        return provider
 
 
 class GoogleSignIn(OAuthSignIn):
+    provider_name = "google"
+    issuers = ("accounts.google.com", "https://accounts.google.com")
+
     def __init__(self):
-        super(GoogleSignIn, self).__init__("google")
-        self.service = OAuth2Service(
-            name="google",
-            client_id=self.consumer_id,
-            client_secret=self.consumer_secret,
-            authorize_url="https://accounts.google.com/o/oauth2/auth",
-            access_token_url="https://accounts.google.com/o/oauth2/token",
-            base_url="https://www.googleapis.com/oauth2/v1/",
+        super(GoogleSignIn, self).__init__()
+        config = current_app.config
+        self.authorize_url = config.get(
+            "GOOGLE_OAUTH_AUTHORIZE_URL", "https://accounts.google.com/o/oauth2/auth"
+        )
+        self.token_url = config.get(
+            "GOOGLE_OAUTH_TOKEN_URL", "https://oauth2.googleapis.com/token"
+        )
+        self.userinfo_url = config.get(
+            "GOOGLE_OAUTH_USERINFO_URL", "https://www.googleapis.com/oauth2/v1/userinfo"
         )
 
     def authorize(self, next_path="/"):
-        return redirect(
-            self.service.get_authorize_url(
-                scope="openid email profile",
-                response_type="code",
-                redirect_uri=self.get_callback_url(),
-                state=next_path,
-            )
-        )
+        params = {
+            "client_id": self.consumer_id,
+            "scope": "openid email profile",
+            "response_type": "code",
+            "redirect_uri": self.get_callback_url(),
+            "state": next_path,
+        }
+        return redirect(f"{self.authorize_url}?{urlencode(params)}")
 
     def callback(self):
-        def decode_json(payload):
-            return json.loads(payload.decode("utf-8"))
-
         if "code" not in request.args:
-            return None, None, None
-        oauth_session = self.service.get_auth_session(
-            data={
-                "code": request.args["code"],
-                "grant_type": "authorization_code",
-                "redirect_uri": self.get_callback_url(),
-            },
-            decoder=decode_json,
-        )
-        me = oauth_session.get("userinfo").json()
-        social_id = me["id"]
-        email = me["email"]
-        name = me["name"]
-        picture = me["picture"]
+            return None, None, None, None
+        try:
+            tokens = self.request(
+                "POST",
+                self.token_url,
+                "token",
+                data={
+                    "code": request.args["code"],
+                    "client_id": self.consumer_id,
+                    "client_secret": self.consumer_secret,
+                    "grant_type": "authorization_code",
+                    "redirect_uri": self.get_callback_url(),
+                },
+            )
+            me = self._verified_profile(tokens.get("id_token"))
+            if me is None:
+                me = self.request(
+                    "GET",
+                    self.userinfo_url,
+                    "userinfo",
+                    headers={"Authorization": f"Bearer {tokens['access_token']}"},
+                )
+                me["sub"] = me["id"]
+        except (OAuthError, KeyError, jwt.InvalidTokenError) as e:
+            current_app.logger.warning(f"Google sign-in failed: {e}")
+            return None, None, None, None
+
+        return me["sub"], me.get("name"), me["email"], me.get("picture")
 
-        return social_id, name, email, picture
+    def _verified_profile(self, id_token):
+        """
+        The claims of ``id_token`` once its signature, audience and issuer
+        check out; None if there is no token or Google's certs are unavailable.
+        """
+        if not id_token:
+            return None
+        try:
+            key = google_jwks.get_key(jwt.get_unverified_header(id_token).get("kid"))
+        except JWKSError as e:
+            current_app.logger.warning(f"Falling back to userinfo: {e}")
+            return None
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        claims = jwt.decode(
+            id_token,
+            key,
+            algorithms=["RS256"],
+            audience=self.consumer_id,
+            options={"require": ["exp", "iss", "sub"]},
+        )
+        if claims["iss"] not in self.issuers:
+            raise jwt.InvalidIssuerError("Unexpected issuer")
+        return claims
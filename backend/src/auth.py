@@ -1,45 +1,9 @@
-from datetime import datetime, timedelta
-
 import jwt
-import requests
 from flask import current_app
-from jwt.algorithms import RSAAlgorithm
 
-from backend.extensions import db
+from backend.extensions import apple_jwks, db, verified_tokens
 from backend.models.user import User
-
-# Cache for Apple's public keys
-_apple_public_keys = {}
-_apple_keys_expiry = None
-
-
-def _get_apple_public_keys():
-    """Fetch and cache Apple's public keys"""
-    global _apple_public_keys, _apple_keys_expiry
-
-    # Return cached keys if they're still valid
-    if (
-        _apple_public_keys
-        and _apple_keys_expiry
-        and datetime.now() < _apple_keys_expiry
-    ):
-        return _apple_public_keys
-
-    # Fetch new keys
-    response = requests.get("https://appleid.apple.com/auth/keys")
-    response.raise_for_status()
-
-    keys_data = response.json()
-    _apple_public_keys = {}
-
-    # Convert each key to PEM format
-    for key in keys_data["keys"]:
-        _apple_public_keys[key["kid"]] = RSAAlgorithm.from_jwk(key)
-
-    # Cache for 24 hours
-    _apple_keys_expiry = datetime.now() + timedelta(hours=24)
-
-    return _apple_public_keys
+from backend.src.jwks_cache import JWKSError
 
 
 def validate_apple_token(identity_token: str, bundle_id: str = None) -> dict:
@@ -55,57 +19,54 @@ def validate_apple_token(identity_token: str, bundle_id: str = None) -> dict:
     Raises:
         ValueError: If the token is invalid
     """
+    # Verification in debug skips the exp and aud checks, so it is cached
+    # under a separate key
+    debug = current_app.debug
+    cache_key = verified_tokens.key(identity_token, "apple", bundle_id, debug)
+    claims = verified_tokens.get(cache_key)
+    if claims is not None:
+        return claims
+
     try:
-        # First, decode the token without verification to get the key ID
-        unverified_headers = jwt.get_unverified_header(identity_token)
-        kid = unverified_headers.get("kid")
+        # Read the key ID from the header segment only; the payload is parsed
+        # once, by the verifying decode below
+        kid = jwt.get_unverified_header(identity_token).get("kid")
 
         if not kid:
             raise ValueError("No key ID found in token header")
 
-        # Get Apple's public keys
-        public_keys = _get_apple_public_keys()
-        public_key = public_keys.get(kid)
+        # Get Apple's public key (cached; refetched if the kid is new)
+        public_key = apple_jwks.get_key(kid)
 
         if not public_key:
             raise ValueError("Invalid key ID")
 
-        # Set up decode options
-        decode_options = {
-            "verify_sub": True,
-            # Don't verify expiration in development to make testing easier
-            "verify_exp": not current_app.debug,
-        }
-
-        decode_kwargs = {
-            "algorithms": ["RS256"],
-            "options": decode_options,
-        }
-
-        # Only verify audience in production and if bundle ID is configured
-        if bundle_id and not current_app.debug:
-            decode_kwargs["audience"] = bundle_id
-        else:
-            # In development, get the audience from the token itself
-            unverified_payload = jwt.decode(
-                identity_token, options={"verify_signature": False}
-            )
+        # Only verify audience in production and if bundle ID is configured.
+        # Don't verify expiration in development to make testing easier.
+        verify_aud = bool(bundle_id) and not debug
+        decoded_token = jwt.decode(
+            identity_token,
+            public_key,
+            algorithms=["RS256"],
+            audience=bundle_id if verify_aud else None,
+            options={
+                "verify_sub": True,
+                "verify_exp": not debug,
+                "verify_aud": verify_aud,
+            },
+        )
+        if debug:
             current_app.logger.debug(
-                f"Development mode - Token audience: {unverified_payload.get('aud')}"
+                f"Development mode - Token audience: {decoded_token.get('aud')}"
             )
-            # Still verify the token, but use the audience from the token
-            if "aud" in unverified_payload:
-                decode_kwargs["audience"] = unverified_payload["aud"]
-
-        # Verify and decode the token
-        decoded_token = jwt.decode(identity_token, public_key, **decode_kwargs)
 
+        verified_tokens.put(cache_key, decoded_token, verify_exp=not debug)
         return decoded_token
 
     except jwt.InvalidTokenError as e:
         current_app.logger.error(f"Token validation error: {str(e)}")
         raise ValueError(f"Invalid token: {str(e)}")
-    except requests.RequestException as e:
+    except JWKSError as e:
         current_app.logger.error(f"Failed to fetch Apple public keys: {str(e)}")
         raise ValueError(f"Failed to fetch Apple public keys: {str(e)}")
     except Exception as e:
@@ -0,0 +1,27 @@
+"""Helpers for background threads owned by serving processes."""
+
+import os
+import threading
+
+
+def start_in_each_worker(app, start):
+    """
+    Call ``start(app)`` on the first request each serving process handles.
+
+    CLI invocations such as ``flask db upgrade`` never serve a request, so
+    they never start background threads, and every forked gunicorn worker
+    starts its own.
+    """
+    started = {"pid": None}
+    lock = threading.Lock()
+
+    def _start_background_thread():
+        if started["pid"] == os.getpid():
+            return
+        with lock:
+            if started["pid"] != os.getpid():
+                start(app)
+                started["pid"] = os.getpid()
+
+    _start_background_thread.__name__ = f"_start_{start.__name__}"
+    app.before_request(_start_background_thread)
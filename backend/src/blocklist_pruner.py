@@ -0,0 +1,147 @@
+"""
+Pruning of expired TokenBlocklist rows.
+
+Once a revoked token's ``exp`` has passed, JWT verification rejects it before
+the blocklist is ever consulted, so its row is dead weight. Rows are deleted
+in small id-bounded batches, each in its own short transaction, so neither
+SQLite nor Postgres holds a long lock on the table.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import delete, func, or_, select
+
+from backend.extensions import create_logger, db, revocation_cache
+from backend.models.user import TokenBlocklist
+from backend.src.background import start_in_each_worker
+
+logger = create_logger(__name__)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _as_timedelta(value):
+    """Flask-JWT-Extended accepts seconds or a timedelta for these settings."""
+    if isinstance(value, timedelta):
+        return value
+    return timedelta(seconds=value)
+
+
+def _expired_clause(now):
+    config = current_app.config
+    cutoff = now - _as_timedelta(config.get("JWT_DECODE_LEEWAY", 0))
+    expired = TokenBlocklist.expires_at < cutoff
+
+    # Rows from before expires_at existed outlive any token they could cover
+    # once the longest token lifetime has passed since revocation. A lifetime
+    # of False means those tokens never expire, so such rows are kept.
+    lifetimes = [
+        config.get("JWT_ACCESS_TOKEN_EXPIRES", timedelta(minutes=15)),
+        config.get("JWT_REFRESH_TOKEN_EXPIRES", timedelta(days=30)),
+    ]
+    if any(lifetime is False for lifetime in lifetimes):
+        return expired
+    legacy_cutoff = cutoff - max(_as_timedelta(lifetime) for lifetime in lifetimes)
+    return or_(
+        expired,
+        (TokenBlocklist.expires_at.is_(None))
+        & (TokenBlocklist.created_at < legacy_cutoff),
+    )
+
+
+def blocklist_stats():
+    """Current table size and how many rows are already prunable."""
+    expired = _expired_clause(_utcnow())
+    rows = db.session.scalar(select(func.count()).select_from(TokenBlocklist))
+    prunable = db.session.scalar(
+        select(func.count()).select_from(TokenBlocklist).where(expired)
+    )
+    return {"rows": rows, "prunable": prunable}
+
+
+def prune_expired_tokens(batch_size=1000, max_batches=None, pause=0.0):
+    """
+    Delete expired blocklist rows in batches of ``batch_size``.
+
+    Stops when nothing is left to prune or after ``max_batches`` batches.
+    ``pause`` seconds are slept between batches to leave room for other
+    writers. Returns a report with the pruned count and throughput.
+    """
+    started = time.perf_counter()
+    pruned = batches = 0
+    expired = _expired_clause(_utcnow())
+
+    while max_batches is None or batches < max_batches:
+        ids = db.session.scalars(
+            select(TokenBlocklist.id)
+            .where(expired)
+            .order_by(TokenBlocklist.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        db.session.execute(delete(TokenBlocklist).where(TokenBlocklist.id.in_(ids)))
+        db.session.commit()
+        pruned += len(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "pruned": pruned,
+        "batches": batches,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(pruned / elapsed, 1) if elapsed else 0.0,
+        **blocklist_stats(),
+    }
+
+    # Bloom filters cannot forget. Rebuild this host's filter once most of
+    # what it holds has been pruned so the false positive rate stays low.
+    if pruned and revocation_cache.info()["items"] > 2 * max(report["rows"], 1):
+        revocation_cache.reset()
+        report["revocation_cache_reset"] = True
+
+    return report
+
+
+def start_pruner(app, interval):
+    """Run ``prune_expired_tokens`` every ``interval`` seconds in a daemon thread."""
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    report = prune_expired_tokens(
+                        batch_size=app.config.get("BLOCKLIST_PRUNE_BATCH_SIZE", 1000),
+                        pause=app.config.get("BLOCKLIST_PRUNE_PAUSE", 0.05),
+                    )
+                    if report["pruned"]:
+                        logger.info(f"Pruned expired token blocklist rows: {report}")
+                    db.session.remove()
+            except Exception as e:
+                logger.error(f"Token blocklist pruning failed: {e}")
+
+    thread = threading.Thread(target=run, name="blocklist-pruner", daemon=True)
+    thread.start()
+    return thread
+
+
+def init_pruner(app):
+    """
+    Start the background pruner when ``BLOCKLIST_PRUNE_INTERVAL`` is set.
+
+    Each serving process starts its own on its first request; CLI runs never
+    start one.
+    """
+    interval = app.config.get("BLOCKLIST_PRUNE_INTERVAL", 0)
+    if interval:
+        start_in_each_worker(app, lambda app: start_pruner(app, interval))
@@ -0,0 +1,146 @@
+"""
+SQLAlchemy engine settings derived from the deployment shape.
+
+``configure_engine`` fills in ``SQLALCHEMY_ENGINE_OPTIONS`` before
+``db.init_app``. Options set explicitly in the config take precedence.
+
+* Server databases (Postgres, MySQL): each worker process has a pool of
+  ``DB_POOL_SIZE`` connections. The default is one per WSGI thread plus
+  ``DB_POOL_EXTRA`` for background threads (webhook workers, pruner), with
+  as many again as overflow. ``DB_MAX_CONNECTIONS`` caps the total over all
+  ``WEB_CONCURRENCY`` workers, so a deploy cannot exhaust the server's
+  ``max_connections``. Connections are pinged on checkout
+  (``DB_POOL_PRE_PING``), so a connection dropped by a failover or an idle
+  timeout is replaced instead of failing a request. They are also recycled
+  after ``DB_POOL_RECYCLE`` seconds.
+* SQLite files: every connection gets ``journal_mode=WAL``, so readers no
+  longer block the writer. It also gets ``synchronous=NORMAL``, a
+  ``busy_timeout`` so a writer waits for the lock instead of failing with
+  "database is locked", and ``mmap_size``.
+* In-memory SQLite (tests) keeps Flask-SQLAlchemy's single shared
+  connection.
+
+``instrument_engines`` counts pool checkouts, connects and invalidations per
+engine. ``pool_stats`` reports them with the pool's current state; they are
+served at ``/health/db``.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def engine_options(config, uri):
+    """Engine options for ``uri`` under the app ``config``."""
+    url = make_url(uri)
+    if url.get_backend_name() == "sqlite":
+        if _in_memory(url):
+            return {}
+        # Pool sizing still applies: SQLite files use a QueuePool too
+        return _pool_sizing(config)
+    options = _pool_sizing(config)
+    options["pool_pre_ping"] = config.get("DB_POOL_PRE_PING", True)
+    options["pool_recycle"] = config.get("DB_POOL_RECYCLE", 1800)
+    return options
+
+
+def configure_engine(app):
+    """Merge the derived engine options under any explicit ones."""
+    explicit = app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        **engine_options(app.config, uri),
+        **explicit,
+    }
+
+
+def instrument_engines(app, db):
+    """Add SQLite pragmas and pool counters to each of the app's engines."""
+    stats = app.extensions["db_pool_stats"] = {}
+    with app.app_context():
+        engines = dict(db.engines)
+    for bind, engine in engines.items():
+        if engine.url.get_backend_name() == "sqlite" and not _in_memory(engine.url):
+            event.listen(engine, "connect", _sqlite_pragmas(app.config))
+        stats[bind or "default"] = _count_pool_events(engine)
+
+
+def pool_stats(app):
+    """Per engine: the pool's configured size, current use and counters."""
+    report = {}
+    for name, (engine, counters) in app.extensions["db_pool_stats"].items():
+        pool = engine.pool
+        state = {"pool": type(pool).__name__}
+        if hasattr(pool, "checkedout"):
+            state.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=pool.overflow(),
+                max_overflow=pool._max_overflow,
+            )
+        report[name] = {**state, **counters}
+    return report
+
+
+def _pool_sizing(config):
+    threads = config.get("WSGI_THREADS", 1)
+    pool_size = config.get("DB_POOL_SIZE") or threads + config.get("DB_POOL_EXTRA", 2)
+    max_overflow = config.get("DB_MAX_OVERFLOW")
+    if max_overflow is None:
+        max_overflow = pool_size
+    max_connections = config.get("DB_MAX_CONNECTIONS")
+    if max_connections:
+        per_worker = max(max_connections // config.get("WEB_CONCURRENCY", 1), 1)
+        pool_size = min(pool_size, per_worker)
+        max_overflow = min(max_overflow, per_worker - pool_size)
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": config.get("DB_POOL_TIMEOUT", 10),
+    }
+
+
+def _in_memory(url):
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+
+def _sqlite_pragmas(config):
+    pragmas = [
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE', 0))}",
+    ]
+    if config.get("SQLITE_WAL", True):
+        pragmas.insert(0, "PRAGMA journal_mode=WAL")
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return set_pragmas
+
+
+def _count_pool_events(engine):
+    counters = {"connects": 0, "checkouts": 0, "invalidated": 0, "peak_checked_out": 0}
+
+    def connect(dbapi_connection, connection_record):
+        counters["connects"] += 1
+
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        counters["checkouts"] += 1
+        if hasattr(engine.pool, "checkedout"):
+            counters["peak_checked_out"] = max(
+                counters["peak_checked_out"], engine.pool.checkedout()
+            )
+
+    def invalidate(dbapi_connection, connection_record, exception):
+        counters["invalidated"] += 1
+
+    event.listen(engine, "connect", connect)
+    event.listen(engine, "checkout", checkout)
+    event.listen(engine, "invalidate", invalidate)
+    return engine, counters
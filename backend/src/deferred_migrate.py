@@ -0,0 +1,53 @@
+"""
+Flask-Migrate, imported only when a ``flask db`` command runs.
+
+Importing ``flask_migrate`` pulls in Alembic, which costs every web worker a
+few hundred milliseconds of startup for commands it never runs.
+``DeferredMigrate`` registers a ``db`` command group and an
+``app.extensions["migrate"]`` placeholder instead; the first time either is
+used, Flask-Migrate is imported and initialised for real with the same
+arguments.
+"""
+
+import click
+
+
+class DeferredMigrate:
+    """Drop-in for ``flask_migrate.Migrate`` that defers the import."""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def init_app(self, app, db, **kwargs):
+        settings = {**self.kwargs, **kwargs}
+        app.extensions["migrate"] = _DeferredConfig(app, db, settings)
+        app.cli.add_command(_MigrateCommands(name=settings.get("command", "db")))
+
+
+class _DeferredConfig:
+    """Stands in for Flask-Migrate's ``_MigrateConfig`` until first use."""
+
+    def __init__(self, app, db, settings):
+        self._app = app
+        self._db = db
+        self._settings = settings
+
+    def __getattr__(self, name):
+        from flask_migrate import Migrate
+
+        # Replaces this placeholder in app.extensions with the real config
+        Migrate(**self._settings).init_app(self._app, self._db)
+        return getattr(self._app.extensions["migrate"], name)
+
+
+class _MigrateCommands(click.Group):
+    """Flask-Migrate's ``db`` command group, loaded when invoked."""
+
+    def __init__(self, **kwargs):
+        super().__init__(help="Perform database migrations.", **kwargs)
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        from flask_migrate.cli import db
+
+        # The context, and so the invoked command, is Flask-Migrate's own
+        return db.make_context(info_name, args, parent=parent, **extra)
@@ -1,46 +1,81 @@
+from functools import cache
+
 from flask import current_app
 from flask_mail import Message
+from jinja2 import Environment
+
+from backend.extensions import mail_queue
+
+# You can create more elaborate HTML templates for your emails
+_TEMPLATES = {
+    "password_reset": (
+        "Reset Your Password",
+        """
+    <p>Hello {{ name or 'there' }},</p>
+    <p>You are receiving this email because you (or someone else) requested a password reset for your account.</p>
+    <p>Please click the link below to reset your password:</p>
+    <p><a href="{{ reset_url }}">Reset Password</a></p>
+    <p>This link will expire in 30 minutes.</p>
+    <p>If you did not request a password reset, please ignore this email.</p>
+    <p>Thanks,</p>
+    <p>The Team</p>
+    """,
+    ),
+    "low_balance": (
+        "Your balance is running low",
+        """
+    <p>Hello {{ name or 'there' }},</p>
+    <p>Your account balance is now ${{ '%.2f' % balance }}, below ${{ '%.2f' % threshold }}.</p>
+    <p>To keep using the service without interruption, please add funds in the app:</p>
+    <p><a href="{{ app_url }}">Open the app</a></p>
+    <p>Thanks,</p>
+    <p>The Team</p>
+    """,
+    ),
+}
 
-from backend.extensions import mail
+_env = Environment(autoescape=True)
+
+
+@cache
+def _template(name):
+    """The compiled HTML template for ``name``, compiled once per process."""
+    return _env.from_string(_TEMPLATES[name][1])
+
+
+def build_email(template, recipient, **context):
+    """A Message for ``template``, rendered with ``context``."""
+    msg = Message(
+        subject=_TEMPLATES[template][0],
+        sender=current_app.config.get("MAIL_DEFAULT_SENDER"),
+        recipients=[recipient],
+    )
+    msg.html = _template(template).render(**context)
+    return msg
 
 
 def send_password_reset_email(user):
     """
-    Sends a password reset email to the user using Flask-Mail.
+    Queues a password reset email to the user, sent by Flask-Mail.
     """
     token = user.get_reset_token()
     reset_url = f"{current_app.config['FRONTEND_URL']}/reset-password/{token}"
+    msg = build_email(
+        "password_reset", user.email, name=user.name, reset_url=reset_url
+    )
 
-    subject = "Reset Your Password"
-    sender = current_app.config.get("MAIL_DEFAULT_SENDER")
-    recipients = [user.email]
+    # Sent by a background worker; MAIL_SUPPRESS_SEND (on in testing) keeps
+    # it from reaching an SMTP server
+    mail_queue.enqueue(msg)
 
-    # You can create more elaborate HTML templates for your emails
-    html_body = f"""
-    <p>Hello {user.name or 'there'},</p>
-    <p>You are receiving this email because you (or someone else) requested a password reset for your account.</p>
-    <p>Please click the link below to reset your password:</p>
-    <p><a href="{reset_url}">Reset Password</a></p>
-    <p>This link will expire in 30 minutes.</p>
-    <p>If you did not request a password reset, please ignore this email.</p>
-    <p>Thanks,</p>
-    <p>The Team</p>
-    """
 
-    msg = Message(subject=subject, sender=sender, recipients=recipients)
-    msg.html = html_body
-
-    try:
-        if not current_app.config.get("TESTING", False):
-            mail.send(msg)
-        else:
-            # In testing, we don't want to send real emails
-            print("--- SUPPRESSED PASSWORD RESET EMAIL (TESTING) ----")
-            print(f"To: {user.email}")
-            print(f"URL: {reset_url}")
-            print("--------------------------------------------------")
-
-    except Exception as e:
-        current_app.logger.error(f"Failed to send email: {e}")
-        # Depending on your needs, you might want to handle this error more gracefully
-        raise
+def low_balance_email(email, name, balance, threshold):
+    """The low-balance warning sent by ``flask billing notify-low-balance``."""
+    return build_email(
+        "low_balance",
+        email,
+        name=name,
+        balance=balance,
+        threshold=threshold,
+        app_url=current_app.config["FRONTEND_URL"],
+    )
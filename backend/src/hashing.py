@@ -0,0 +1,261 @@
+"""
+Password hashing off the request thread.
+
+bcrypt is deliberately slow, so a handful of concurrent logins can pin every
+worker on CPU. ``PasswordHasher`` runs the hashing in a process pool and
+bounds it twice over:
+
+* per host: at most ``PASSWORD_HASH_WORKERS`` (default: one per core) hashes
+  run at once across *all* gunicorn workers, and at most
+  ``PASSWORD_HASH_QUEUE_SIZE`` more may wait for a turn. The counts are kept
+  with byte-range locks on a shared lock file, which the OS releases if a
+  worker dies.
+* per worker: a worker admits at most ``WSGI_THREADS - 1`` hashing requests,
+  so at least one thread is always left for cheap endpoints.
+
+Anything over either limit fails fast with ``HashingBusyError`` (a 503).
+"""
+
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from backend.src.private_files import open_private
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+class HashingBusyError(Exception):
+    """The hashing pool is saturated; the client should retry later."""
+
+
+# passlib is imported by the pool workers that hash, not at app startup
+
+
+def _hash(password):
+    from passlib.hash import bcrypt
+
+    return bcrypt.hash(password)
+
+
+def _verify(password, password_hash):
+    from passlib.hash import bcrypt
+
+    return bcrypt.verify(password, password_hash)
+
+
+class HostSlots:
+    """
+    Counting semaphore shared by every process on the host.
+
+    Slot ``i`` is held by holding an exclusive lock on byte ``i`` of
+    ``path``. POSIX record locks belong to the process, so slots this process
+    already holds are tracked locally to keep its threads apart. Without a
+    path (or without fcntl) the slots only bound the current process.
+    """
+
+    def __init__(self, size, path=None):
+        self.size = size
+        self._held = set()
+        self._lock = threading.Lock()
+        self._fd = None
+        if path is not None and fcntl is not None:
+            self._fd = open_private(path)
+
+    def try_acquire(self, first=0, last=None):
+        """Take a free slot in ``[first, last)``; returns its index or None."""
+        last = self.size if last is None else last
+        with self._lock:
+            for slot in range(first, last):
+                if slot in self._held:
+                    continue
+                if self._fd is not None:
+                    try:
+                        fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+                    except OSError:
+                        continue
+                self._held.add(slot)
+                return slot
+        return None
+
+    def acquire(self, first, last, timeout):
+        """Wait up to ``timeout`` seconds for a slot in ``[first, last)``."""
+        deadline = time.monotonic() + timeout
+        while True:
+            slot = self.try_acquire(first, last)
+            if slot is not None or time.monotonic() >= deadline:
+                return slot
+            time.sleep(0.005)
+
+    def release(self, slot):
+        with self._lock:
+            if self._fd is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, slot)
+            self._held.discard(slot)
+
+    def held(self):
+        with self._lock:
+            return len(self._held)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class PasswordHasher:
+    """Bounded bcrypt executor, configured from the Flask app config."""
+
+    def __init__(self, app=None):
+        self.workers = 0
+        self.queue_size = 0
+        self.max_in_flight = 1
+        self.timeout = None
+        self._host = HostSlots(1)
+        self._local = threading.BoundedSemaphore(1)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._latencies = deque(maxlen=1024)
+        self._in_flight = 0
+        self._waiting = 0
+        self._completed = 0
+        self._rejected = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.shutdown()
+        workers = app.config.get("PASSWORD_HASH_WORKERS")
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        queue_size = app.config.get("PASSWORD_HASH_QUEUE_SIZE")
+        self.queue_size = max(workers, 1) if queue_size is None else queue_size
+        self.timeout = app.config.get("PASSWORD_HASH_TIMEOUT", 10)
+
+        # Never let hashing occupy every request thread of this worker
+        threads = app.config.get("WSGI_THREADS", 1)
+        self.max_in_flight = max(1, threads - 1)
+        self._local = threading.BoundedSemaphore(self.max_in_flight)
+
+        path = app.config.get("PASSWORD_HASH_LOCK_PATH", "auto")
+        if path == "auto":
+            uri = str(app.config.get("SQLALCHEMY_DATABASE_URI", ""))
+            key = hashlib.sha1(uri.encode("utf-8")).hexdigest()[:12]
+            os.makedirs(app.instance_path, mode=0o700, exist_ok=True)
+            path = os.path.join(app.instance_path, f"password-hash-{key}.lock")
+        # Slots [0, admitted) admit a job; [admitted, admitted + workers) let
+        # an admitted job run.
+        self._admitted = max(self.workers, 1) + self.queue_size
+        self._host = HostSlots(self._admitted + self.workers, path)
+        app.extensions["password_hasher"] = self
+
+    def _get_executor(self):
+        # Created lazily and per process: a pool inherited across a gunicorn
+        # fork would point at the parent's children. The host-wide run slots
+        # cap how many of these processes are busy at once.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=min(self.workers, self.max_in_flight),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _reject(self, reason):
+        with self._lock:
+            self._rejected += 1
+        raise HashingBusyError(reason)
+
+    def _run(self, fn, *args):
+        if not self._local.acquire(blocking=False):
+            self._reject("Password hashing is busy in this worker")
+        admission = self._host.try_acquire(0, self._admitted)
+        if admission is None:
+            self._local.release()
+            self._reject("Password hashing queue is full")
+
+        started = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            if not self.workers:
+                return fn(*args)
+
+            with self._lock:
+                self._waiting += 1
+            try:
+                run_slot = self._host.acquire(
+                    self._admitted, self._admitted + self.workers, self.timeout
+                )
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if run_slot is None:
+                self._reject("Password hashing timed out in the queue")
+            try:
+                future = self._get_executor().submit(fn, *args)
+                remaining = self.timeout - (time.perf_counter() - started)
+                return future.result(timeout=max(remaining, 0.001))
+            except FutureTimeoutError:
+                self._reject("Password hashing timed out")
+            finally:
+                # A job we stopped waiting for may still finish in the pool;
+                # its process is bounded by the pool size either way.
+                self._host.release(run_slot)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+                self._latencies.append(time.perf_counter() - started)
+            self._host.release(admission)
+            self._local.release()
+
+    def hash(self, password):
+        return self._run(_hash, password)
+
+    def verify(self, password, password_hash):
+        return self._run(_verify, password, password_hash)
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            in_flight, waiting = self._in_flight, self._waiting
+            completed, rejected = self._completed, self._rejected
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[int(p * (len(latencies) - 1))] * 1000, 2)
+
+        return {
+            "host_workers": self.workers,
+            "host_queue_size": self.queue_size,
+            "worker_max_in_flight": self.max_in_flight,
+            "in_flight": in_flight,
+            "queue_depth": waiting,
+            "completed": completed,
+            "rejected": rejected,
+            "latency_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": percentile(1.0),
+            },
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._host.close()
@@ -0,0 +1,90 @@
+"""
+Conditional GETs and response compression for polled endpoints.
+
+``@conditional(version)`` gives a view a strong ETag computed from
+``version()``. That is a cheap query that changes whenever the response
+would, such as a ``(balance, updated_at)`` pair or the newest transaction id.
+The ETag also covers the path and query string. A request whose
+``If-None-Match`` matches gets an empty ``304`` right after that query,
+before the view loads or serializes anything. Responses carry
+``Cache-Control: private, no-cache``, so browsers keep them and revalidate
+on every poll.
+
+``init_compression`` gzips responses larger than ``COMPRESS_MIN_SIZE`` for
+clients that accept it. A compressed response's ETag gets a ``-gzip``
+suffix, as it names different bytes, and both forms are accepted back.
+Streamed responses (e.g. the ledger export) are left alone.
+"""
+
+import gzip
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+_GZIP_SUFFIX = "-gzip"
+_COMPRESSIBLE = ("application/json", "text/")
+
+
+def conditional(version):
+    """Decorate a GET view with an ETag derived from ``version()``."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            current = version()
+            if current is None:  # Nothing to version yet
+                return view(*args, **kwargs)
+            etag = _etag(current)
+            if request.if_none_match.contains_weak(
+                etag
+            ) or request.if_none_match.contains_weak(etag + _GZIP_SUFFIX):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = "private, no-cache"
+            response.vary.add("Accept-Encoding")
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _etag(version):
+    key = repr((request.path, sorted(request.args.items(multi=True)), version))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def init_compression(app):
+    app.after_request(_compress)
+
+
+def _compress(response):
+    config = current_app.config
+    if (
+        not config.get("COMPRESS_RESPONSES", True)
+        or response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code >= 300
+        or "Content-Encoding" in response.headers
+        or not response.mimetype.startswith(_COMPRESSIBLE)
+        or not request.accept_encodings["gzip"]
+    ):
+        return response
+    body = response.get_data()
+    if len(body) < config.get("COMPRESS_MIN_SIZE", 1024):
+        return response
+
+    # mtime=0: the same body always compresses to the same bytes
+    response.set_data(gzip.compress(body, config.get("COMPRESS_LEVEL", 6), mtime=0))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(etag + _GZIP_SUFFIX, weak)
+    return response
@@ -0,0 +1,144 @@
+"""
+``Idempotency-Key`` support for mutating endpoints.
+
+A client that retries a request with the same key gets the first request's
+response back instead of running it again:
+
+* the first request claims the key in the ``IdempotencyRecord`` table, runs,
+  and stores its response in the same database transaction as the view's
+  writes (5xx responses release the key so a retry runs);
+* a duplicate arriving while the first is still running waits for it and
+  then replays its response;
+* a duplicate arriving later replays the stored response straight away;
+* reusing a key for a different request body is rejected with 422.
+
+A claim is held for ``IDEMPOTENCY_LOCK_SECONDS``; if the claiming request
+dies, a retry may take over after that. Records expire after
+``IDEMPOTENCY_TTL_SECONDS`` and are purged with
+``flask billing purge-idempotency``.
+
+Views wrapped in ``idempotent`` end their writes with ``commit()`` rather
+than ``db.session.commit()``. With a key, that only flushes, and the wrapper
+commits the writes together with the stored response: a request that fails
+in between leaves neither, so a retry cannot apply the writes twice.
+"""
+
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, current_app, g, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+from backend.extensions import db
+from backend.models.billing import IdempotencyRecord
+
+HEADER = "Idempotency-Key"
+_POLL_SECONDS = 0.05
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _fingerprint():
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.path}\n".encode("utf-8"))
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _replay(record):
+    response = Response(
+        record.response_body,
+        status=record.response_status,
+        mimetype=record.response_mimetype,
+    )
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _wait_for(user_id, key, fingerprint, timeout):
+    """Poll until the request holding ``key`` has stored its response."""
+    deadline = time.monotonic() + timeout
+    while True:
+        record = IdempotencyRecord.find(user_id, key)
+        # End the read transaction so the next poll sees new commits
+        db.session.rollback()
+        if (
+            record is None
+            or record.completed
+            or record.fingerprint != fingerprint
+            or time.monotonic() >= deadline
+        ):
+            return record
+        time.sleep(_POLL_SECONDS)
+
+
+def commit():
+    """Commit the view's writes now, or with the stored response under a key."""
+    if g.get("idempotency_key"):
+        db.session.flush()
+    else:
+        db.session.commit()
+
+
+def idempotent(view):
+    """Honour an ``Idempotency-Key`` header on a ``jwt_required`` view."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({"error": f"{HEADER} is too long"}), 400
+
+        config = current_app.config
+        user_id = int(get_jwt_identity())
+        fingerprint = _fingerprint()
+        lock_seconds = config.get("IDEMPOTENCY_LOCK_SECONDS", 30)
+
+        if not IdempotencyRecord.claim(
+            user_id,
+            key,
+            fingerprint,
+            _utcnow(),
+            lock_seconds,
+            config.get("IDEMPOTENCY_TTL_SECONDS", 86400),
+        ):
+            record = _wait_for(user_id, key, fingerprint, lock_seconds)
+            if record is not None and record.fingerprint != fingerprint:
+                return jsonify({"error": f"{HEADER} was used for another request"}), 422
+            if record is None or not record.completed:
+                return jsonify({"error": "A request with this key is in progress"}), 409
+            return _replay(record)
+
+        # Lets the view pass the key on, e.g. to Stripe
+        g.idempotency_key = f"{user_id}:{key}"
+        try:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code < 500 and not response.is_streamed:
+                record = IdempotencyRecord.find(user_id, key)
+                record.response_status = response.status_code
+                record.response_body = response.get_data(as_text=True)
+                record.response_mimetype = response.mimetype
+            db.session.commit()  # The view's writes, with its stored response
+        except Exception:
+            db.session.rollback()
+            _release(user_id, key)
+            raise
+
+        if response.status_code >= 500 or response.is_streamed:
+            _release(user_id, key)
+        return response
+
+    return wrapper
+
+
+def _release(user_id, key):
+    record = IdempotencyRecord.find(user_id, key)
+    if record is not None and not record.completed:
+        db.session.delete(record)
+        db.session.commit()
@@ -0,0 +1,271 @@
+"""
+Cache of an identity provider's signing keys (JWKS).
+
+``JWKSCache`` keeps the published keys in memory and in a file in the
+instance folder, so a freshly forked worker starts warm instead of fetching.
+
+* Single flight: concurrent callers that find the keys missing or expired
+  wait for one fetch instead of each fetching. Across processes the fetch is
+  serialised with a lock file and the winner's result is read back from disk.
+* Refresh ahead: within ``JWKS_REFRESH_AHEAD`` seconds of expiry a request
+  triggers a refresh in a background thread and carries on with the current
+  keys.
+* Stale while revalidate: expired keys keep being served, for up to
+  ``JWKS_MAX_STALE`` seconds, while the refresh runs in the background. If
+  the provider is down, it is retried at most every
+  ``JWKS_MIN_REFETCH_INTERVAL`` seconds.
+* Unknown ``kid``: a token signed with a key we have not seen (rotation)
+  triggers an immediate refetch, rate-limited by the same interval so made-up
+  key ids cannot make us hammer the provider.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import jwt
+
+from backend.src.metrics import timed_call
+from backend.src.private_files import check_private_file, open_private
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class JWKSError(Exception):
+    """No usable signing keys could be obtained."""
+
+
+class JWKSCache:
+    """
+    Signing keys published at a JWKS URL, configured from the Flask app config.
+
+    ``name`` selects the settings: ``<NAME>_JWKS_URL`` and
+    ``<NAME>_JWKS_PATH`` ("auto" = a file in the instance folder, None =
+    memory only), plus the shared ``JWKS_*`` timings.
+    """
+
+    def __init__(self, name, clock=time.time, **settings):
+        self.name = name
+        self.clock = clock
+        self.stats = {"fetches": 0, "failures": 0, "disk_loads": 0}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._session = None  # Created on the first fetch
+        self._background = None
+        self._reset()
+        self.configure(**settings)
+
+    def _reset(self):
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._expires_at = 0.0
+        self._retry_at = 0.0
+        self._generation = 0
+
+    def configure(
+        self,
+        url=None,
+        path=None,
+        ttl=86400,
+        refresh_ahead=3600,
+        timeout=5,
+        min_refetch_interval=30,
+        max_stale=7 * 86400,
+    ):
+        self.url = url
+        self.path = path
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.timeout = timeout
+        self.min_refetch_interval = min_refetch_interval
+        self.max_stale = max_stale
+        self._reset()
+
+    def init_app(self, app):
+        prefix = self.name.upper()
+        path = app.config.get(f"{prefix}_JWKS_PATH", "auto")
+        if path == "auto":
+            os.makedirs(app.instance_path, mode=0o700, exist_ok=True)
+            path = os.path.join(app.instance_path, f"jwks-{self.name}.json")
+        self.configure(
+            url=app.config.get(f"{prefix}_JWKS_URL"),
+            path=path,
+            ttl=app.config.get("JWKS_TTL", 86400),
+            refresh_ahead=app.config.get("JWKS_REFRESH_AHEAD", 3600),
+            timeout=app.config.get("JWKS_TIMEOUT", 5),
+            min_refetch_interval=app.config.get("JWKS_MIN_REFETCH_INTERVAL", 30),
+            max_stale=app.config.get("JWKS_MAX_STALE", 7 * 86400),
+        )
+        app.extensions[f"{self.name}_jwks"] = self
+
+    # --- Public API ---------------------------------------------------------
+
+    def get_key(self, kid):
+        """
+        The verification key for ``kid``, or None if the provider does not
+        publish one. Raises JWKSError if no keys can be obtained at all.
+        """
+        now = self.clock()
+        if not self._keys:
+            self._adopt_disk()
+        if not self._keys or now >= self._expires_at + self.max_stale:
+            # Nothing usable: wait for the fetch
+            self._refresh()
+        elif now >= self._expires_at - self.refresh_ahead and now >= self._retry_at:
+            # About to expire, or expired and the last fetch failed: keep
+            # serving these keys while a background thread revalidates
+            self._refresh_in_background()
+
+        if not self._keys or now >= self._expires_at + self.max_stale:
+            raise JWKSError(f"No {self.name} signing keys available")
+        key = self._keys.get(kid)
+        if key is None and now >= self._retry_at:
+            # Possibly a key published since our last fetch
+            self._refresh()
+            key = self._keys.get(kid)
+        return key
+
+    def info(self):
+        return {
+            "keys": sorted(self._keys),
+            "fetched_at": self._fetched_at,
+            "expires_at": self._expires_at,
+            **self.stats,
+        }
+
+    # --- Refreshing ---------------------------------------------------------
+
+    def _refresh(self):
+        """Fetch the keys once, however many threads ask at the same time."""
+        generation = self._generation
+        with self._refresh_lock:
+            if self._generation != generation:
+                return  # Another thread refreshed while we waited
+            with self._host_lock():
+                # Another process may have refreshed while we waited
+                if self._adopt_disk() and self.clock() < self._expires_at:
+                    return
+                self._fetch()
+
+    def _refresh_quietly(self):
+        try:
+            self._refresh()
+        except JWKSError:
+            pass  # The next request retries in the foreground
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._background is not None and self._background.is_alive():
+                return
+            self._background = threading.Thread(
+                target=self._refresh_quietly, name=f"jwks-{self.name}", daemon=True
+            )
+            self._background.start()
+
+    def _fetch(self):
+        import requests
+
+        now = self.clock()
+        self.stats["fetches"] += 1
+        if self._session is None:
+            self._session = requests.Session()
+        try:
+            with timed_call(self.name, "jwks"):
+                response = self._session.get(self.url, timeout=self.timeout)
+                response.raise_for_status()
+            jwks = response.json()
+            keys = {key.key_id: key.key for key in jwt.PyJWKSet.from_dict(jwks).keys}
+        except (requests.RequestException, ValueError, jwt.PyJWKSetError) as e:
+            self.stats["failures"] += 1
+            self._generation += 1
+            self._retry_at = now + self.min_refetch_interval
+            if self._keys and now < self._expires_at + self.max_stale:
+                return  # Keep serving the keys we have
+            raise JWKSError(f"Could not fetch {self.name} signing keys: {e}") from e
+
+        match = _MAX_AGE.search(response.headers.get("Cache-Control", ""))
+        ttl = min(int(match.group(1)), self.ttl) if match else self.ttl
+        self._install(keys, now, now + ttl)
+        self._save(jwks)
+
+    def _install(self, keys, fetched_at, expires_at):
+        self._keys = keys
+        self._fetched_at = fetched_at
+        self._expires_at = expires_at
+        self._retry_at = fetched_at + self.min_refetch_interval
+        self._generation += 1
+
+    # --- Persistence --------------------------------------------------------
+
+    @contextmanager
+    def _host_lock(self):
+        if self.path is None or fcntl is None:
+            yield
+            return
+        fd = open_private(self.path + ".lock")
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _adopt_disk(self):
+        """Load keys another process saved if they are newer; returns True if so."""
+        if self.path is None:
+            return False
+        try:
+            fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+        except OSError:
+            return False
+        try:
+            # Whoever can write this file chooses which tokens we accept
+            check_private_file(fd, self.path)
+            with os.fdopen(fd, "rb", closefd=False) as f:
+                saved = json.load(f)
+            if saved.get("url_hash") != _hash(self.url):
+                return False
+            if saved["fetched_at"] <= self._fetched_at:
+                return False
+            keys = {
+                key.key_id: key.key
+                for key in jwt.PyJWKSet.from_dict(saved["jwks"]).keys
+            }
+        except (ValueError, KeyError, jwt.PyJWKSetError):
+            return False
+        finally:
+            os.close(fd)
+        self._install(keys, saved["fetched_at"], saved["expires_at"])
+        self.stats["disk_loads"] += 1
+        return True
+
+    def _save(self, jwks):
+        if self.path is None:
+            return
+        saved = {
+            "url_hash": _hash(self.url),
+            "fetched_at": self._fetched_at,
+            "expires_at": self._expires_at,
+            "jwks": jwks,
+        }
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(
+            tmp,
+            os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0),
+            0o600,
+        )
+        with os.fdopen(fd, "w") as f:
+            json.dump(saved, f)
+        os.replace(tmp, self.path)
+
+
+def _hash(url):
+    return hashlib.sha256((url or "").encode("utf-8")).hexdigest()
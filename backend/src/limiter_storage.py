@@ -0,0 +1,257 @@
+"""
+Rate-limit counters shared by every worker process on a host.
+
+Flask-Limiter's default in-memory storage keeps counters per process: with N
+gunicorn workers a "10 per minute" limit admits 10×N, and the counts vanish
+whenever a worker restarts. ``HostStorage`` keeps them instead in one
+memory-mapped file, so all workers count against the same limit and a
+restarted worker sees the counts as they were. Nothing crosses the network:
+a hit is a hash, an ``flock`` and a few reads and writes of shared memory.
+
+The file is a set-associative table of counters (key digest, count, expiry).
+A key hashes to one set and takes a free or expired way in it. If every way
+is live, the counter closest to expiry is evicted, so under extreme key
+churn a limit can be under-counted, but never over-counted. It supports the
+fixed-window and sliding-window-counter strategies. The table is registered
+with ``limits`` under the ``hostfile://`` scheme::
+
+    RATELIMIT_STORAGE_URI = "hostfile:///path/to/ratelimits.bin?sets=16384"
+
+``configure_storage`` points Flask-Limiter at a file in the instance folder
+unless ``RATELIMIT_STORAGE_URI`` is set explicitly (e.g. to Redis for
+several hosts).
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import parse_qs, urlparse
+
+from limits.storage import SlidingWindowCounterSupport, Storage
+from limits.storage.base import TimestampedSlidingWindow
+
+from backend.src.private_files import open_private
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+_MAGIC = b"RATELIM1"
+_HEADER = struct.Struct("<8sII")  # magic, sets, ways
+_HEADER_SIZE = 64
+_ENTRY = struct.Struct("<16sqd")  # key digest, count, expires at
+_EMPTY = bytes(16)
+
+
+def configure_storage(app):
+    """Default RATELIMIT_STORAGE_URI to a host-shared file when a path is set."""
+    if app.config.get("RATELIMIT_STORAGE_URI"):
+        return
+    path = app.config.get("RATELIMIT_STORAGE_PATH", "auto")
+    if path is None or fcntl is None:
+        return  # Flask-Limiter's per-process memory storage
+    if path == "auto":
+        os.makedirs(app.instance_path, mode=0o700, exist_ok=True)
+        path = os.path.join(app.instance_path, "ratelimits.bin")
+    sets = app.config.get("RATELIMIT_STORAGE_SETS", 16384)
+    app.config["RATELIMIT_STORAGE_URI"] = f"hostfile://{path}?sets={sets}"
+
+
+class HostStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """``limits`` storage backed by a memory-mapped file shared by a host."""
+
+    STORAGE_SCHEME = ["hostfile"]
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        parsed = urlparse(uri)
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        self.path = parsed.path
+        self.sets = int(options.get("sets", query.get("sets", 16384)))
+        self.ways = int(options.get("ways", query.get("ways", 8)))
+        self._size = _HEADER_SIZE + self.sets * self.ways * _ENTRY.size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._mm = None
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return OSError
+
+    # --- File ---------------------------------------------------------------
+
+    def _open(self):
+        # Reopened in each process: an flock taken through a descriptor
+        # inherited across fork would not exclude the parent
+        self.close()
+        self._fd = open_private(self.path)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if os.fstat(self._fd).st_size != self._size or header != _HEADER.pack(
+                _MAGIC, self.sets, self.ways
+            ):
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self._size)
+                os.pwrite(self._fd, _HEADER.pack(_MAGIC, self.sets, self.ways), 0)
+            self._mm = mmap.mmap(self._fd, self._size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._pid = os.getpid()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @contextmanager
+    def _exclusive(self):
+        """Lock out other threads of this process and every other worker."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # --- Table --------------------------------------------------------------
+
+    def _offsets(self, digest):
+        start = (struct.unpack_from("<Q", digest)[0] % self.sets) * self.ways
+        return range(
+            _HEADER_SIZE + start * _ENTRY.size,
+            _HEADER_SIZE + (start + self.ways) * _ENTRY.size,
+            _ENTRY.size,
+        )
+
+    def _find(self, digest, now):
+        """(offset, count, expires_at) of the live entry for ``digest``."""
+        for offset in self._offsets(digest):
+            key, count, expires_at = _ENTRY.unpack_from(self._mm, offset)
+            if key == digest:
+                if expires_at <= now:
+                    return offset, 0, 0.0
+                return offset, count, expires_at
+            if key == _EMPTY:
+                break
+        return None, 0, 0.0
+
+    def _slot(self, digest):
+        """Offset to store ``digest`` at: its own, a free one or the oldest."""
+        victim, victim_expiry = None, math.inf
+        for offset in self._offsets(digest):
+            key, _, expires_at = _ENTRY.unpack_from(self._mm, offset)
+            if key == digest or key == _EMPTY:
+                return offset
+            if expires_at < victim_expiry:
+                victim, victim_expiry = offset, expires_at
+        return victim
+
+    def _incr(self, key, expiry, amount, now):
+        digest = _digest(key)
+        offset, count, expires_at = self._find(digest, now)
+        if offset is None:
+            offset = self._slot(digest)
+        if not count:
+            expires_at = now + expiry
+        _ENTRY.pack_into(self._mm, offset, digest, count + amount, expires_at)
+        return count + amount
+
+    def _get(self, key, now):
+        return self._find(_digest(key), now)[1:]
+
+    # --- limits.storage.Storage ---------------------------------------------
+
+    def incr(self, key, expiry, amount=1):
+        with self._exclusive():
+            return self._incr(key, expiry, amount, time.time())
+
+    def get(self, key):
+        with self._exclusive():
+            return self._get(key, time.time())[0]
+
+    def get_expiry(self, key):
+        now = time.time()
+        with self._exclusive():
+            return self._get(key, now)[1] or now
+
+    def clear(self, key):
+        digest = _digest(key)
+        with self._exclusive():
+            offset = self._find(digest, time.time())[0]
+            if offset is not None:
+                _ENTRY.pack_into(self._mm, offset, digest, 0, 0.0)
+
+    def check(self):
+        try:
+            with self._exclusive():
+                return True
+        except OSError:
+            return False
+
+    def reset(self):
+        with self._exclusive():
+            now = time.time()
+            live = 0
+            for offset in range(_HEADER_SIZE, self._size, _ENTRY.size):
+                if _ENTRY.unpack_from(self._mm, offset)[2] > now:
+                    live += 1
+            self._mm[_HEADER_SIZE:] = bytes(self._size - _HEADER_SIZE)
+            return live
+
+    # --- Sliding window counter ---------------------------------------------
+
+    def _window(self, key, expiry, now):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._get(previous_key, now)[0]
+        current_count = self._get(current_key, now)[0]
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return (
+            previous_count,
+            previous_ttl if previous_count else 0.0,
+            current_count,
+            current_ttl,
+        )
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        with self._exclusive():
+            # Checked and counted under one lock, so concurrent workers can
+            # never overshoot the limit together
+            previous_count, previous_ttl, current_count, _ = self._window(
+                key, expiry, now
+            )
+            weighted = previous_count * previous_ttl / expiry + current_count
+            if math.floor(weighted) + amount > limit:
+                return False
+            current_key = self.sliding_window_keys(key, expiry, now)[1]
+            self._incr(current_key, 2 * expiry, amount, now)
+            return True
+
+    def get_sliding_window(self, key, expiry):
+        with self._exclusive():
+            return self._window(key, expiry, time.time())
+
+    def clear_sliding_window(self, key, expiry):
+        for window_key in self.sliding_window_keys(key, expiry, time.time()):
+            self.clear(window_key)
+
+
+def _digest(key):
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    return digest if digest != _EMPTY else b"\x01" + digest[1:]
@@ -0,0 +1,145 @@
+"""
+Low-balance warnings, sent by ``flask billing notify-low-balance``.
+
+The job runs outside the request path. It walks the balances under the
+threshold in chunks of ``chunk_size``, paginated by id, so memory stays
+bounded however many users there are. A user warned within the last
+``LOW_BALANCE_RENOTIFY_DAYS`` is skipped (``UserBalance.low_balance_notified_at``).
+The marker is only set once the relay has accepted the message, so a failed
+send is retried by the next run.
+
+Messages are rendered from the precompiled templates in ``email_service``.
+They are sent over ``connections`` SMTP connections that stay open for the
+whole run, throttled to ``rate`` messages per second across all of them.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from flask import current_app
+
+from backend.extensions import create_logger, db
+from backend.models.billing import UserBalance
+from backend.src.email_service import low_balance_email
+from backend.src.mail_queue import SMTPSender
+
+logger = create_logger(__name__)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class _RateLimiter:
+    """Spaces calls to ``wait`` at least 1/rate seconds apart across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        time.sleep(slot - now)
+
+
+class _Senders:
+    """One kept-open SMTP connection per sending thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self.all = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        sender = getattr(self._local, "sender", None)
+        if sender is None:
+            sender = self._local.sender = SMTPSender(self.app.extensions["mail"])
+            with self._lock:
+                self.all.append(sender)
+        try:
+            with self.app.app_context():
+                sender.send(message)
+        except Exception:
+            sender.close()  # Reconnect for the next message
+            raise
+
+    def close(self):
+        for sender in self.all:
+            sender.close()
+
+
+def notify_low_balances(
+    threshold=None, chunk_size=None, rate=None, connections=None, dry_run=False
+):
+    """
+    Warn every user whose balance is under ``threshold`` and who has not been
+    warned recently. Returns counts and throughput. With ``dry_run``, only
+    counts who would be warned.
+    """
+    config = current_app.config
+    if threshold is None:
+        threshold = config["LOW_BALANCE_THRESHOLD"]
+    threshold = Decimal(str(threshold))
+    chunk_size = chunk_size or config["LOW_BALANCE_CHUNK_SIZE"]
+    rate = config["LOW_BALANCE_SEND_RATE"] if rate is None else rate
+    connections = connections or config["LOW_BALANCE_SMTP_CONNECTIONS"]
+    notified_before = _utcnow() - timedelta(days=config["LOW_BALANCE_RENOTIFY_DAYS"])
+
+    report = {"selected": 0, "sent": 0, "failed": 0, "chunks": 0}
+    start = time.perf_counter()
+    limiter = _RateLimiter(rate)
+    senders = _Senders(current_app._get_current_object())
+
+    def send(message):
+        limiter.wait()
+        senders.send(message)
+
+    with ThreadPoolExecutor(connections, thread_name_prefix="low-balance") as pool:
+        last_id = 0
+        while True:
+            rows = UserBalance.low_balance_chunk(
+                threshold, notified_before, after_id=last_id, limit=chunk_size
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+            report["chunks"] += 1
+            report["selected"] += len(rows)
+            if dry_run:
+                continue
+
+            futures = {
+                row.id: pool.submit(
+                    send, low_balance_email(row.email, row.name, row.balance, threshold)
+                )
+                for row in rows
+            }
+            sent = []
+            for balance_id, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.warning(f"Low-balance email for balance {balance_id}: {e}")
+                    report["failed"] += 1
+                else:
+                    sent.append(balance_id)
+            UserBalance.mark_low_balance_notified(sent, _utcnow())
+            db.session.commit()
+            report["sent"] += len(sent)
+    senders.close()
+
+    elapsed = time.perf_counter() - start
+    report["seconds"] = round(elapsed, 2)
+    for counter in ("selected", "sent"):
+        report[f"{counter}_per_sec"] = round(report[counter] / elapsed, 1)
+    return report
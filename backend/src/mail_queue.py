@@ -0,0 +1,257 @@
+"""
+Outbound email, sent from a background thread.
+
+``MailQueue.enqueue`` hands a Flask-Mail ``Message`` to a per-process worker
+and returns at once, so a request never waits on an SMTP connect, TLS
+handshake or login. This also keeps ``/auth/forgot-password`` equally fast
+whether or not the address has an account.
+
+The worker keeps one SMTP connection (``mail.connect()``) open while there is
+mail to send and closes it after ``MAIL_QUEUE_IDLE_SECONDS`` of quiet. Queued
+messages go out in batches of up to ``MAIL_QUEUE_BATCH_SIZE`` over that
+connection. Temporary failures (4xx replies, dropped connections) are retried
+with exponential backoff on a fresh connection, up to
+``MAIL_QUEUE_MAX_ATTEMPTS`` attempts. Permanent 5xx rejections are not
+retried.
+
+The queue lives in memory: mail still queued when a worker exits is lost
+after a ``MAIL_QUEUE_DRAIN_TIMEOUT`` grace period. That suits the
+transactional mail sent here, which the user can simply request again.
+Counters are in ``stats`` and, with the current queue depth, in ``info()``.
+"""
+
+import atexit
+import heapq
+import itertools
+import os
+import queue
+import smtplib
+import threading
+import time
+
+from flask import current_app
+
+from backend.src.metrics import timed_call
+
+
+class MailQueueFullError(Exception):
+    """The outbound queue is at ``MAIL_QUEUE_MAX_SIZE``."""
+
+
+class MailQueue:
+    """Per-process background sender, configured from the Flask app config."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.batch_size = 50
+        self.max_attempts = 5
+        self.retry_base = 2
+        self.retry_max = 300
+        self.idle_seconds = 30
+        self.drain_timeout = 5
+        self.stats = _new_stats()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.shutdown()
+        self.app = app
+        self.batch_size = app.config.get("MAIL_QUEUE_BATCH_SIZE", 50)
+        self.max_attempts = app.config.get("MAIL_QUEUE_MAX_ATTEMPTS", 5)
+        self.retry_base = app.config.get("MAIL_QUEUE_RETRY_BASE_SECONDS", 2)
+        self.retry_max = app.config.get("MAIL_QUEUE_RETRY_MAX_SECONDS", 300)
+        self.idle_seconds = app.config.get("MAIL_QUEUE_IDLE_SECONDS", 30)
+        self.drain_timeout = app.config.get("MAIL_QUEUE_DRAIN_TIMEOUT", 5)
+        self.stats = _new_stats()
+        self._queue = queue.Queue(app.config.get("MAIL_QUEUE_MAX_SIZE", 10000))
+        self._pending = 0
+        app.extensions["mail_queue"] = self
+
+    # --- Public API ---------------------------------------------------------
+
+    def enqueue(self, message):
+        """Queue ``message`` for sending; raises MailQueueFullError."""
+        self._ensure_worker()
+        with self._lock:
+            self._pending += 1
+        try:
+            self._queue.put_nowait((message, 1))
+        except queue.Full:
+            self._done("dropped")
+            raise MailQueueFullError("Outbound mail queue is full")
+        self.stats["queued"] += 1
+
+    def flush(self, timeout=None):
+        """Wait until every queued message is sent or has failed for good."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def info(self):
+        return {"depth": self._pending, **self.stats}
+
+    def shutdown(self, timeout=1):
+        """Stop this process's worker; mail still queued is discarded."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and self._pid == os.getpid():
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                return  # A daemon thread; it dies with the process
+            thread.join(timeout)
+
+    # --- Worker -------------------------------------------------------------
+
+    def _ensure_worker(self):
+        # One worker per process: a thread does not survive a gunicorn fork
+        if self._running():
+            return
+        with self._lock:
+            if not self._running():
+                if self._pid != os.getpid():
+                    atexit.register(self._drain_at_exit)
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(self.app, self._queue),
+                    name="mail-queue",
+                    daemon=True,
+                )
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _running(self):
+        return (
+            self._pid == os.getpid()
+            and self._thread is not None
+            and self._thread.is_alive()
+        )
+
+    def _drain_at_exit(self):
+        if self._pending and not self.flush(self.drain_timeout):
+            self.app.logger.warning(f"Exiting with {self._pending} unsent emails")
+
+    def _run(self, app, work_queue):
+        # The queue is passed in so a worker left over from a previous
+        # init_app never takes messages meant for the current one
+        with app.app_context():
+            sender = SMTPSender(app.extensions["mail"])
+            retries = []  # Heap of (due, seq, message, attempt)
+            sequence = itertools.count()
+            while True:
+                batch = self._next_batch(work_queue, retries, sender)
+                if None in batch:
+                    sender.close()
+                    return
+                if not batch:
+                    continue
+                self.stats["batches"] += 1
+                for message, attempt in batch:
+                    try:
+                        sender.send(message)
+                    except Exception as e:
+                        sender.close()  # The next message reconnects
+                        if attempt >= self.max_attempts or not _temporary(e):
+                            current_app.logger.error(
+                                f"Giving up on email to {message.send_to}: {e}"
+                            )
+                            self._done("failed")
+                            continue
+                        delay = min(
+                            self.retry_base * 2 ** (attempt - 1), self.retry_max
+                        )
+                        due = time.monotonic() + delay
+                        heapq.heappush(
+                            retries, (due, next(sequence), message, attempt + 1)
+                        )
+                        self.stats["retries"] += 1
+                    else:
+                        self._done("sent")
+                self.stats["connections"] = sender.connections
+
+    def _next_batch(self, work_queue, retries, sender):
+        """Up to ``batch_size`` messages, waiting for the first one."""
+        timeout = self.idle_seconds if sender.open else None
+        if retries:
+            wait = max(retries[0][0] - time.monotonic(), 0)
+            timeout = wait if timeout is None else min(timeout, wait)
+        batch = []
+        try:
+            batch.append(work_queue.get(timeout=timeout))
+        except queue.Empty:
+            if not retries or retries[0][0] > time.monotonic():
+                sender.close()  # Idle: don't hold the connection open
+        while retries and retries[0][0] <= time.monotonic():
+            _, _, message, attempt = heapq.heappop(retries)
+            batch.append((message, attempt))
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(work_queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _done(self, outcome):
+        with self._idle:
+            self.stats[outcome] += 1
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.notify_all()
+
+
+class SMTPSender:
+    """A Flask-Mail connection kept open between sends."""
+
+    def __init__(self, state):
+        self.state = state
+        self.connection = None
+        self.connections = 0
+
+    @property
+    def open(self):
+        return self.connection is not None
+
+    def send(self, message):
+        if self.connection is None:
+            with timed_call("smtp", "connect"):
+                connection = self.state.connect()
+                connection.__enter__()
+            self.connection = connection
+            self.connections += 1
+        with timed_call("smtp", "send"):
+            self.connection.send(message)
+
+    def close(self):
+        connection, self.connection = self.connection, None
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass  # Already dropped by the server
+
+
+def _temporary(error):
+    """Whether sending again later might succeed."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return all(400 <= code < 500 for code in codes)
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPException, OSError))
+
+
+def _new_stats():
+    return {
+        "queued": 0,
+        "sent": 0,
+        "retries": 0,
+        "failed": 0,
+        "dropped": 0,
+        "batches": 0,
+        "connections": 0,
+    }
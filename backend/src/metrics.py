@@ -0,0 +1,268 @@
+"""
+Prometheus metrics, served in the text format at ``/metrics``.
+
+``init_metrics`` records, for every request:
+
+* ``http_request_duration_seconds`` by endpoint (the Flask endpoint name,
+  e.g. ``api.billing.balance``, never the raw path), method and status;
+* ``http_request_db_queries`` and ``http_request_db_seconds``, the number of
+  SQL statements the request ran and the time spent in them, by endpoint.
+
+It also listens to every engine's events for ``db_queries_total`` and
+``db_query_seconds_total`` per bind (background work included) and for the
+pool gauges and counters ``/health/db`` reports. ``timed_call`` times the
+calls the app makes to other services (Stripe, Apple, Google, SMTP) into
+``external_call_duration_seconds`` by service, operation and outcome.
+
+Under gunicorn, set ``PROMETHEUS_MULTIPROC_DIR`` to an empty directory in
+the server's environment. The variable must be set before the app is
+imported, because metrics are created at import time. Each worker then
+writes its samples to memory-mapped files there, and ``/metrics`` adds up
+the files of every worker on the host, whichever worker answers the scrape.
+Clear the directory on deploy, and add
+``from backend.src.metrics import child_exit`` to the gunicorn config so a
+dead worker's gauges stop counting. Without the variable, each process
+reports only its own samples.
+
+Requests are recorded when they are torn down, so one that ends in an
+unhandled exception is still counted, as a 500.
+
+``METRICS_ENABLED = False`` turns the endpoint and recording off. When
+``METRICS_TOKEN`` is set, scrapes of ``/metrics`` and the ``/health/*``
+endpoints (``token_required``) must send ``Authorization: Bearer <token>``.
+With ``METRICS_REQUIRE_TOKEN`` (the production default) and no token, those
+endpoints answer 404.
+"""
+
+import hmac
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import Response, abort, current_app, g, has_request_context, request
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+
+_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get(
+    "prometheus_multiproc_dir"
+)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to handle a request, by endpoint, method and status.",
+    ("endpoint", "method", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements run while handling a request.",
+    ("endpoint",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, float("inf")),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Time spent in SQL statements while handling a request.",
+    ("endpoint",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, float("inf")),
+)
+QUERIES = Counter("db_queries", "SQL statements run.", ("bind",))
+QUERY_SECONDS = Counter("db_query_seconds", "Time spent in SQL statements.", ("bind",))
+POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured connection pool size.",
+    ("bind",),
+    multiprocess_mode="livesum",
+)
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Connections currently in use.",
+    ("bind",),
+    multiprocess_mode="livesum",
+)
+POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts", "Connections taken from the pool.", ("bind",)
+)
+POOL_CONNECTS = Counter(
+    "db_pool_connects", "New database connections opened.", ("bind",)
+)
+POOL_INVALIDATIONS = Counter(
+    "db_pool_invalidations", "Connections discarded as broken.", ("bind",)
+)
+EXTERNAL_SECONDS = Histogram(
+    "external_call_duration_seconds",
+    "Time spent calling another service, by service, operation and outcome.",
+    ("service", "operation", "outcome"),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf")),
+)
+
+
+@contextmanager
+def timed_call(service, operation):
+    """
+    Time a call to another service, as a ``with`` block or a decorator.
+
+    The outcome label is ``error`` if the block raises, ``ok`` otherwise.
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        EXTERNAL_SECONDS.labels(service, operation, outcome).observe(
+            time.perf_counter() - start
+        )
+
+
+def init_metrics(app):
+    """
+    Record request and database metrics for ``app``.
+
+    Call it after ``instrument_engines`` and before the other extensions
+    register their hooks. ``after_request`` hooks run in reverse order, so
+    the status is then read after theirs (compression, security headers)
+    have run, and the timing, taken at teardown, covers them.
+    """
+    if app.config.get("METRICS_REQUIRE_TOKEN") and not app.config.get("METRICS_TOKEN"):
+        app.logger.warning(
+            "METRICS_TOKEN is not set: /metrics and /health/* answer 404"
+        )
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    for bind, (engine, _) in app.extensions["db_pool_stats"].items():
+        _instrument_engine(engine, bind)
+    app.before_request(_start_request)
+    app.after_request(_capture_status)
+    app.teardown_request(_record_request)
+
+
+def token_required(view):
+    """
+    Serve ``view`` only to requests bearing ``METRICS_TOKEN``.
+
+    Without a token it is open, unless ``METRICS_REQUIRE_TOKEN`` is set;
+    then it answers 404.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        config = current_app.config
+        token = config.get("METRICS_TOKEN")
+        if not token:
+            if config.get("METRICS_REQUIRE_TOKEN"):
+                abort(404)
+        elif not hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        ):
+            abort(401)
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def metrics_response():
+    """The ``/metrics`` response: every worker's samples when multiprocess."""
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        REGISTRY,
+        CollectorRegistry,
+        generate_latest,
+        multiprocess,
+    )
+
+    if not current_app.config.get("METRICS_ENABLED", True):
+        abort(404)
+    if _MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, _MULTIPROC_DIR)
+    else:
+        registry = REGISTRY
+    return Response(
+        generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST}
+    )
+
+
+def child_exit(server, worker):
+    """gunicorn hook: drop an exited worker's live gauges."""
+    if _MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid, _MULTIPROC_DIR)
+
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_db = [0, 0.0]  # Statements, seconds
+
+
+def _capture_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _record_request(exc):
+    start = g.pop("metrics_start", None)
+    if start is None:  # An earlier before_request hook failed
+        return
+    # No response reached the after_request hooks when the exception
+    # propagates (debug and testing) or a later hook raised
+    status = g.pop("metrics_status", 500)
+    endpoint = request.endpoint or "none"
+    queries, seconds = g.pop("metrics_db")
+    REQUEST_SECONDS.labels(endpoint, request.method, str(status)).observe(
+        time.perf_counter() - start
+    )
+    REQUEST_QUERIES.labels(endpoint).observe(queries)
+    REQUEST_DB_SECONDS.labels(endpoint).observe(seconds)
+
+
+def _instrument_engine(engine, bind):
+    queries = QUERIES.labels(bind)
+    query_seconds = QUERY_SECONDS.labels(bind)
+    counts_use = hasattr(engine.pool, "checkedout")
+
+    def before_cursor_execute(conn, cursor, statement, params, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, params, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+        queries.inc()
+        query_seconds.inc(elapsed)
+        if has_request_context():
+            totals = g.get("metrics_db")
+            if totals is not None:
+                totals[0] += 1
+                totals[1] += elapsed
+
+    def handle_error(context):
+        # after_cursor_execute never runs for a failed statement
+        connection = context.connection
+        starts = connection.info.get("metrics_query_start") if connection else None
+        if starts:
+            starts.pop()
+
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.labels(bind).inc()
+        if counts_use:
+            # Set here rather than at startup: a gunicorn master that built
+            # the engine before forking would otherwise count as a worker
+            POOL_SIZE.labels(bind).set(engine.pool.size())
+            POOL_CHECKED_OUT.labels(bind).set(engine.pool.checkedout())
+
+    def checkin(dbapi_connection, connection_record):
+        if counts_use:
+            POOL_CHECKED_OUT.labels(bind).set(engine.pool.checkedout())
+
+    def connect(dbapi_connection, connection_record):
+        POOL_CONNECTS.labels(bind).inc()
+
+    def invalidate(dbapi_connection, connection_record, exception):
+        POOL_INVALIDATIONS.labels(bind).inc()
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+    event.listen(engine, "checkout", checkout)
+    event.listen(engine, "checkin", checkin)
+    event.listen(engine, "connect", connect)
+    event.listen(engine, "invalidate", invalidate)
@@ -0,0 +1,29 @@
+"""Files shared between the workers of one host."""
+
+import os
+
+
+def open_private(path, flags=os.O_RDWR | os.O_CREAT):
+    """
+    Open ``path`` without following symlinks, creating it readable by this
+    user only. Raises RuntimeError if the file exists but could be read or
+    replaced by anyone else: these files decide what the app trusts.
+    """
+    fd = os.open(path, flags | getattr(os, "O_NOFOLLOW", 0), 0o600)
+    try:
+        check_private_file(fd, path)
+    except RuntimeError:
+        os.close(fd)
+        raise
+    return fd
+
+
+def check_private_file(fd, path):
+    if not hasattr(os, "geteuid"):  # pragma: no cover - Windows
+        return
+    st = os.fstat(fd)
+    if st.st_uid != os.geteuid() or st.st_mode & 0o077:
+        raise RuntimeError(
+            f"Refusing to use {path}: it must be owned by this user and not "
+            "accessible to group or others"
+        )
@@ -0,0 +1,111 @@
+"""
+Read-replica routing.
+
+With ``SQLALCHEMY_REPLICA_URI`` set, a ``replica`` bind is added next to the
+primary database. Reads opt in to it: inside ``replica_reads()`` (or a view
+decorated with ``@replica_safe``), plain SELECTs go to the replica.
+Everything else goes to the primary: flushes, INSERT/UPDATE/DELETE and
+SELECT ... FOR UPDATE.
+
+Two rules keep a user from reading older data than they just wrote:
+
+* once a session has written, the rest of that request reads from the
+  primary too;
+* a response to a request that wrote sets a short-lived ``db_last_write``
+  cookie. For ``REPLICA_STICKY_SECONDS`` after a write, that client's reads
+  go to the primary, whichever worker or host serves them. The window
+  should cover the replica's usual lag.
+
+Without a replica URI nothing changes: every query goes to the primary.
+"""
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.dml import UpdateBase
+
+from backend.src.db_engine import engine_options
+
+REPLICA_BIND = "replica"
+STICKY_COOKIE = "db_last_write"
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that can send reads to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or isinstance(clause, UpdateBase):
+                self.info["wrote"] = True
+            elif (
+                self.info.get("replica")
+                and not self.info.get("wrote")
+                and isinstance(clause, Select)
+                and clause._for_update_arg is None
+            ):
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def configure_replica(app):
+    """Add the ``replica`` bind and the stickiness cookie, if configured."""
+    uri = app.config.get("SQLALCHEMY_REPLICA_URI")
+    if not uri:
+        return
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    binds[REPLICA_BIND] = {"url": uri, **engine_options(app.config, uri)}
+    app.config["SQLALCHEMY_BINDS"] = binds
+    app.after_request(_stick_after_write)
+
+
+@contextmanager
+def replica_reads():
+    """Send the block's SELECTs to the replica, unless this client just wrote."""
+    session = current_app.extensions["sqlalchemy"].session
+    previous = session.info.get("replica", False)
+    session.info["replica"] = not _sticky()
+    try:
+        yield
+    finally:
+        session.info["replica"] = previous
+
+
+def replica_safe(view):
+    """Decorate a read-only view so its queries may use the replica."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+
+    return wrapper
+
+
+def _sticky():
+    if not has_request_context():
+        return False
+    try:
+        last_write = float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        return False
+    return time.time() - last_write < current_app.config["REPLICA_STICKY_SECONDS"]
+
+
+def _stick_after_write(response):
+    session = current_app.extensions["sqlalchemy"].session
+    if session.info.get("wrote"):
+        response.set_cookie(
+            STICKY_COOKIE,
+            f"{time.time():.3f}",
+            max_age=current_app.config["REPLICA_STICKY_SECONDS"],
+            secure=current_app.config.get("JWT_COOKIE_SECURE", False),
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
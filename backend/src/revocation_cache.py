@@ -0,0 +1,339 @@
+"""
+Host-wide cache in front of the TokenBlocklist table.
+
+The cache lives in a single memory-mapped file so every gunicorn worker on
+the host shares it. It holds two structures:
+
+* a Bloom filter of every revoked JTI. A negative answer means "definitely
+  not revoked" and lets the request skip the database entirely.
+* a small set-associative LRU of JTIs known to be revoked, so repeated use of
+  a revoked token is also answered without a query.
+
+Anything the cache cannot answer (a Bloom false positive that is not in the
+LRU) falls through to the database. Revocations made on this host reach the
+cache before their row is committed, so they apply at once in every worker.
+Rows written by other hosts are picked up by a catch-up sync against the
+table, one primary-key range probe, at most once per
+REVOCATION_CACHE_SYNC_SECONDS for the whole host (the last sync time is kept
+in the shared file). A token revoked on *another host* is therefore still
+accepted here for up to that long; 0 syncs before every lookup instead,
+closing that window at the cost of one probe per request.
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from backend.src.private_files import open_private
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+_MAGIC = b"JTIBLOOM"
+_VERSION = 2
+# magic, version, nbits, nhashes, lru_sets, lru_ways,
+# last_id, synced_at, items, gap_since
+_HEADER = struct.Struct("<8sIQIIIQdQd")
+_HEADER_SIZE = 64
+_LRU_ENTRY = struct.Struct("<16sd")  # jti digest, last used timestamp
+# Concurrent transactions can commit ids out of order, so the sync watermark
+# stops at the first missing id. A hole still open after this many seconds
+# belongs to a rolled-back insert and is skipped.
+_GAP_TIMEOUT = 30
+
+
+def _digest(jti):
+    return hashlib.blake2b(jti.encode("utf-8"), digest_size=16).digest()
+
+
+class RevocationCache:
+    """Shared revoked-token cache, configured from the Flask app config."""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.stats = {"bloom_negative": 0, "lru_hit": 0, "fallthrough": 0, "syncs": 0}
+        self._lock = threading.Lock()
+        self._mm = None
+        self._fd = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.close()
+        self.enabled = app.config.get("REVOCATION_CACHE_ENABLED", True)
+        if not self.enabled:
+            return
+
+        capacity = app.config.get("REVOCATION_CACHE_CAPACITY", 1_000_000)
+        error_rate = app.config.get("REVOCATION_CACHE_ERROR_RATE", 0.001)
+        self.sync_interval = app.config.get("REVOCATION_CACHE_SYNC_SECONDS", 1)
+
+        nbits = int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        nbits = max(8, (nbits + 7) // 8 * 8)
+        self.nbits = nbits
+        self.nhashes = max(1, round(nbits / capacity * math.log(2)))
+        self.lru_ways = 4
+        self.lru_sets = max(1, app.config.get("REVOCATION_CACHE_LRU_SIZE", 4096) // 4)
+        self._bloom_offset = _HEADER_SIZE
+        self._lru_offset = _HEADER_SIZE + nbits // 8
+        size = self._lru_offset + self.lru_sets * self.lru_ways * _LRU_ENTRY.size
+
+        path = app.config.get("REVOCATION_CACHE_PATH", "auto")
+        if path == "auto":
+            # Keep the file in a directory only this app's user can write to:
+            # anyone able to replace it could blank the filter.
+            uri = str(app.config.get("SQLALCHEMY_DATABASE_URI", ""))
+            key = hashlib.sha1(uri.encode("utf-8")).hexdigest()[:12]
+            os.makedirs(app.instance_path, mode=0o700, exist_ok=True)
+            path = os.path.join(app.instance_path, f"jti-revocations-{key}.bin")
+        self.path = path
+        self._open(size)
+        app.extensions["revocation_cache"] = self
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _open(self, size):
+        if self.path is None:
+            # Anonymous mapping: private to this process and its forks
+            self._mm = mmap.mmap(-1, size)
+            self._write_header(last_id=0, synced_at=0.0, items=0)
+            return
+
+        self._fd = open_private(self.path)
+        with self._exclusive():
+            if os.fstat(self._fd).st_size != size or not self._header_matches(size):
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                self._mm = mmap.mmap(self._fd, size)
+                self._write_header(last_id=0, synced_at=0.0, items=0)
+            else:
+                self._mm = mmap.mmap(self._fd, size)
+
+    def _header_matches(self, size):
+        raw = os.pread(self._fd, _HEADER.size, 0)
+        if len(raw) < _HEADER.size:
+            return False
+        magic, version, nbits, nhashes, sets, ways, *_ = _HEADER.unpack(raw)
+        return (magic, version, nbits, nhashes, sets, ways) == (
+            _MAGIC,
+            _VERSION,
+            self.nbits,
+            self.nhashes,
+            self.lru_sets,
+            self.lru_ways,
+        )
+
+    def _read_header(self):
+        return _HEADER.unpack_from(self._mm, 0)[6:]
+
+    def _write_header(self, last_id, synced_at, items, gap_since=0.0):
+        _HEADER.pack_into(
+            self._mm,
+            0,
+            _MAGIC,
+            _VERSION,
+            self.nbits,
+            self.nhashes,
+            self.lru_sets,
+            self.lru_ways,
+            last_id,
+            synced_at,
+            items,
+            gap_since,
+        )
+
+    @contextmanager
+    def _exclusive(self):
+        """Lock out writers in this process and in every other worker."""
+        with self._lock:
+            if self._fd is None or fcntl is None:
+                yield
+                return
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # --- Bloom filter -----------------------------------------------------
+
+    def _bit_positions(self, digest):
+        h1, h2 = struct.unpack("<QQ", digest)
+        return [(h1 + i * h2) % self.nbits for i in range(self.nhashes)]
+
+    def _bloom_add(self, digest):
+        """Set the bits for ``digest``; returns True if any bit was new."""
+        changed = False
+        for pos in self._bit_positions(digest):
+            offset = self._bloom_offset + (pos >> 3)
+            mask = 1 << (pos & 7)
+            byte = self._mm[offset]
+            if not byte & mask:
+                self._mm[offset] = byte | mask
+                changed = True
+        return changed
+
+    def _bloom_contains(self, digest):
+        mm, base = self._mm, self._bloom_offset
+        for pos in self._bit_positions(digest):
+            if not mm[base + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    # --- LRU of known-revoked JTIs ------------------------------------------
+
+    def _lru_slots(self, digest):
+        start = (struct.unpack_from("<Q", digest)[0] % self.lru_sets) * self.lru_ways
+        return [
+            self._lru_offset + (start + way) * _LRU_ENTRY.size
+            for way in range(self.lru_ways)
+        ]
+
+    def _lru_get(self, digest):
+        for offset in self._lru_slots(digest):
+            if self._mm[offset : offset + 16] == digest:
+                # A lost timestamp update under a race only skews eviction order
+                struct.pack_into("<d", self._mm, offset + 16, time.time())
+                return True
+        return False
+
+    def _lru_put(self, digest):
+        slots = self._lru_slots(digest)
+        victim, oldest = slots[0], None
+        for offset in slots:
+            stored, used = _LRU_ENTRY.unpack_from(self._mm, offset)
+            if stored == digest:
+                victim = offset
+                break
+            if oldest is None or used < oldest:
+                victim, oldest = offset, used
+        _LRU_ENTRY.pack_into(self._mm, victim, digest, time.time())
+
+    # --- Public API ---------------------------------------------------------
+
+    def lookup(self, jti):
+        """
+        Answer from the cache alone.
+
+        Returns False when the JTI is definitely not revoked, True when it is
+        known to be revoked and None when the database has to be asked.
+        """
+        if not self.enabled:
+            return None
+        if not self._read_header()[1]:
+            # Never synced: the filter does not yet cover existing rows
+            return None
+        digest = _digest(jti)
+        if not self._bloom_contains(digest):
+            self.stats["bloom_negative"] += 1
+            return False
+        if self._lru_get(digest):
+            self.stats["lru_hit"] += 1
+            return True
+        self.stats["fallthrough"] += 1
+        return None
+
+    def add(self, jti):
+        """
+        Record a newly revoked JTI.
+
+        Call this before the blocklist row is committed so that no worker can
+        observe a committed revocation that the filter does not cover yet.
+        """
+        if not self.enabled:
+            return
+        digest = _digest(jti)
+        with self._exclusive():
+            last_id, synced_at, items, gap_since = self._read_header()
+            if self._bloom_add(digest):
+                items += 1
+            self._lru_put(digest)
+            self._write_header(last_id, synced_at, items, gap_since)
+
+    def remember(self, jti):
+        """Remember a JTI the database confirmed as revoked."""
+        if not self.enabled:
+            return
+        with self._exclusive():
+            self._lru_put(_digest(jti))
+
+    def sync(self, fetch_rows, force=False):
+        """
+        Catch up with blocklist rows written elsewhere.
+
+        ``fetch_rows(after_id)`` must return ``(id, jti)`` pairs with an id
+        greater than ``after_id``. The first sync loads the whole table; later
+        ones run at most once per ``REVOCATION_CACHE_SYNC_SECONDS`` on the
+        host, or before every lookup when that is 0.
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        last_id, synced_at = self._read_header()[:2]
+        if (
+            not force
+            and synced_at
+            and self.sync_interval
+            and now - synced_at < self.sync_interval
+        ):
+            return
+
+        rows = list(fetch_rows(last_id))
+        if not rows and synced_at and not self.sync_interval:
+            return
+
+        with self._exclusive():
+            last_id, _, items, gap_since = self._read_header()
+            expected = last_id + 1
+            for row_id, jti in rows:
+                if self._bloom_add(_digest(jti)):
+                    items += 1
+                if row_id == expected:
+                    expected += 1
+            highest = max((row_id for row_id, _ in rows), default=last_id)
+
+            if not last_id or expected > highest:
+                # Initial load, or no holes: everything up to highest is seen
+                last_id, gap_since = max(last_id, highest), 0.0
+            elif not gap_since:
+                last_id, gap_since = expected - 1, now
+            elif now - gap_since > _GAP_TIMEOUT:
+                last_id, gap_since = highest, 0.0
+            else:
+                last_id = expected - 1
+            self._write_header(last_id, now, items, gap_since)
+            self.stats["syncs"] += 1
+
+    def reset(self):
+        """Drop all cached state; the next sync reloads from the database."""
+        if not self.enabled:
+            return
+        with self._exclusive():
+            self._mm[_HEADER_SIZE:] = bytes(len(self._mm) - _HEADER_SIZE)
+            self._write_header(last_id=0, synced_at=0.0, items=0)
+
+    def info(self):
+        last_id, synced_at, items, _ = (
+            self._read_header() if self.enabled else (0, 0.0, 0, 0.0)
+        )
+        return {
+            "enabled": self.enabled,
+            "path": getattr(self, "path", None),
+            "items": items,
+            "last_id": last_id,
+            "synced_at": synced_at,
+            **self.stats,
+        }
@@ -0,0 +1,73 @@
+"""
+Cold-start profile of ``import backend`` + ``create_app``.
+
+Every gunicorn worker (and every CLI run) pays for what the app imports at
+startup. ``profile_startup`` measures it in a fresh interpreter run with
+``python -X importtime`` and reports the wall time, the import time per
+top-level package and which of ``DEFERRED_MODULES`` got imported anyway.
+Those are the heavy dependencies the app only imports on first use.
+
+Run it as ``flask startup-profile``, which fails above
+``STARTUP_BUDGET_SECONDS``. ``backend/tests/test_startup.py`` only checks
+that the deferred modules stay unloaded, since wall time depends on the
+host.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+# Imported on first use, never by create_app
+DEFERRED_MODULES = ("stripe", "alembic", "flask_migrate", "requests", "passlib")
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from backend import create_app
+create_app({config!r})
+seconds = time.perf_counter() - start
+loaded = [name for name in {deferred!r} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "loaded": loaded}}))
+"""
+
+
+def profile_startup(config="backend.config.TestingConfig", top=15):
+    """Import and build the app under ``config`` in a subprocess; returns a report."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            _CHILD.format(config=config, deferred=DEFERRED_MODULES),
+        ],
+        cwd=_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f"create_app({config}) failed:\n{result.stderr[-2000:]}")
+    # The app's loggers also write to stdout; the report is the last line
+    child = json.loads(result.stdout.strip().splitlines()[-1])
+
+    packages = Counter()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us)
+
+    return {
+        "config": config,
+        "seconds": round(child["seconds"], 3),
+        "import_seconds": round(sum(packages.values()) / 1e6, 3),
+        "deferred_loaded": child["loaded"],
+        "packages": [
+            {"package": name, "ms": round(us / 1000, 1)}
+            for name, us in packages.most_common(top)
+        ],
+    }
@@ -0,0 +1,136 @@
+"""
+Stripe calls made by the billing endpoints.
+
+``StripeGateway`` owns one configured ``StripeClient`` per process instead of
+setting ``stripe.api_key`` globally on every request. The client keeps a
+pooled ``requests`` session, so calls reuse warm TLS connections. A payment
+sheet then costs a single round trip of latency:
+
+* callers keep the customer id on ``User.stripe_customer_id`` and only call
+  ``create_customer`` the first time, never ``Customer.retrieve``;
+* the EphemeralKey and the PaymentIntent are created concurrently.
+
+``STRIPE_API_BASE`` points the client at another server, e.g. the fake in
+``backend/benchmarks/fake_stripe.py`` used by tests and benchmarks.
+
+The ``stripe`` SDK takes most of a second to import, so it is only imported
+when the first Stripe call builds the client, not at app startup.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.src.metrics import timed_call
+
+
+class StripeGateway:
+    """Pooled Stripe client, configured from the Flask app config."""
+
+    def __init__(self, app=None):
+        self.config = {}
+        self._lock = threading.Lock()
+        self._client = None
+        self._executor = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.shutdown()
+        self.config = {
+            "api_key": app.config.get("STRIPE_SECRET_KEY"),
+            "api_base": app.config.get("STRIPE_API_BASE"),
+            "timeout": app.config.get("STRIPE_TIMEOUT", 10),
+            "pool_size": app.config.get("STRIPE_POOL_SIZE", 10),
+            "max_network_retries": app.config.get("STRIPE_MAX_NETWORK_RETRIES", 2),
+        }
+        app.extensions["stripe_gateway"] = self
+
+    @property
+    def client(self):
+        # Created lazily and per process: a pooled session inherited across a
+        # gunicorn fork would share sockets with the parent
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                import requests
+                import stripe
+                from requests.adapters import HTTPAdapter
+
+                config = self.config
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=config["pool_size"],
+                    pool_maxsize=config["pool_size"],
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                base_addresses = {}
+                if config["api_base"]:
+                    base_addresses["api"] = config["api_base"]
+                self._client = stripe.StripeClient(
+                    config["api_key"] or "",
+                    base_addresses=base_addresses,
+                    max_network_retries=config["max_network_retries"],
+                    http_client=stripe.RequestsClient(
+                        timeout=config["timeout"], session=session
+                    ),
+                )
+                self._executor = ThreadPoolExecutor(
+                    config["pool_size"], thread_name_prefix="stripe"
+                )
+                self._pid = os.getpid()
+            return self._client
+
+    def create_customer(self, email, user_id, idempotency_key=None):
+        """Create a Stripe customer and return its id."""
+        client = self.client
+        with timed_call("stripe", "create_customer"):
+            customer = client.customers.create(
+                params={"email": email, "metadata": {"user_id": str(user_id)}},
+                options=_options(idempotency_key, "customer"),
+            )
+        return customer.id
+
+    def payment_sheet(self, customer_id, amount, metadata, idempotency_key=None):
+        """
+        Create the EphemeralKey and PaymentIntent for a PaymentSheet.
+
+        ``amount`` is in cents. Both calls are issued concurrently.
+        """
+        import stripe
+
+        client = self.client
+        create_key = timed_call("stripe", "create_ephemeral_key")
+        create_intent = timed_call("stripe", "create_payment_intent")
+        ephemeral_key = self._executor.submit(
+            create_key(client.ephemeral_keys.create),
+            params={"customer": customer_id},
+            options={"stripe_version": stripe.api_version},
+        )
+        payment_intent = self._executor.submit(
+            create_intent(client.payment_intents.create),
+            params={
+                "amount": amount,
+                "currency": "usd",
+                "customer": customer_id,
+                "metadata": metadata,
+                "automatic_payment_methods": {"enabled": True},
+            },
+            options=_options(idempotency_key, "payment_intent"),
+        )
+        return ephemeral_key.result(), payment_intent.result()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._client = None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False)
+
+
+def _options(idempotency_key, operation):
+    # Stripe dedupes retried creates that carry the same key
+    if idempotency_key:
+        return {"idempotency_key": f"{operation}:{idempotency_key}"}
+    return {}
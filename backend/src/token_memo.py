@@ -0,0 +1,78 @@
+"""
+Memo of identity tokens that already passed signature verification.
+
+Mobile clients re-submit the same Sign in with Apple token when they retry,
+and each verification costs an RS256 check. ``VerifiedTokenCache`` keeps the
+verified claims of recent tokens, keyed by a digest of the token and the
+verification settings. An entry lives for ``VERIFIED_TOKEN_CACHE_TTL``
+seconds at most and never past the token's own ``exp``, so a cached answer
+is one the full verification would also have given.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class VerifiedTokenCache:
+    """Thread-safe TTL/LRU map of token digest to verified claims."""
+
+    def __init__(self, app=None, clock=time.time):
+        self.clock = clock
+        self.maxsize = 1024
+        self.ttl = 300
+        self.stats = {"hits": 0, "misses": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.maxsize = app.config.get("VERIFIED_TOKEN_CACHE_SIZE", 1024)
+        self.ttl = app.config.get("VERIFIED_TOKEN_CACHE_TTL", 300)
+        self.stats = {"hits": 0, "misses": 0}
+        self.clear()
+        app.extensions["verified_tokens"] = self
+
+    @staticmethod
+    def key(token, *settings):
+        """Digest of the token and whatever else its verification depended on."""
+        digest = hashlib.sha256(token.encode("utf-8"))
+        for setting in settings:
+            digest.update(b"\0" + repr(setting).encode("utf-8"))
+        return digest.digest()
+
+    def get(self, key):
+        """The cached claims for ``key``, or None."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return dict(entry[1])
+
+    def put(self, key, claims, verify_exp=True):
+        """Remember verified ``claims`` until their ``exp`` or the TTL."""
+        if not self.maxsize:
+            return
+        expires_at = self.clock() + self.ttl
+        if verify_exp and "exp" in claims:
+            expires_at = min(expires_at, float(claims["exp"]))
+        with self._lock:
+            self._entries[key] = (expires_at, dict(claims))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,298 @@
+"""
+Processing of queued Stripe webhook events.
+
+The webhook endpoint verifies an event, stores it in the ``WebhookEvent``
+outbox and acknowledges at once. Workers drain the outbox here in batches.
+Claiming an event takes a lease (``available_at`` moves into the future), so
+a worker that dies mid-batch only delays its events. Each event is applied
+and marked done in one database transaction, and only while the worker
+still holds its lease: a worker that overran it and lost the event to
+another rolls its changes back, so a balance is never credited twice for
+the same event. Failures are retried with exponential backoff and
+dead-lettered after ``WEBHOOK_MAX_ATTEMPTS`` attempts.
+
+Every serving process drains the queue from background threads every
+``WEBHOOK_WORKER_INTERVAL`` seconds. ``flask billing drain-webhooks`` drains
+it from the command line, e.g. when the interval is set to 0.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import func, select, update
+
+from backend.extensions import create_logger, db
+from backend.models.billing import (
+    TransactionStatus,
+    TransactionType,
+    UserBalance,
+    WebhookEvent,
+    WebhookStatus,
+)
+from backend.src.background import start_in_each_worker
+
+logger = create_logger(__name__)
+
+# Set after an event is queued so local workers start without waiting out
+# their poll interval
+_wakeup = threading.Event()
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _payment_succeeded(payment_intent):
+    UserBalance.record(
+        int(payment_intent["metadata"]["user_id"]),
+        float(payment_intent["amount"]) / 100,  # Convert cents to dollars
+        TransactionType.PURCHASE,
+        application="platform",
+        transaction_metadata={
+            "stripe_payment_intent": payment_intent["id"],
+            "stripe_payment_method": payment_intent.get("payment_method"),
+            "stripe_customer": payment_intent.get("customer"),
+        },
+    )
+
+
+def _payment_failed(payment_intent):
+    # Recorded for history; leaves the balance untouched
+    UserBalance.record(
+        int(payment_intent["metadata"]["user_id"]),
+        float(payment_intent["amount"]) / 100,
+        TransactionType.PURCHASE,
+        status=TransactionStatus.FAILED,
+        application="platform",
+        transaction_metadata={
+            "stripe_payment_intent": payment_intent["id"],
+            "stripe_error": payment_intent.get("last_payment_error"),
+        },
+    )
+
+
+# Event types that are queued, and how to apply each one's data.object
+HANDLERS = {
+    "payment_intent.succeeded": _payment_succeeded,
+    "payment_intent.payment_failed": _payment_failed,
+}
+
+
+def enqueue(event, payload):
+    """Queue a verified event for processing; the caller commits."""
+    WebhookEvent.enqueue(event["id"], event["type"], payload, _utcnow())
+
+
+def notify():
+    _wakeup.set()
+
+
+def claim_batch(batch_size, lease_seconds):
+    """
+    Lease up to ``batch_size`` due events and return their (id, attempts).
+
+    ``attempts`` identifies the lease: a later claim of the same event
+    increments it.
+
+    On Postgres concurrent workers skip each other's rows instead of
+    blocking; SQLite serialises the claim through its write lock.
+    """
+    now = _utcnow()
+    due = (
+        select(WebhookEvent.id)
+        .where(
+            WebhookEvent.status.in_([WebhookStatus.PENDING, WebhookStatus.PROCESSING]),
+            WebhookEvent.available_at <= now,
+        )
+        .order_by(WebhookEvent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = db.session.execute(
+        update(WebhookEvent)
+        .where(WebhookEvent.id.in_(due.scalar_subquery()))
+        .values(
+            status=WebhookStatus.PROCESSING,
+            attempts=WebhookEvent.attempts + 1,
+            available_at=now + timedelta(seconds=lease_seconds),
+        )
+        .returning(WebhookEvent.id, WebhookEvent.attempts)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return sorted(tuple(row) for row in claimed)
+
+
+def _settle(event_id, attempt, **values):
+    """Update a claimed event if lease ``attempt`` still holds it; the caller commits."""
+    return db.session.execute(
+        update(WebhookEvent)
+        .where(
+            WebhookEvent.id == event_id,
+            WebhookEvent.status == WebhookStatus.PROCESSING,
+            WebhookEvent.attempts == attempt,
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def _lease_lost(event):
+    db.session.rollback()
+    logger.warning(
+        f"Webhook event {event.event_id} was reclaimed by another worker "
+        "after its lease expired; leaving it to that worker"
+    )
+    return WebhookStatus.PROCESSING
+
+
+def process_event(event_id, attempt):
+    """Apply one event claimed as lease ``attempt``; returns its resulting status."""
+    config = current_app.config
+    event = db.session.get(WebhookEvent, event_id)
+    try:
+        data = json.loads(event.payload)["data"]["object"]
+        HANDLERS[event.event_type](data)
+        if not _settle(
+            event_id,
+            attempt,
+            status=WebhookStatus.DONE,
+            processed_at=_utcnow(),
+            last_error=None,
+        ):
+            return _lease_lost(event)
+        db.session.commit()
+        return WebhookStatus.DONE
+    except Exception as e:
+        db.session.rollback()
+        error = f"{type(e).__name__}: {e}"
+        if attempt >= config.get("WEBHOOK_MAX_ATTEMPTS", 8):
+            status, available_at = WebhookStatus.DEAD, event.available_at
+        else:
+            delay = min(
+                config.get("WEBHOOK_RETRY_BASE_SECONDS", 5) * 2 ** (attempt - 1),
+                config.get("WEBHOOK_RETRY_MAX_SECONDS", 3600),
+            )
+            status = WebhookStatus.PENDING
+            available_at = _utcnow() + timedelta(seconds=delay)
+        if not _settle(
+            event_id,
+            attempt,
+            status=status,
+            available_at=available_at,
+            last_error=error,
+        ):
+            return _lease_lost(event)
+        db.session.commit()
+        if status == WebhookStatus.DEAD:
+            logger.error(f"Webhook event {event.event_id} dead-lettered: {e}")
+        else:
+            logger.warning(
+                f"Webhook event {event.event_id} failed (attempt {attempt}), "
+                f"retrying in {delay}s: {e}"
+            )
+        return status
+
+
+def drain(batch_size=None, max_batches=None):
+    """Process due events until none are left or ``max_batches`` is reached."""
+    config = current_app.config
+    batch_size = batch_size or config.get("WEBHOOK_BATCH_SIZE", 100)
+    lease = config.get("WEBHOOK_LEASE_SECONDS", 60)
+    started = time.perf_counter()
+    counts = {"done": 0, "pending": 0, "dead": 0, "processing": 0}
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        claimed = claim_batch(batch_size, lease)
+        if not claimed:
+            break
+        batches += 1
+        for event_id, attempt in claimed:
+            counts[process_event(event_id, attempt).value] += 1
+
+    elapsed = time.perf_counter() - started
+    return {
+        "processed": counts["done"],
+        "retrying": counts["pending"],
+        "dead": counts["dead"],
+        "lease_lost": counts["processing"],
+        "batches": batches,
+        "seconds": round(elapsed, 3),
+    }
+
+
+def queue_stats():
+    """Event counts by status and the age of the oldest unprocessed event."""
+    counts = dict(
+        db.session.execute(
+            select(WebhookEvent.status, func.count()).group_by(WebhookEvent.status)
+        ).all()
+    )
+    oldest = db.session.scalar(
+        select(func.min(WebhookEvent.created_at)).where(
+            WebhookEvent.status.in_([WebhookStatus.PENDING, WebhookStatus.PROCESSING])
+        )
+    )
+    return {
+        **{status.value: counts.get(status, 0) for status in WebhookStatus},
+        "oldest_pending": oldest.isoformat() if oldest else None,
+    }
+
+
+def requeue_dead():
+    """Give every dead-lettered event a fresh set of attempts."""
+    result = db.session.execute(
+        update(WebhookEvent)
+        .where(WebhookEvent.status == WebhookStatus.DEAD)
+        .values(status=WebhookStatus.PENDING, attempts=0, available_at=_utcnow())
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def run_worker(app, interval, stop=None):
+    """Drain the queue, then wait for a new event or ``interval`` seconds."""
+    while stop is None or not stop.is_set():
+        try:
+            with app.app_context():
+                report = drain()
+                if report["batches"]:
+                    logger.info(f"Drained webhook queue: {report}")
+                db.session.remove()
+        except Exception as e:
+            logger.error(f"Webhook worker failed: {e}")
+        _wakeup.wait(interval)
+        _wakeup.clear()
+
+
+def start_workers(app, threads, interval, stop=None):
+    workers = [
+        threading.Thread(
+            target=run_worker,
+            args=(app, interval, stop),
+            name=f"webhook-worker-{i}",
+            daemon=True,
+        )
+        for i in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def init_webhook_workers(app):
+    """Run webhook workers in each serving process every ``WEBHOOK_WORKER_INTERVAL`` seconds."""
+    interval = app.config.get("WEBHOOK_WORKER_INTERVAL", 2)
+    if not interval:
+        if app.config.get("ENV") != "testing":
+            logger.warning(
+                "WEBHOOK_WORKER_INTERVAL is 0: Stripe payments are only credited "
+                "while `flask billing drain-webhooks --follow` runs"
+            )
+        return
+    threads = app.config.get("WEBHOOK_WORKER_THREADS", 1)
+    start_in_each_worker(app, lambda app: start_workers(app, threads, interval))
@@ -1,8 +1,29 @@
 import pytest
 
 from backend import create_app
+from backend.benchmarks.fake_smtp import FakeSMTP
 from backend.config import TestingConfig
-from backend.extensions import db
+from backend.extensions import db, mail_queue
+from backend.models.user import User
+from backend.tests.query_budget import QueryBudgetPlugin
+
+# Most SQL statements a request to each endpoint may run, in every test
+# (see backend/tests/query_budget.py). A test can override them with
+# @pytest.mark.query_budget({...}).
+QUERY_BUDGETS = {
+    "POST /api/auth/login": 1,
+    "POST /api/auth/refresh": 3,
+    "POST /api/auth/logout": 2,
+    "GET /api/auth/me": 2,
+    "GET /api/billing/balance": 3,
+    "GET /api/billing/transactions": 3,
+    "POST /api/billing/payment-webhook": 1,
+}
+
+
+def pytest_configure(config):
+    config.pluginmanager.register(QueryBudgetPlugin(QUERY_BUDGETS), "query_budget")
+    config.pluginmanager.import_plugin("pytester")  # For test_query_budget.py
 
 
 @pytest.fixture
@@ -18,7 +39,53 @@ def app():
         db.session.remove()
 
 
+@pytest.fixture
+def relay():
+    """A local SMTP server recording what it is sent."""
+    with FakeSMTP() as relay:
+        yield relay
+
+
+@pytest.fixture
+def mail_app(relay):
+    """A testing app that really sends mail, to ``relay``."""
+    settings = {**relay.config(), "MAIL_QUEUE_RETRY_BASE_SECONDS": 0.01}
+    app = create_app(type("MailConfig", (TestingConfig,), settings))
+    with app.app_context():
+        db.create_all()
+        yield app
+        mail_queue.shutdown()
+        db.drop_all()
+        db.session.remove()
+
+
 @pytest.fixture
 def client(app):
     """A test client for the app."""
     return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    """A password user stored in the test database."""
+    user = User(email="test@example.com", name="Test User")
+    user.set_password("password")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def auth_client(client, user):
+    """A test client holding JWT cookies for ``user``."""
+    response = client.post(
+        "/api/auth/login", json={"email": user.email, "password": "password"}
+    )
+    assert response.status_code == 200
+    return client
+
+
+def csrf_headers(client, refresh=False):
+    """Double-submit CSRF header for cookie-authenticated POST requests."""
+    name = "csrf_refresh_token" if refresh else "csrf_access_token"
+    return {"X-CSRF-TOKEN": client.get_cookie(name).value}
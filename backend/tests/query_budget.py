@@ -0,0 +1,187 @@
+"""
+SQL statement budgets for requests made in tests.
+
+``QueryBudgetPlugin`` records the statements every request runs, on any
+engine, and files them under the request's route (``"GET /api/auth/me"``).
+Requests from any test client are recorded, ``client`` and ``auth_client``
+included.
+
+* Budgets: ``conftest.QUERY_BUDGETS`` caps endpoints for the whole suite,
+  and ``@pytest.mark.query_budget({"GET /api/auth/me": 1})`` overrides them
+  for one test. A test whose requests (setup included) exceed a budget fails
+  and lists the statements.
+* Likely N+1 patterns: an identical statement run ``REPEAT_THRESHOLD`` or
+  more times in one request. It fails a test that has a budget for that
+  endpoint and is listed in the report either way.
+* ``queries`` fixture: the requests the current test made, for ad-hoc
+  assertions.
+* A per-endpoint table of requests, mean and max statements, and repeats
+  is printed at the end of the session.
+"""
+
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+import pytest
+from flask import has_request_context, request, request_started
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REPEAT_THRESHOLD = 3
+_ENVIRON_KEY = "query_budget.request"
+
+
+@dataclass
+class RequestQueries:
+    """The statements one request ran."""
+
+    endpoint: str
+    statements: list = field(default_factory=list)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self, threshold=REPEAT_THRESHOLD):
+        """Statements run at least ``threshold`` times, with their counts."""
+        counts = Counter(self.statements)
+        return {sql: n for sql, n in counts.items() if n >= threshold}
+
+
+class QueryLog:
+    """The requests one test made, in order."""
+
+    def __init__(self):
+        self.requests = []
+
+    @property
+    def last(self):
+        return self.requests[-1]
+
+    def for_endpoint(self, endpoint):
+        return [r for r in self.requests if r.endpoint == endpoint]
+
+
+class QueryBudgetPlugin:
+    """Per-request statement counts, budgets and the session report."""
+
+    def __init__(self, budgets=None):
+        self.budgets = dict(budgets or {})
+        self.log = QueryLog()
+        self.totals = defaultdict(lambda: {"requests": 0, "queries": 0, "max": 0})
+        self.repeats = defaultdict(Counter)  # endpoint -> statement -> requests
+
+    # Recording
+
+    def pytest_configure(self, config):
+        config.addinivalue_line(
+            "markers",
+            "query_budget(budgets): per-endpoint statement limits for this test, "
+            'e.g. {"GET /api/auth/me": 1}',
+        )
+        event.listen(Engine, "before_cursor_execute", self._record)
+        request_started.connect(self._start, weak=False)
+
+    def pytest_unconfigure(self, config):
+        event.remove(Engine, "before_cursor_execute", self._record)
+        request_started.disconnect(self._start)
+
+    def _start(self, sender, **extra):
+        rule = request.url_rule.rule if request.url_rule else "<unmatched>"
+        queries = RequestQueries(f"{request.method} {rule}")
+        request.environ[_ENVIRON_KEY] = queries
+        self.log.requests.append(queries)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            queries = request.environ.get(_ENVIRON_KEY)
+            if queries is not None:
+                queries.statements.append(statement)
+
+    # Enforcing
+
+    @pytest.fixture
+    def queries(self):
+        """The requests this test has made so far, with their statements."""
+        return self.log
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        self.log.requests = []
+        try:
+            return (yield)
+        finally:
+            self._tally(self.log.requests)
+            self.log.requests = []
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtest_call(self, item):
+        result = yield
+        budgets = dict(self.budgets)
+        for marker in reversed(list(item.iter_markers("query_budget"))):
+            budgets.update(*marker.args, **marker.kwargs)
+        problems = [
+            problem
+            for queries in self.log.requests
+            for problem in _check(queries, budgets.get(queries.endpoint))
+        ]
+        if problems:
+            pytest.fail("\n\n".join(problems), pytrace=False)
+        return result
+
+    def _tally(self, requests):
+        for queries in requests:
+            totals = self.totals[queries.endpoint]
+            totals["requests"] += 1
+            totals["queries"] += queries.count
+            totals["max"] = max(totals["max"], queries.count)
+            for statement in queries.repeated():
+                self.repeats[queries.endpoint][statement] += 1
+
+    # Reporting
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.totals:
+            return
+        write = terminalreporter.write_line
+        terminalreporter.section("SQL statements per request")
+        width = max(len(endpoint) for endpoint in self.totals)
+        write(f"{'endpoint':<{width}}  requests   mean   max  budget  repeats")
+        for endpoint, totals in sorted(self.totals.items()):
+            mean = totals["queries"] / totals["requests"]
+            budget = self.budgets.get(endpoint, "")
+            repeats = len(self.repeats.get(endpoint, ()))
+            row = (
+                f"{endpoint:<{width}}  {totals['requests']:>8}  {mean:5.1f}"
+                f"  {totals['max']:>4}  {budget!s:>6}  {repeats or '':>7}"
+            )
+            write(row.rstrip())
+        for endpoint, statements in sorted(self.repeats.items()):
+            write("")
+            write(f"Likely N+1 in {endpoint}:")
+            for statement in statements:
+                write(f"  {_one_line(statement)}")
+
+
+def _check(queries, budget):
+    if budget is None:
+        return []
+    problems = []
+    if queries.count > budget:
+        listing = "\n".join(
+            f"  {n}. {_one_line(sql)}" for n, sql in enumerate(queries.statements, 1)
+        )
+        problems.append(
+            f"{queries.endpoint} ran {queries.count} statements "
+            f"(budget {budget}):\n{listing}"
+        )
+    for sql, n in queries.repeated().items():
+        problems.append(
+            f"{queries.endpoint} ran the same statement {n} times "
+            f"(likely N+1):\n  {_one_line(sql)}"
+        )
+    return problems
+
+
+def _one_line(sql):
+    return " ".join(sql.split())
@@ -0,0 +1,142 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+
+from backend import create_app
+from backend.config import TestingConfig
+from backend.extensions import db
+from backend.models.billing import (
+    STARTING_BALANCE,
+    InsufficientBalanceError,
+    Transaction,
+    TransactionStatus,
+    TransactionType,
+    UserBalance,
+)
+from backend.models.user import User
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    """App on a file database so worker threads get their own connections."""
+
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'app.db'}"
+        SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 30}}
+
+    app = create_app(FileConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, email="stress@example.com"))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.drop_all()
+        db.engine.dispose()
+
+
+def test_concurrent_balance_changes_lose_no_updates(file_app):
+    """Parallel credits and debits, starting with no balance row, all land."""
+    workers, per_worker = 16, 25
+
+    def work(i):
+        with file_app.app_context():
+            for _ in range(per_worker):
+                if i % 2:
+                    UserBalance.record(
+                        1, "1.25", TransactionType.PURCHASE, application="stress"
+                    )
+                else:
+                    # Small enough that the debits fit in the starting
+                    # balance even if every one runs before any credit
+                    UserBalance.record(
+                        1, "0.02", TransactionType.USAGE, application="stress"
+                    )
+                db.session.commit()
+            db.session.remove()
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(work, range(workers)))
+
+    with file_app.app_context():
+        credits = (workers // 2) * per_worker * Decimal("1.25")
+        debits = (workers // 2) * per_worker * Decimal("0.02")
+        balance = UserBalance.query.filter_by(user_id=1).one()
+        assert balance.balance == STARTING_BALANCE + credits - debits
+        assert Transaction.query.count() == workers * per_worker
+
+
+def test_debit_never_overdraws(file_app):
+    """Racing debits larger than the balance allow exactly as many as fit."""
+
+    def spend(_):
+        with file_app.app_context():
+            try:
+                UserBalance.record(1, "1.00", TransactionType.USAGE, application="x")
+                db.session.commit()
+                return True
+            except InsufficientBalanceError:
+                db.session.rollback()
+                return False
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(spend, range(32)))
+
+    with file_app.app_context():
+        assert sum(results) == 5
+        assert UserBalance.query.filter_by(user_id=1).one().balance == 0
+        assert Transaction.query.count() == 5
+
+
+def test_concurrent_debits_beyond_the_balance_are_rejected(file_app):
+    """Debits racing credits never take the balance below zero."""
+    workers, per_worker = 16, 10
+
+    def work(i):
+        accepted = 0
+        with file_app.app_context():
+            for _ in range(per_worker):
+                try:
+                    if i % 2:
+                        UserBalance.record(
+                            1, "1.00", TransactionType.PURCHASE, application="x"
+                        )
+                    else:
+                        UserBalance.record(
+                            1, "3.00", TransactionType.USAGE, application="x"
+                        )
+                        accepted += 1
+                    db.session.commit()
+                except InsufficientBalanceError:
+                    db.session.rollback()
+            db.session.remove()
+        return accepted
+
+    with ThreadPoolExecutor(workers) as pool:
+        accepted = sum(pool.map(work, range(workers)))
+
+    with file_app.app_context():
+        credits = (workers // 2) * per_worker * Decimal("1.00")
+        balance = UserBalance.query.filter_by(user_id=1).one().balance
+        # More was asked for than could ever be available
+        assert accepted < (workers // 2) * per_worker
+        assert balance == STARTING_BALANCE + credits - accepted * Decimal("3.00")
+        assert balance >= 0
+        assert Transaction.query.count() == (workers // 2) * per_worker + accepted
+
+
+def test_failed_entries_leave_balance_untouched(app):
+    db.session.add(User(id=2, email="failed@example.com"))
+    db.session.commit()
+
+    transaction = UserBalance.record(
+        2, "20", TransactionType.PURCHASE, status=TransactionStatus.FAILED,
+        application="platform",
+    )
+    db.session.commit()
+
+    assert transaction.balance.balance == STARTING_BALANCE
+    assert transaction.status == TransactionStatus.FAILED
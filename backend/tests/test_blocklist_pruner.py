@@ -0,0 +1,84 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from backend.extensions import db
+from backend.models.user import TokenBlocklist
+from backend.src.blocklist_pruner import prune_expired_tokens
+
+
+def _add_rows(count, expires_in, created_ago=timedelta(0)):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for i in range(count):
+        db.session.add(
+            TokenBlocklist(
+                jti=f"jti-{expires_in}-{created_ago}-{i}",
+                created_at=now - created_ago,
+                expires_at=None if expires_in is None else now + expires_in,
+            )
+        )
+    db.session.commit()
+
+
+def test_prune_removes_only_expired_rows(app):
+    _add_rows(7, expires_in=timedelta(minutes=-1))
+    _add_rows(3, expires_in=timedelta(minutes=10))
+    _add_rows(2, expires_in=None, created_ago=timedelta(days=60))  # legacy, stale
+    _add_rows(1, expires_in=None)  # legacy, may still cover a live token
+
+    report = prune_expired_tokens(batch_size=3)
+
+    assert report["pruned"] == 9
+    assert report["batches"] == 3
+    assert report["rows"] == 4
+    assert report["prunable"] == 0
+    assert TokenBlocklist.query.count() == 4
+
+
+def test_prune_respects_max_batches(app):
+    _add_rows(10, expires_in=timedelta(minutes=-1))
+
+    report = prune_expired_tokens(batch_size=4, max_batches=1)
+
+    assert report["pruned"] == 4
+    assert report["prunable"] == 6
+
+
+def test_prune_cli_command(app):
+    _add_rows(2, expires_in=timedelta(minutes=-1))
+
+    result = app.test_cli_runner().invoke(args=["blocklist", "prune"])
+
+    assert result.exit_code == 0
+    assert json.loads(result.output)["pruned"] == 2
+
+
+def test_prune_accepts_other_jwt_setting_types(app):
+    """Leeway as a timedelta and non-expiring refresh tokens are both valid."""
+    app.config["JWT_DECODE_LEEWAY"] = timedelta(seconds=30)
+    app.config["JWT_REFRESH_TOKEN_EXPIRES"] = False
+    _add_rows(2, expires_in=timedelta(minutes=-1))
+    _add_rows(1, expires_in=None, created_ago=timedelta(days=60))
+
+    report = prune_expired_tokens()
+
+    # Legacy rows may cover a refresh token that never expires
+    assert report["pruned"] == 2
+    assert report["rows"] == 1
+
+
+def test_background_pruner_only_starts_when_serving(app, monkeypatch):
+    started = []
+    monkeypatch.setattr(
+        "backend.src.blocklist_pruner.start_pruner",
+        lambda app, interval: started.append(interval),
+    )
+    from backend.src.blocklist_pruner import init_pruner
+
+    app.config["BLOCKLIST_PRUNE_INTERVAL"] = 60
+    init_pruner(app)
+    assert started == []  # building the app (e.g. for a CLI command) is not enough
+
+    client = app.test_client()
+    client.get("/api/")
+    client.get("/api/")
+    assert started == [60]
@@ -0,0 +1,79 @@
+from sqlalchemy import text
+
+from backend import create_app
+from backend.config import TestingConfig
+from backend.extensions import db
+from backend.src.db_engine import engine_options
+
+POSTGRES = "postgresql://app@db/app"
+
+
+def test_pool_sized_from_threads():
+    config = {"WSGI_THREADS": 8, "WEB_CONCURRENCY": 4, "DB_POOL_EXTRA": 2}
+
+    options = engine_options(config, POSTGRES)
+
+    assert options["pool_size"] == 10
+    assert options["max_overflow"] == 10
+    assert options["pool_pre_ping"] is True
+    assert options["pool_recycle"] == 1800
+
+
+def test_pool_capped_by_server_connection_limit():
+    config = {"WSGI_THREADS": 8, "WEB_CONCURRENCY": 4, "DB_MAX_CONNECTIONS": 48}
+
+    options = engine_options(config, POSTGRES)
+
+    # 12 connections per worker: the pool, plus 2 overflow
+    assert (options["pool_size"], options["max_overflow"]) == (10, 2)
+
+
+def test_in_memory_sqlite_keeps_flask_sqlalchemy_defaults():
+    assert engine_options({}, "sqlite:///:memory:") == {}
+
+
+def _file_app(tmp_path, **settings):
+    uri = "sqlite:///" + str(tmp_path / "app.db")
+    config = type(
+        "FileConfig", (TestingConfig,), {"SQLALCHEMY_DATABASE_URI": uri, **settings}
+    )
+    return create_app(config)
+
+
+def test_sqlite_file_connections_get_pragmas(tmp_path):
+    app = _file_app(tmp_path)
+
+    with app.app_context():
+        pragmas = {
+            name: db.session.execute(text(f"PRAGMA {name}")).scalar()
+            for name in ("journal_mode", "synchronous", "busy_timeout", "mmap_size")
+        }
+
+    assert pragmas == {
+        "journal_mode": "wal",
+        "synchronous": 1,  # NORMAL
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+    }
+
+
+def test_explicit_engine_options_win(tmp_path):
+    app = _file_app(tmp_path, SQLALCHEMY_ENGINE_OPTIONS={"pool_size": 3})
+
+    assert app.config["SQLALCHEMY_ENGINE_OPTIONS"]["pool_size"] == 3
+    assert app.config["SQLALCHEMY_ENGINE_OPTIONS"]["max_overflow"] == 3
+
+
+def test_pool_stats_endpoint(tmp_path):
+    app = _file_app(tmp_path, WSGI_THREADS=4)
+    with app.app_context():
+        db.session.execute(text("SELECT 1"))
+        db.session.remove()
+
+    stats = app.test_client().get("/health/db").get_json()["default"]
+
+    assert stats["pool"] == "QueuePool"
+    assert stats["size"] == 6
+    assert stats["checked_out"] == 0
+    assert stats["checkouts"] >= 1
+    assert stats["connects"] >= 1
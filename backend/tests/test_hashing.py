@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+from flask import Flask
+
+from backend import create_app
+from backend.config import TestingConfig
+from backend.extensions import db
+from backend.models.user import User
+from backend.src import hashing
+from backend.src.hashing import HashingBusyError, HostSlots, PasswordHasher
+
+
+def _hasher_app(tmp_path, **config):
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config.update(config)
+    return app
+
+
+def test_process_pool_round_trip(tmp_path):
+    hasher = PasswordHasher(
+        _hasher_app(tmp_path, PASSWORD_HASH_WORKERS=1, WSGI_THREADS=4)
+    )
+    try:
+        password_hash = hasher.hash("secret")
+        assert hasher.verify("secret", password_hash)
+        assert not hasher.verify("wrong", password_hash)
+
+        metrics = hasher.metrics()
+        assert metrics["completed"] == 3
+        assert metrics["in_flight"] == 0
+        assert metrics["latency_ms"]["max"] > 0
+    finally:
+        hasher.shutdown()
+
+
+def test_host_slots_are_shared_between_processes(tmp_path):
+    """A slot held by another process is not handed out again."""
+    import multiprocessing
+
+    path = str(tmp_path / "slots.lock")
+    holder = HostSlots(1, path)
+    assert holder.try_acquire() == 0
+
+    ctx = multiprocessing.get_context("fork")
+    result = ctx.Queue()
+    child = ctx.Process(
+        target=lambda: result.put(HostSlots(1, path).try_acquire())
+    )
+    child.start()
+    child.join()
+    assert result.get() is None
+
+    holder.release(0)
+    holder.close()
+
+
+def test_worker_keeps_a_thread_free(tmp_path, monkeypatch):
+    hasher = PasswordHasher(
+        _hasher_app(
+            tmp_path,
+            PASSWORD_HASH_WORKERS=0,
+            PASSWORD_HASH_QUEUE_SIZE=8,
+            WSGI_THREADS=2,
+        )
+    )
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_hash(password):
+        entered.set()
+        release.wait(5)
+        return "hash"
+
+    monkeypatch.setattr(hashing, "_hash", slow_hash)
+    thread = threading.Thread(target=hasher.hash, args=("other",))
+    thread.start()
+    entered.wait(5)
+    try:
+        # Only WSGI_THREADS - 1 = 1 hashing request may be in flight
+        with pytest.raises(HashingBusyError):
+            hasher.verify("secret", "hash")
+    finally:
+        release.set()
+        thread.join()
+    assert hasher.metrics()["rejected"] == 1
+    hasher.shutdown()
+
+
+def test_login_rejected_when_host_queue_is_full(monkeypatch):
+    class BusyConfig(TestingConfig):
+        PASSWORD_HASH_QUEUE_SIZE = 0  # one admitted job per host
+        WSGI_THREADS = 8
+
+    app = create_app(BusyConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(email="busy@example.com")
+        user.set_password("password")
+        db.session.add(user)
+        db.session.commit()
+
+        entered, release = threading.Event(), threading.Event()
+
+        def slow_hash(password):
+            entered.set()
+            release.wait(5)
+            return "hash"
+
+        monkeypatch.setattr(hashing, "_hash", slow_hash)
+        hasher = app.extensions["password_hasher"]
+        thread = threading.Thread(target=hasher.hash, args=("other",))
+        thread.start()
+        entered.wait(5)
+        try:
+            response = app.test_client().post(
+                "/api/auth/login", json={"email": user.email, "password": "password"}
+            )
+        finally:
+            release.set()
+            thread.join()
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        metrics = app.test_client().get("/health/hashing").get_json()
+        assert metrics["rejected"] >= 1
+        db.drop_all()
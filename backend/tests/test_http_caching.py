@@ -0,0 +1,102 @@
+import gzip
+import json
+
+import pytest
+
+from backend.benchmarks import count_queries
+from backend.extensions import db
+from backend.models.billing import TransactionType, UserBalance
+from backend.tests.conftest import csrf_headers
+
+
+def _with_balance(user):
+    UserBalance.get_or_create(user.id)
+    db.session.commit()
+
+
+def _revalidate(client, url, response, **headers):
+    return client.get(url, headers={"If-None-Match": response.headers["ETag"], **headers})
+
+
+def test_unchanged_balance_is_not_modified(auth_client, user):
+    _with_balance(user)
+    first = auth_client.get("/api/billing/balance")
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    with count_queries(db.engine, "user_balance") as queries:
+        again = _revalidate(auth_client, "/api/billing/balance", first)
+
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert queries["count"] == 1  # Only the version lookup
+
+
+def test_balance_change_changes_the_etag(auth_client, user):
+    _with_balance(user)
+    first = auth_client.get("/api/billing/balance")
+    auth_client.post(
+        "/api/billing/balance/add", json={"amount": 3}, headers=csrf_headers(auth_client)
+    )
+
+    again = _revalidate(auth_client, "/api/billing/balance", first)
+
+    assert again.status_code == 200
+    assert again.get_json()["balance"] == 8.0
+
+
+def test_transactions_revalidate_without_loading_rows(auth_client, user):
+    UserBalance.record(user.id, 1, TransactionType.PURCHASE, application="app")
+    db.session.commit()
+    url = "/api/billing/transactions?limit=10"
+    first = auth_client.get(url)
+
+    with count_queries(db.engine, '"transaction"') as queries:
+        again = _revalidate(auth_client, url, first)
+    assert again.status_code == 304
+    assert queries["count"] == 1
+
+    # Another page is another representation
+    other = auth_client.get(
+        "/api/billing/transactions?limit=5",
+        headers={"If-None-Match": first.headers["ETag"]},
+    )
+    assert other.status_code == 200
+
+    UserBalance.record(user.id, 1, TransactionType.PURCHASE, application="app")
+    db.session.commit()
+    assert _revalidate(auth_client, url, first).status_code == 200
+
+
+def test_me_is_not_modified(auth_client):
+    for url in ("/api/auth/me", "/api/auth/me?fresh=1"):
+        first = auth_client.get(url)
+        assert _revalidate(auth_client, url, first).status_code == 304
+
+
+def test_large_responses_are_gzipped(auth_client, user):
+    for _ in range(30):
+        UserBalance.record(user.id, 1, TransactionType.PURCHASE, application="app")
+    db.session.commit()
+    url = "/api/billing/transactions?limit=30"
+
+    plain = auth_client.get(url)
+    zipped = auth_client.get(url, headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in zipped.headers["Vary"]
+    assert len(zipped.data) < len(plain.data) / 3
+    assert json.loads(gzip.decompress(zipped.data)) == plain.get_json()
+    assert zipped.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+
+    again = _revalidate(auth_client, url, zipped, **{"Accept-Encoding": "gzip"})
+    assert again.status_code == 304
+
+
+@pytest.mark.query_budget({"GET /api/billing/balance": 5})  # Creates the row
+def test_small_responses_are_not_compressed(auth_client):
+    response = auth_client.get("/api/billing/balance", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in response.headers
@@ -0,0 +1,138 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pytest
+
+from backend import create_app
+from backend.config import TestingConfig
+from backend.extensions import db
+from backend.models.billing import IdempotencyRecord, Transaction, UserBalance
+from backend.models.user import User
+from backend.src import idempotency
+from backend.tests.conftest import csrf_headers
+
+
+def _add_funds(client, key, amount=10):
+    headers = {**csrf_headers(client), "Idempotency-Key": key}
+    return client.post("/api/billing/balance/add", json={"amount": amount}, headers=headers)
+
+
+def test_completed_request_is_replayed(auth_client):
+    first = _add_funds(auth_client, "key-1")
+    second = _add_funds(auth_client, "key-1")
+
+    assert first.status_code == second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.get_json() == first.get_json()
+    assert Transaction.query.count() == 1
+
+    _add_funds(auth_client, "key-2")
+    assert Transaction.query.count() == 2
+
+
+def test_key_reused_for_another_request_is_rejected(auth_client):
+    _add_funds(auth_client, "key-1", amount=10)
+    response = _add_funds(auth_client, "key-1", amount=20)
+    assert response.status_code == 422
+    assert Transaction.query.count() == 1
+
+
+def test_expired_key_runs_again_and_can_be_purged(app, auth_client):
+    _add_funds(auth_client, "key-1")
+    record = IdempotencyRecord.query.one()
+    record.expires_at -= timedelta(days=2)
+    db.session.commit()
+
+    assert "Idempotent-Replayed" not in _add_funds(auth_client, "key-1").headers
+    assert Transaction.query.count() == 2
+
+    IdempotencyRecord.query.one().expires_at -= timedelta(days=2)
+    db.session.commit()
+    assert IdempotencyRecord.purge_expired(idempotency._utcnow()) == 1
+
+
+def test_failure_storing_the_response_undoes_the_writes(auth_client, user, monkeypatch):
+    find = IdempotencyRecord.find
+    calls = []
+
+    # The database fails after the view ran, before its response is stored
+    def failing_find(user_id, key):
+        calls.append(key)
+        if len(calls) == 1:
+            raise RuntimeError("connection lost")
+        return find(user_id, key)
+
+    monkeypatch.setattr(idempotency.IdempotencyRecord, "find", failing_find)
+    with pytest.raises(RuntimeError):
+        _add_funds(auth_client, "key-1")
+
+    assert Transaction.query.count() == 0
+    assert IdempotencyRecord.query.count() == 0  # Released for the retry
+
+    retry = _add_funds(auth_client, "key-1")
+    assert retry.status_code == 200
+    assert _add_funds(auth_client, "key-1").headers["Idempotent-Replayed"] == "true"
+    assert Transaction.query.count() == 1
+    assert UserBalance.query.filter_by(user_id=user.id).one().balance == 15
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    """App on a file database so concurrent requests get their own connections."""
+
+    class FileConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'app.db'}"
+        SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 30}}
+        RATELIMIT_ENABLED = False
+
+    app = create_app(FileConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(email="test@example.com", name="Test User")
+        user.set_password("password")
+        db.session.add(user)
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.drop_all()
+        db.engine.dispose()
+
+
+def test_in_flight_duplicates_wait_for_the_first_request(file_app, monkeypatch):
+    release = threading.Event()
+    record = idempotency.IdempotencyRecord.find
+
+    # Hold the first request between running the view and storing its response
+    def slow_find(user_id, key):
+        if threading.current_thread().name.endswith("_0"):
+            release.wait(5)
+        return record(user_id, key)
+
+    clients = []
+    for _ in range(4):
+        client = file_app.test_client()
+        client.post(
+            "/api/auth/login", json={"email": "test@example.com", "password": "password"}
+        )
+        clients.append(client)
+
+    def request(i):
+        client = clients[i]
+        if i:
+            time.sleep(0.2)  # Arrive while the first is still running
+        response = _add_funds(client, "same-key")
+        return response.status_code, response.get_json()
+
+    monkeypatch.setattr(idempotency.IdempotencyRecord, "find", slow_find)
+    with ThreadPoolExecutor(4, thread_name_prefix="req") as pool:
+        futures = [pool.submit(request, i) for i in range(4)]
+        time.sleep(0.5)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert {status for status, _ in results} == {200}
+    assert all(body == results[0][1] for _, body in results)
+    with file_app.app_context():
+        assert Transaction.query.count() == 1
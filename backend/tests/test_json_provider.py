@@ -0,0 +1,75 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from backend import create_app
+from backend.config import TestingConfig
+from backend.extensions import db
+from backend.models.billing import TransactionStatus, TransactionType, UserBalance
+from backend.src.json_provider import FastJSONProvider
+
+PAYLOAD = {
+    "amount": Decimal("12.50"),
+    "created_at": datetime(2026, 10, 17, 9, 30, 5, 123456),
+    "day": date(2026, 10, 17),
+    "type": TransactionType.PURCHASE,
+    "status": TransactionStatus.COMPLETED,
+    "nested": [{"n": 1, "none": None}],
+}
+
+EXPECTED = {
+    "amount": 12.5,
+    "created_at": "2026-10-17T09:30:05.123456",
+    "day": "2026-10-17",
+    "type": "purchase",
+    "status": "completed",
+    "nested": [{"n": 1, "none": None}],
+}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_providers_encode_api_types_alike(app, use_orjson):
+    provider = FastJSONProvider(app, use_orjson=use_orjson)
+
+    assert json.loads(provider.dumps(PAYLOAD)) == EXPECTED
+    assert json.loads(provider.response(PAYLOAD).get_data()) == EXPECTED
+
+
+def test_orjson_falls_back_for_what_it_cannot_encode(app):
+    provider = FastJSONProvider(app)
+
+    assert provider.dumps({"big": 2**70}) == '{"big": 1180591620717411303424}'
+    with pytest.raises(TypeError):
+        provider.dumps({"obj": object()})
+
+
+def test_transactions_are_identical_with_either_provider(auth_client, user):
+    UserBalance.record(
+        user.id,
+        "2.25",
+        TransactionType.USAGE,
+        application="speech",
+        operation="transcribe",
+        transaction_metadata={"seconds": 42},
+    )
+    db.session.commit()
+    fast = auth_client.get("/api/billing/transactions").get_json()
+
+    auth_client.application.json = FastJSONProvider(auth_client.application, False)
+    plain = auth_client.get("/api/billing/transactions").get_json()
+
+    assert fast == plain
+    (transaction,) = fast["transactions"]
+    assert transaction["amount"] == 2.25
+    assert transaction["transaction_type"] == "usage"
+    assert transaction["status"] == "completed"
+    assert transaction["transaction_metadata"] == {"seconds": 42}
+    assert datetime.fromisoformat(transaction["created_at"])
+
+
+def test_config_selects_the_fallback():
+    app = create_app(type("PlainJSON", (TestingConfig,), {"JSON_USE_ORJSON": False}))
+
+    assert app.json.use_orjson is False
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.benchmarks.fake_jwks import FakeJWKS
+from backend.extensions import apple_jwks
+from backend.src.auth import validate_apple_token
+from backend.src.jwks_cache import JWKSCache, JWKSError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _eventually(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def idp():
+    with FakeJWKS() as idp:
+        yield idp
+
+
+def _cache(idp, path=None, clock=None, **settings):
+    return JWKSCache(
+        "test", clock=clock or time.time, url=idp.jwks_url, path=path, **settings
+    )
+
+
+def test_concurrent_cold_requests_fetch_once(idp):
+    idp.latency = 0.2
+    cache = _cache(idp)
+    with ThreadPoolExecutor(20) as pool:
+        keys = list(pool.map(lambda _: cache.get_key(idp.kid), range(20)))
+    assert all(key is not None for key in keys)
+    assert idp.fetches == 1
+
+
+def test_unknown_kid_refetches_once_per_interval(idp):
+    clock = Clock()
+    cache = _cache(idp, clock=clock, min_refetch_interval=30)
+    cache.get_key(idp.kid)
+
+    idp.rotate()
+    clock.now += 31
+    assert cache.get_key(idp.kid) is not None  # New key picked up at once
+    assert idp.fetches == 2
+
+    # Made-up key ids do not each trigger a fetch
+    for i in range(5):
+        assert cache.get_key(f"bogus-{i}") is None
+    assert idp.fetches == 2
+
+
+def test_refreshes_ahead_of_expiry_in_the_background(idp):
+    clock = Clock()
+    cache = _cache(idp, clock=clock, ttl=100, refresh_ahead=10)
+    cache.get_key(idp.kid)
+
+    idp.latency = 0.3
+    clock.now += 95
+    started = time.perf_counter()
+    assert cache.get_key(idp.kid) is not None
+    assert time.perf_counter() - started < 0.2  # Served without waiting
+
+    assert _eventually(lambda: cache.info()["fetched_at"] == clock.now)
+    assert idp.fetches == 2
+
+
+def test_serves_stale_keys_while_the_provider_is_down(idp):
+    clock = Clock()
+    cache = _cache(idp, clock=clock, ttl=100, max_stale=1000)
+    cache.get_key(idp.kid)
+
+    idp.failing = True
+    clock.now += 200
+    assert cache.get_key(idp.kid) is not None  # Stale, revalidating
+    assert _eventually(lambda: cache.info()["failures"] == 1)
+    assert cache.get_key(idp.kid) is not None  # Retry is rate-limited
+    assert idp.fetches == 2
+
+    clock.now += 2000
+    with pytest.raises(JWKSError):
+        cache.get_key(idp.kid)
+
+
+def test_new_workers_start_warm_from_disk(idp, tmp_path):
+    path = str(tmp_path / "jwks.json")
+    _cache(idp, path=path).get_key(idp.kid)
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+    fresh = _cache(idp, path=path)
+    assert fresh.get_key(idp.kid) is not None
+    assert idp.fetches == 1
+    assert fresh.info()["disk_loads"] == 1
+
+    # Keys from a file others can write are never trusted
+    os.chmod(path, 0o666)
+    with pytest.raises(RuntimeError):
+        _cache(idp, path=path).get_key(idp.kid)
+
+
+def test_processes_share_one_fetch(idp, tmp_path):
+    path = str(tmp_path / "jwks.json")
+    idp.latency = 0.2
+    # Separate instances stand in for separate workers
+    caches = [_cache(idp, path=path) for _ in range(4)]
+    threads = [threading.Thread(target=c.get_key, args=(idp.kid,)) for c in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert idp.fetches == 1
+
+
+def test_validate_apple_token(app, idp):
+    apple_jwks.configure(url=idp.jwks_url)
+    app.debug = False
+    token = idp.sign({"iss": "https://appleid.apple.com", "aud": "com.example", "sub": "a1"})
+
+    assert validate_apple_token(token, "com.example")["sub"] == "a1"
+    with pytest.raises(ValueError):
+        validate_apple_token(token, "com.other")
@@ -0,0 +1,57 @@
+import pytest
+
+from backend.benchmarks import count_queries
+from backend.extensions import db
+from backend.tests.conftest import csrf_headers
+
+
+def test_me_is_served_from_token_claims(auth_client, user):
+    """/auth/me answers from the access token without loading the user."""
+    auth_client.get("/api/auth/me")  # initial revocation cache sync
+
+    with count_queries(db.engine) as queries:
+        response = auth_client.get("/api/auth/me")
+    assert response.status_code == 200
+    assert response.get_json()["user"] == user.to_dict()
+    # At most the revocation cache's catch-up probe; no user load
+    assert all("token_blocklist" in q for q in queries["statements"])
+
+
+@pytest.mark.query_budget({"GET /api/auth/me": 3})  # ?fresh=1 also loads the row
+def test_me_fresh_reloads_user(auth_client, user):
+    """?fresh=1 reads the row, picking up changes made after login."""
+    user.name = "Renamed"
+    db.session.commit()
+
+    assert auth_client.get("/api/auth/me").get_json()["user"]["name"] == "Test User"
+    response = auth_client.get("/api/auth/me?fresh=1")
+    assert response.get_json()["user"]["name"] == "Renamed"
+
+
+def test_refresh_updates_claims(auth_client, user):
+    """Refreshed access tokens carry the current profile."""
+    user.name = "Renamed"
+    db.session.commit()
+
+    response = auth_client.post(
+        "/api/auth/refresh", headers=csrf_headers(auth_client, refresh=True)
+    )
+    assert response.status_code == 200
+    assert auth_client.get("/api/auth/me").get_json()["user"]["name"] == "Renamed"
+
+
+@pytest.mark.query_budget({"GET /api/auth/me": 3})
+def test_deleted_user_keeps_claims_until_the_access_token_expires(auth_client, user):
+    """Only ?fresh=1 and the refresh see that the row is gone."""
+    claims = user.to_dict()
+    db.session.delete(user)
+    db.session.commit()
+
+    response = auth_client.get("/api/auth/me")
+    assert response.status_code == 200
+    assert response.get_json()["user"] == claims
+    assert auth_client.get("/api/auth/me?fresh=1").status_code == 404
+    refreshed = auth_client.post(
+        "/api/auth/refresh", headers=csrf_headers(auth_client, refresh=True)
+    )
+    assert refreshed.status_code == 404
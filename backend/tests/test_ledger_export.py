@@ -0,0 +1,92 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+from backend.cli import export_ledger
+from backend.extensions import db
+from backend.models.billing import Transaction, TransactionType, UserBalance
+from backend.models.user import User
+
+
+def _seed(user_id, count, application="speech"):
+    for _ in range(count):
+        UserBalance.record(
+            user_id,
+            "1.25",
+            TransactionType.PURCHASE,
+            application=application,
+            transaction_metadata={"note": "a,b"},
+        )
+    db.session.commit()
+
+
+def test_ndjson_export_streams_only_the_users_rows(auth_client, user):
+    other = User(email="other@example.com", name="Other")
+    db.session.add(other)
+    db.session.commit()
+    _seed(user.id, 3)
+    _seed(other.id, 2)
+
+    response = auth_client.get("/api/billing/transactions/export")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == "application/x-ndjson"
+
+    records = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [r["user_id"] for r in records] == [user.id] * 3
+    assert records[0]["amount"] == "1.25"
+    assert records[0]["transaction_metadata"] == {"note": "a,b"}
+
+
+def test_csv_export_with_filters_and_gzip(auth_client, user):
+    _seed(user.id, 2, application="speech")
+    _seed(user.id, 3, application="autodraft")
+
+    response = auth_client.get(
+        "/api/billing/transactions/export?format=csv&application=autodraft&gzip=1"
+    )
+    assert response.headers["Content-Encoding"] == "gzip"
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.data).decode())))
+    assert [r["application"] for r in rows] == ["autodraft"] * 3
+    assert json.loads(rows[0]["transaction_metadata"]) == {"note": "a,b"}
+
+
+def test_date_range_filter(auth_client, user):
+    _seed(user.id, 2)
+    created_at = Transaction.query.first().created_at
+    later = (created_at + timedelta(days=1)).isoformat()
+
+    # since is inclusive even though SQLite stores whole seconds
+    response = auth_client.get(
+        f"/api/billing/transactions/export?since={created_at.isoformat()}"
+    )
+    assert len(response.data.decode().splitlines()) == 2
+    response = auth_client.get(f"/api/billing/transactions/export?since={later}")
+    assert response.data == b""
+    response = auth_client.get(f"/api/billing/transactions/export?until={later}")
+    assert len(response.data.decode().splitlines()) == 2
+
+    response = auth_client.get("/api/billing/transactions/export?since=yesterday")
+    assert response.status_code == 400
+
+
+def test_cli_exports_every_user(app, user, tmp_path):
+    other = User(email="other@example.com", name="Other")
+    db.session.add(other)
+    db.session.commit()
+    _seed(user.id, 2)
+    _seed(other.id, 2)
+
+    output = tmp_path / "ledger.csv.gz"
+    result = app.test_cli_runner().invoke(
+        export_ledger,
+        ["--format", "csv", "--gzip", "--chunk-size", "3", "-o", str(output)],
+    )
+    assert result.exit_code == 0, result.output
+
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(output.read_bytes()).decode())))
+    assert len(rows) == 4
+    assert {r["user_id"] for r in rows} == {str(user.id), str(other.id)}
+    assert datetime.fromisoformat(rows[0]["created_at"])
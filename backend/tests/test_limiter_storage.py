@@ -0,0 +1,105 @@
+import multiprocessing
+
+import pytest
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter, SlidingWindowCounterRateLimiter
+
+from backend import create_app
+from backend.config import TestingConfig
+from backend.extensions import db, limiter
+from backend.src.limiter_storage import HostStorage
+
+LIMIT = parse("10/minute")
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return storage_from_string(f"hostfile://{tmp_path}/limits.bin?sets=64")
+
+
+def _hit_all(storage, queue):
+    limiter = SlidingWindowCounterRateLimiter(storage)
+    queue.put(sum(limiter.hit(LIMIT, "login", "1.2.3.4") for _ in range(10)))
+
+
+def test_workers_share_one_limit(storage):
+    storage.get("warm")  # Opened before the fork, as under gunicorn --preload
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    workers = [
+        context.Process(target=_hit_all, args=(storage, queue)) for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    admitted = sum(queue.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    assert admitted == 10
+
+
+@pytest.mark.parametrize(
+    "strategy", [FixedWindowRateLimiter, SlidingWindowCounterRateLimiter]
+)
+def test_counts_survive_a_restart(storage, tmp_path, strategy):
+    limiter = strategy(storage)
+    for _ in range(10):
+        assert limiter.hit(LIMIT, "k")
+    assert not limiter.hit(LIMIT, "k")
+
+    restarted = strategy(HostStorage(f"hostfile://{tmp_path}/limits.bin?sets=64"))
+    assert not restarted.hit(LIMIT, "k")
+    assert restarted.get_window_stats(LIMIT, "k").remaining == 0
+
+    restarted.clear(LIMIT, "k")
+    assert limiter.hit(LIMIT, "k")
+
+
+def test_full_sets_evict_the_oldest_counter(tmp_path):
+    storage = HostStorage(f"hostfile://{tmp_path}/limits.bin?sets=1&ways=2")
+    storage.incr("a", 10)
+    storage.incr("b", 20)
+    storage.incr("c", 30)  # Replaces "a", the closest to expiry
+    assert (storage.get("a"), storage.get("b"), storage.get("c")) == (0, 1, 1)
+
+
+def _post_in_new_worker(config, queue):
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+    response = app.test_client().post(
+        "/api/auth/forgot-password", json={"email": "nobody@example.com"}
+    )
+    queue.put(response.status_code)
+
+
+def test_app_workers_share_limits(tmp_path):
+    config = type(
+        "SharedLimits",
+        (TestingConfig,),
+        {
+            "RATELIMIT_STORAGE_PATH": str(tmp_path / "limits.bin"),
+            # The limiter is a module-level singleton and stays disabled if an
+            # earlier app (e.g. a benchmark app) disabled it
+            "RATELIMIT_ENABLED": True,
+        },
+    )
+    app = create_app(config)
+    assert isinstance(limiter.storage, HostStorage)
+    with app.app_context():
+        db.create_all()
+
+    client = app.test_client()
+    for _ in range(5):  # "5 per minute"
+        response = client.post(
+            "/api/auth/forgot-password", json={"email": "nobody@example.com"}
+        )
+        assert response.status_code == 200
+
+    # A freshly started worker on the same host is already over the limit
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    worker = context.Process(target=_post_in_new_worker, args=(config, queue))
+    worker.start()
+    assert queue.get(timeout=30) == 429
+    worker.join()
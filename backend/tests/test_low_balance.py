@@ -0,0 +1,81 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from backend.extensions import db
+from backend.models.billing import UserBalance
+from backend.models.user import User
+from backend.src.low_balance import notify_low_balances
+
+
+def _users(balances, email=True):
+    ids = []
+    for balance in balances:
+        n = User.query.count()
+        user = User(email=f"low{n}@example.com" if email else None, name=f"User {n}")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(UserBalance(user_id=user.id, balance=balance))
+        ids.append(user.id)
+    db.session.commit()
+    return ids
+
+
+def _notified():
+    return db.session.scalars(
+        db.select(UserBalance.user_id).where(
+            UserBalance.low_balance_notified_at.is_not(None)
+        )
+    ).all()
+
+
+def test_warns_each_low_balance_once(mail_app, relay):
+    low = _users(["0.10", "0.50", "0.99", "0.00", "0.25"])
+    _users(["1.00", "20.00"])
+    _users(["0.10"], email=False)
+
+    report = notify_low_balances(threshold=1, chunk_size=2, rate=0, connections=2)
+    assert (report["selected"], report["sent"], report["chunks"]) == (5, 5, 3)
+    assert sorted(_notified()) == sorted(low)
+    assert len(relay.messages) == 5
+    assert relay.connections <= 2
+    assert any(b"$0.25, below $1.00" in data for _, _, data in relay.messages)
+
+    # Already warned: nothing to do until the renotify interval has passed
+    assert notify_low_balances(threshold=1, rate=0)["selected"] == 0
+    db.session.execute(
+        db.update(UserBalance).values(
+            low_balance_notified_at=datetime.now(timezone.utc).replace(tzinfo=None)
+            - timedelta(days=8)
+        )
+    )
+    db.session.commit()
+    assert notify_low_balances(threshold=1, rate=0)["sent"] == 5
+
+
+def test_failed_sends_are_retried_next_run(mail_app, relay):
+    _users(["0.10", "0.20", "0.30"])
+    relay.fail_next = 1
+
+    report = notify_low_balances(threshold=1, rate=0, connections=1)
+    assert (report["sent"], report["failed"]) == (2, 1)
+    assert notify_low_balances(threshold=1, rate=0)["sent"] == 1
+    assert len(relay.messages) == 3
+
+
+def test_send_rate_is_capped(mail_app, relay):
+    _users(["0.10"] * 6)
+    started = time.perf_counter()
+    notify_low_balances(threshold=1, rate=20, connections=3)
+    assert time.perf_counter() - started >= 5 / 20
+
+
+def test_dry_run_cli(mail_app, relay):
+    _users(["0.10", "5.00"])
+    result = mail_app.test_cli_runner().invoke(
+        args=["billing", "notify-low-balance", "--threshold", "1", "--dry-run"]
+    )
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output)["selected"] == 1
+    assert relay.messages == []
+    assert _notified() == []
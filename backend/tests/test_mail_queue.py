@@ -0,0 +1,60 @@
+import time
+
+from flask_mail import Message
+
+from backend.extensions import db, mail_queue
+from backend.models.user import User
+
+
+def _message(n=0):
+    return Message(
+        "Hello", sender="noreply@example.com", recipients=[f"u{n}@example.com"]
+    )
+
+
+def test_batches_share_one_connection(mail_app, relay):
+    for n in range(20):
+        mail_queue.enqueue(_message(n))
+    assert mail_queue.flush(timeout=10)
+
+    assert len(relay.messages) == 20
+    assert relay.connections == 1
+    assert mail_queue.info()["sent"] == 20
+    assert mail_queue.info()["depth"] == 0
+
+
+def test_temporary_failures_are_retried(mail_app, relay):
+    relay.fail_next = 2
+    mail_queue.enqueue(_message())
+    assert mail_queue.flush(timeout=10)
+
+    assert len(relay.messages) == 1
+    assert mail_queue.stats["retries"] == 2
+    assert mail_queue.stats["sent"] == 1
+
+
+def test_permanent_failures_are_not_retried(mail_app, relay):
+    relay.reject = True
+    mail_queue.enqueue(_message())
+    assert mail_queue.flush(timeout=10)
+
+    assert relay.messages == []
+    assert (mail_queue.stats["failed"], mail_queue.stats["retries"]) == (1, 0)
+
+
+def test_forgot_password_does_not_wait_for_smtp(mail_app, relay):
+    relay.latency = 0.5
+    user = User(email="reset@example.com", name="Reset")
+    db.session.add(user)
+    db.session.commit()
+    client = mail_app.test_client()
+
+    started = time.perf_counter()
+    response = client.post("/api/auth/forgot-password", json={"email": user.email})
+    assert response.status_code == 200
+    assert time.perf_counter() - started < 0.4
+
+    assert mail_queue.flush(timeout=10)
+    [(_, recipients, data)] = relay.messages
+    assert recipients == ["<reset@example.com>"]
+    assert b"Reset Your Password" in data
@@ -0,0 +1,185 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from flask_mail import Message
+from prometheus_client import REGISTRY
+from prometheus_client.parser import text_string_to_metric_families
+
+from backend import create_app
+from backend.benchmarks import count_queries
+from backend.config import TestingConfig
+from backend.extensions import db, mail_queue
+from backend.models.billing import UserBalance
+from backend.src.metrics import timed_call
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def _parse(text):
+    """Exposition text as {(name, sorted label items): value}."""
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+    }
+
+
+def _scrape(client, **headers):
+    response = client.get("/metrics", headers=headers)
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    return _parse(response.get_data(as_text=True))
+
+
+def test_requests_are_timed_by_endpoint_with_their_queries(auth_client, user):
+    UserBalance.get_or_create(user.id)
+    db.session.commit()
+    endpoint = "api.billing.get_balance"
+    labels = {"endpoint": endpoint, "method": "GET", "status": "200"}
+    before = _sample("http_request_duration_seconds_count", **labels)
+    queries_before = _sample("http_request_db_queries_sum", endpoint=endpoint)
+
+    with count_queries(db.engine) as queries:
+        auth_client.get("/api/billing/balance")
+    auth_client.get("/api/billing/nowhere")
+
+    assert _sample("http_request_duration_seconds_count", **labels) == before + 1
+    assert (
+        _sample("http_request_db_queries_sum", endpoint=endpoint)
+        == queries_before + queries["count"]
+    )
+    assert _sample("http_request_db_seconds_count", endpoint=endpoint) > 0
+    # Unrouted paths share one label instead of one series per path
+    assert _sample(
+        "http_request_duration_seconds_count",
+        endpoint="none",
+        method="GET",
+        status="404",
+    )
+
+    samples = _scrape(auth_client)
+    key = ("http_request_duration_seconds_count", tuple(sorted(labels.items())))
+    assert samples[key] == before + 1
+    assert samples[("db_queries_total", (("bind", "default"),))] > 0
+
+
+def test_external_calls_record_their_outcome():
+    def calls(outcome):
+        return _sample(
+            "external_call_duration_seconds_count",
+            service="stripe",
+            operation="op",
+            outcome=outcome,
+        )
+
+    ok, failed = calls("ok"), calls("error")
+
+    with timed_call("stripe", "op"):
+        pass
+    with pytest.raises(RuntimeError):
+        with timed_call("stripe", "op"):
+            raise RuntimeError("card declined")
+
+    assert calls("ok") == ok + 1
+    assert calls("error") == failed + 1
+
+
+def test_smtp_sends_are_timed(mail_app, relay):
+    labels = {"service": "smtp", "operation": "send", "outcome": "ok"}
+    before = _sample("external_call_duration_seconds_count", **labels)
+
+    for n in range(3):
+        mail_queue.enqueue(
+            Message(
+                "Hi", sender="noreply@example.com", recipients=[f"u{n}@example.com"]
+            )
+        )
+    assert mail_queue.flush(timeout=10)
+
+    assert _sample("external_call_duration_seconds_count", **labels) == before + 3
+
+
+def test_token_protects_the_endpoints():
+    config = type("TokenConfig", (TestingConfig,), {"METRICS_TOKEN": "s3cret"})
+    client = create_app(config).test_client()
+
+    for path in ("/metrics", "/health/db", "/health/hashing"):
+        assert client.get(path).status_code == 401
+    wrong = client.get("/metrics", headers={"Authorization": "Bearer nope"})
+    assert wrong.status_code == 401
+    _scrape(client, Authorization="Bearer s3cret")
+    health = client.get("/health/db", headers={"Authorization": "Bearer s3cret"})
+    assert health.status_code == 200
+
+
+def test_endpoints_are_hidden_when_a_required_token_is_missing():
+    config = type("ProdLike", (TestingConfig,), {"METRICS_REQUIRE_TOKEN": True})
+    client = create_app(config).test_client()
+
+    for path in ("/metrics", "/health/db", "/health/hashing"):
+        assert client.get(path).status_code == 404
+
+
+@pytest.mark.parametrize("propagate", [False, True])
+def test_unhandled_exceptions_are_counted_as_500(propagate):
+    config = type(
+        "ErrorConfig", (TestingConfig,), {"PROPAGATE_EXCEPTIONS": propagate}
+    )
+    app = create_app(config)
+
+    @app.route("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    labels = {"endpoint": "boom", "method": "GET", "status": "500"}
+    before = _sample("http_request_duration_seconds_count", **labels)
+
+    client = app.test_client()
+    if propagate:
+        with pytest.raises(RuntimeError):
+            client.get("/boom")
+    else:
+        assert client.get("/boom").status_code == 500
+
+    assert _sample("http_request_duration_seconds_count", **labels) == before + 1
+
+
+WORKER = """
+from backend import create_app
+from backend.config import TestingConfig
+from backend.src.metrics import timed_call
+
+with timed_call("apple", "jwks"):
+    pass
+create_app(TestingConfig).test_client().get("/api/")
+"""
+
+
+def test_workers_are_aggregated_in_multiprocess_mode(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    for _ in range(2):  # Two "workers", each a separate process
+        subprocess.run([sys.executable, "-c", WORKER], env=env, check=True)
+
+    scrape = """
+from backend import create_app
+from backend.config import TestingConfig
+
+print(create_app(TestingConfig).test_client().get("/metrics").get_data(as_text=True))
+"""
+    output = subprocess.run(
+        [sys.executable, "-c", scrape],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    samples = _parse(output)
+
+    jwks = (("operation", "jwks"), ("outcome", "ok"), ("service", "apple"))
+    assert samples[("external_call_duration_seconds_count", jwks)] == 2
+    api = (("endpoint", "api.index"), ("method", "GET"), ("status", "200"))
+    assert samples[("http_request_duration_seconds_count", api)] == 2
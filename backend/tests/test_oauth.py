@@ -0,0 +1,97 @@
+import threading
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from backend.benchmarks.fake_oauth import FakeGoogle
+from backend.extensions import google_jwks
+from backend.models.user import User
+from backend.src.OAuthSignIn import GoogleSignIn, OAuthSignIn
+
+PROFILE = {
+    "sub": "g-123",
+    "email": "oauth@example.com",
+    "name": "OAuth User",
+    "picture": "https://example.com/p.png",
+}
+
+
+@pytest.fixture
+def google(app):
+    with FakeGoogle() as google:
+        app.config.update(google.config())
+        google_jwks.configure(url=google.jwks_url)
+        yield google
+
+
+def _sign_in(client, google, code="abc"):
+    google.codes[code] = dict(PROFILE)
+    return client.get(f"/api/auth/callback/google?code={code}")
+
+
+def test_authorize_redirects_to_provider(client, google):
+    response = client.get("/api/auth/authorize/google")
+    assert response.status_code == 302
+    location = urlparse(response.headers["Location"])
+    assert location.path == "/authorize"
+    params = parse_qs(location.query)
+    assert params["client_id"] == [google.client_id]
+    assert params["redirect_uri"][0].endswith("/api/auth/callback/google")
+
+
+def test_unconfigured_provider(client):
+    assert client.get("/api/auth/authorize/google").status_code == 400
+    assert client.get("/api/auth/callback/google?code=x").status_code == 400
+
+
+def test_callback_verifies_id_token_locally(client, google):
+    response = _sign_in(client, google)
+    assert response.status_code == 302
+    assert response.headers["Location"].endswith("/auth/callback")
+
+    user = User.query.filter_by(email=PROFILE["email"]).one()
+    assert (user.google_id, user.name) == (PROFILE["sub"], PROFILE["name"])
+    assert ("GET", "/userinfo") not in google.calls
+
+    # Certs are cached: the next sign-in is one round trip
+    google.calls.clear()
+    _sign_in(client, google, code="def")
+    assert google.calls == [("POST", "/token")]
+
+
+def test_falls_back_to_userinfo_without_id_token(client, google):
+    google.send_id_token = False
+    _sign_in(client, google)
+    assert ("GET", "/userinfo") in google.calls
+    assert User.query.filter_by(google_id=PROFILE["sub"]).count() == 1
+
+
+def test_rejects_id_token_for_another_client(client, google):
+    google.id_token_claims["aud"] = "someone-else"
+    response = _sign_in(client, google)
+    assert "error=oauth_failed" in response.headers["Location"]
+    assert User.query.count() == 0
+
+
+def test_slow_provider_times_out(app, client, google):
+    app.config["OAUTH_READ_TIMEOUT"] = 0.2
+    google.token_latency = 1
+    response = _sign_in(client, google)
+    assert "error=oauth_failed" in response.headers["Location"]
+
+
+def test_concurrent_first_use_builds_one_provider(app, google):
+    providers = []
+
+    def get():
+        with app.app_context():
+            providers.append(OAuthSignIn.get_provider("google"))
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(providers) == 8
+    assert all(isinstance(p, GoogleSignIn) for p in providers)
+    assert len({id(p) for p in providers}) == 1
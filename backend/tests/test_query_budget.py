@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import backend
+from backend.benchmarks import count_queries
+from backend.extensions import db
+from backend.tests.query_budget import RequestQueries, _check
+
+
+def test_requests_are_recorded_by_route(auth_client, queries):
+    with count_queries(db.engine) as counted:
+        auth_client.get("/api/auth/me?fresh=1")
+
+    assert queries.last.endpoint == "GET /api/auth/me"
+    assert queries.last.count == counted["count"]
+    assert len(queries.for_endpoint("POST /api/auth/login")) == 1  # From setup
+
+
+def test_over_budget_and_repeated_statements_are_reported():
+    lookup = "SELECT * FROM user_balance WHERE user_id = ?"
+    queries = RequestQueries("GET /api/billing/balance", ["SELECT 1"] + [lookup] * 3)
+
+    assert _check(queries, None) == []
+    over, repeated = _check(queries, 2)
+    assert over.startswith("GET /api/billing/balance ran 4 statements (budget 2)")
+    assert "1. SELECT 1" in over
+    assert "same statement 3 times (likely N+1)" in repeated
+    assert _check(RequestQueries("GET /", ["SELECT 1"]), 1) == []
+
+
+SUITE = """
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+app = Flask(__name__)
+engine = create_engine("sqlite://")
+
+
+def run(*statements):
+    with engine.connect() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+    return "ok"
+
+
+@app.route("/items")
+def items():
+    return run("SELECT 1", "SELECT 2", "SELECT 3")
+
+
+@app.route("/orders")
+def orders():
+    return run(*["SELECT 1"] * 3)
+
+
+def test_over_budget():
+    app.test_client().get("/items")
+
+
+@pytest.mark.query_budget({"GET /items": 3})
+def test_raised_budget():
+    app.test_client().get("/items")
+
+
+def test_unbudgeted_repeats_only_reported():
+    app.test_client().get("/orders")
+"""
+
+CONFTEST = """
+from backend.tests.query_budget import QueryBudgetPlugin
+
+
+def pytest_configure(config):
+    config.pluginmanager.register(QueryBudgetPlugin({"GET /items": 2}), "query_budget")
+"""
+
+
+def test_budgets_fail_tests_and_the_session_gets_a_report(pytester, monkeypatch):
+    monkeypatch.setenv("PYTHONPATH", str(Path(backend.__file__).parents[1]))
+    pytester.makeconftest(CONFTEST)
+    pytester.makepyfile(test_items=SUITE)
+
+    result = pytester.runpytest_subprocess("-p", "no:cacheprovider")
+
+    result.assert_outcomes(passed=2, failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "*GET /items ran 3 statements (budget 2)*",
+            "*SQL statements per request*",
+            "GET /items * 2 * 3.0 * 3 * 2",
+            "GET /orders * 1 * 3.0 * 3 * 1",
+            "Likely N+1 in GET /orders:",
+            "  SELECT 1",
+        ]
+    )
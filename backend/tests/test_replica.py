@@ -0,0 +1,135 @@
+import time
+
+import pytest
+from sqlalchemy import select
+
+from backend import create_app
+from backend.config import TestingConfig
+from backend.extensions import db
+from backend.models.billing import UserBalance
+from backend.models.user import User
+from backend.src.replica import STICKY_COOKIE, replica_reads
+from backend.tests.conftest import csrf_headers
+
+
+@pytest.fixture
+def app(tmp_path):
+    """A primary and a replica, as two SQLite files; nothing replicates."""
+    config = type(
+        "ReplicaConfig",
+        (TestingConfig,),
+        {
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+            "SQLALCHEMY_REPLICA_URI": f"sqlite:///{tmp_path / 'replica.db'}",
+        },
+    )
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines["replica"])
+        yield app
+        db.session.remove()
+    # init_app registered an (empty) metadata for the bind on the shared
+    # db; later apps without the bind would trip over it in create_all
+    db.metadatas.pop("replica", None)
+
+
+def _replicate(*tables):
+    """Copy the primary's rows of ``tables`` to the replica."""
+    replica = db.engines["replica"]
+    with replica.begin() as conn:
+        for table in tables:
+            rows = [row._asdict() for row in db.session.execute(select(table))]
+            conn.execute(table.delete())
+            if rows:
+                conn.execute(table.insert(), rows)
+
+
+def _set_replica_balance(user_id, amount):
+    with db.engines["replica"].begin() as conn:
+        conn.execute(
+            UserBalance.__table__.update()
+            .where(UserBalance.user_id == user_id)
+            .values(balance=amount)
+        )
+
+
+@pytest.fixture
+def user_id(user):
+    return user.id
+
+
+@pytest.fixture
+def logged_in(auth_client, user_id):
+    UserBalance.get_or_create(user_id)
+    db.session.commit()
+    _replicate(User.__table__, UserBalance.__table__)
+    auth_client.delete_cookie(STICKY_COOKIE)
+    # Requests reuse the fixture's app context, and so its session, which
+    # has written; a real request starts with a fresh one
+    db.session.remove()
+    return auth_client
+
+
+def test_replica_safe_views_read_the_replica(logged_in, user_id):
+    _set_replica_balance(user_id, "1.00")  # The replica lags behind
+
+    assert logged_in.get("/api/billing/balance").get_json()["balance"] == 1.0
+
+
+def test_client_reads_primary_after_writing(logged_in, user_id):
+    _set_replica_balance(user_id, "1.00")
+
+    response = logged_in.post(
+        "/api/billing/balance/add", json={"amount": 10}, headers=csrf_headers(logged_in)
+    )
+    assert response.status_code == 200
+    assert logged_in.get_cookie(STICKY_COOKIE) is not None
+
+    assert logged_in.get("/api/billing/balance").get_json()["balance"] == 15.0
+
+
+def test_stickiness_expires(logged_in, user_id):
+    _set_replica_balance(user_id, "1.00")
+    logged_in.set_cookie(STICKY_COOKIE, str(time.time() - 60))
+
+    assert logged_in.get("/api/billing/balance").get_json()["balance"] == 1.0
+
+
+@pytest.mark.query_budget({"GET /api/billing/balance": 5})  # Creates the row
+def test_reads_after_a_write_in_the_same_request_use_primary(logged_in):
+    with db.engines["replica"].begin() as conn:
+        conn.execute(UserBalance.__table__.delete())  # Not replicated yet
+
+    # The view creates the missing row, then must read it back from the primary
+    response = logged_in.get("/api/billing/balance")
+
+    assert response.status_code == 200
+    assert response.get_json()["balance"] == 5.0
+
+
+@pytest.mark.query_budget({"GET /api/auth/me": 3})  # ?fresh=1 also loads the row
+def test_user_lookup_reads_the_replica(logged_in):
+    with db.engines["replica"].begin() as conn:
+        conn.execute(User.__table__.update().values(name="Replica Name"))
+
+    response = logged_in.get("/api/auth/me?fresh=1")
+
+    assert response.get_json()["user"]["name"] == "Replica Name"
+
+
+def test_locking_reads_and_writes_use_primary(app, user_id):
+    _replicate(User.__table__)
+    with db.engines["replica"].begin() as conn:
+        conn.execute(User.__table__.update().values(name="Replica Name"))
+    db.session.remove()  # A fresh session, as at the start of a request
+
+    with replica_reads():
+        assert db.session.scalars(select(User.name)).one() == "Replica Name"
+        locked = db.session.scalars(select(User.name).with_for_update()).one()
+        assert locked == "Test User"
+        db.session.add(User(email="new@example.com", name="New"))
+        db.session.flush()
+        reread = db.session.scalars(select(User.name).where(User.id == user_id)).one()
+        assert reread == "Test User"
+    db.session.rollback()
@@ -0,0 +1,154 @@
+import os
+import stat
+import time
+
+import pytest
+from flask import Flask
+
+from backend import create_app
+from backend.benchmarks import count_queries
+from backend.config import TestingConfig
+from backend.extensions import db
+from backend.models.user import TokenBlocklist
+from backend.src.revocation_cache import RevocationCache
+from backend.tests.conftest import csrf_headers
+
+
+def test_logout_revokes_access_token(auth_client):
+    """A logged-out access token is rejected when presented again."""
+    token = auth_client.get_cookie("access_token_cookie").value
+    assert auth_client.get("/api/auth/me").status_code == 200
+
+    response = auth_client.post("/api/auth/logout", headers=csrf_headers(auth_client))
+    assert response.status_code == 200
+
+    auth_client.set_cookie("access_token_cookie", token)
+    assert auth_client.get("/api/auth/me").status_code == 401
+    # The second rejection is answered from the cache
+    assert auth_client.get("/api/auth/me").status_code == 401
+
+
+def test_unrevoked_tokens_skip_jti_lookup(auth_client):
+    """Valid tokens are cleared by the filter, not by a per-JTI query."""
+    auth_client.get("/api/auth/me")
+
+    with count_queries(db.engine, "token_blocklist") as queries:
+        for _ in range(5):
+            assert auth_client.get("/api/auth/me").status_code == 200
+
+    # Inside the sync window the blocklist is not queried at all
+    assert queries["count"] == 0
+
+
+def _revoke_elsewhere(client):
+    """Insert a blocklist row for ``client``'s token as another host would."""
+    from flask_jwt_extended import decode_token
+
+    token = client.get_cookie("access_token_cookie").value
+    db.session.add(TokenBlocklist(jti=decode_token(token)["jti"]))
+    db.session.commit()
+
+
+def test_revocation_from_another_host_applies_after_the_sync_window(
+    auth_client, monkeypatch
+):
+    assert auth_client.get("/api/auth/me").status_code == 200
+
+    _revoke_elsewhere(auth_client)
+    # Not seen until the host's next catch-up
+    assert auth_client.get("/api/auth/me").status_code == 200
+
+    later = time.time() + TestingConfig.REVOCATION_CACHE_SYNC_SECONDS + 0.1
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert auth_client.get("/api/auth/me").status_code == 401
+
+
+def test_zero_sync_window_applies_other_hosts_revocations_at_once():
+    class StrictConfig(TestingConfig):
+        REVOCATION_CACHE_SYNC_SECONDS = 0
+
+    app = create_app(StrictConfig)
+    with app.app_context():
+        db.create_all()
+        from backend.models.user import User
+
+        user = User(email="strict@example.com")
+        user.set_password("password")
+        db.session.add(user)
+        db.session.commit()
+        client = app.test_client()
+        client.post(
+            "/api/auth/login", json={"email": user.email, "password": "password"}
+        )
+
+        with count_queries(db.engine, "token_blocklist") as queries:
+            for _ in range(3):
+                assert client.get("/api/auth/me").status_code == 200
+        # One catch-up probe per request, never a lookup by jti
+        assert queries["count"] == 3
+        assert not any("token_blocklist.jti =" in q for q in queries["statements"])
+
+        _revoke_elsewhere(client)
+        assert client.get("/api/auth/me").status_code == 401
+        db.drop_all()
+
+
+def _worker_app(path):
+    app = Flask(__name__)
+    app.config.update(
+        REVOCATION_CACHE_PATH=str(path),
+        REVOCATION_CACHE_CAPACITY=1000,
+        REVOCATION_CACHE_SYNC_SECONDS=0,
+    )
+    return app
+
+
+def test_cache_is_shared_through_file(tmp_path):
+    """Two workers mapping the same file see each other's revocations."""
+    path = tmp_path / "revocations.bin"
+    first = RevocationCache(_worker_app(path))
+    second = RevocationCache(_worker_app(path))
+
+    first.sync(lambda after_id: [(1, "existing-jti")])
+    assert second.lookup("existing-jti") is None  # in filter, not in LRU
+    assert second.lookup("unknown-jti") is False
+
+    first.add("revoked-jti")
+    assert second.lookup("revoked-jti") is True
+
+    first.close()
+    second.close()
+
+
+def test_sync_waits_for_rows_committed_out_of_order(tmp_path):
+    cache = RevocationCache(_worker_app(tmp_path / "revocations.bin"))
+    cache.sync(lambda after_id: [(1, "a")])
+    # id 2 is still uncommitted elsewhere; 3 committed first
+    cache.sync(lambda after_id: [(3, "c")])
+    assert cache.info()["last_id"] == 1
+
+    seen = []
+    cache.sync(lambda after_id: seen.append(after_id) or [(2, "b"), (3, "c")])
+    assert seen == [1]
+    assert cache.info()["last_id"] == 3
+    cache.close()
+
+
+def test_refuses_file_accessible_to_others(tmp_path):
+    path = tmp_path / "revocations.bin"
+    path.write_bytes(b"")
+    os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IWOTH)
+
+    with pytest.raises(RuntimeError):
+        RevocationCache(_worker_app(path))
+
+
+def test_refuses_symlink(tmp_path):
+    target = tmp_path / "elsewhere.bin"
+    target.write_bytes(b"")
+    os.chmod(target, 0o600)
+    link = tmp_path / "revocations.bin"
+    link.symlink_to(target)
+
+    with pytest.raises(OSError):
+        RevocationCache(_worker_app(link))
@@ -0,0 +1,28 @@
+import pytest
+
+from backend import create_app
+from backend.config import ProductionConfig
+from backend.src.startup_profile import profile_startup
+
+
+def test_startup_defers_heavy_sdks():
+    # Wall time depends on the host; which modules load does not
+    report = profile_startup("backend.config.TestingConfig")
+
+    assert report["deferred_loaded"] == [], report
+
+
+def test_db_commands_load_flask_migrate_on_demand(app):
+    result = app.test_cli_runner().invoke(args=["db", "heads"])
+
+    assert result.exit_code == 0, result.output
+    assert "(head)" in result.output
+    assert app.extensions["migrate"].directory.endswith("migrations")
+
+
+def test_production_requires_database_url(monkeypatch):
+    # Importing the config never fails; building the app without a database does
+    monkeypatch.setattr(ProductionConfig, "SQLALCHEMY_DATABASE_URI", None)
+
+    with pytest.raises(ValueError, match="DATABASE_URL"):
+        create_app(ProductionConfig)
@@ -0,0 +1,58 @@
+import pytest
+
+from backend.benchmarks.fake_stripe import FakeStripe
+from backend.extensions import db, stripe_gateway
+from backend.tests.conftest import csrf_headers
+
+
+@pytest.fixture
+def fake_stripe(app):
+    with FakeStripe(latency=0.2) as fake:
+        app.config["STRIPE_API_BASE"] = fake.url
+        app.config["STRIPE_SECRET_KEY"] = "sk_test_fake"
+        stripe_gateway.init_app(app)
+        yield fake
+    stripe_gateway.shutdown()
+
+
+def _payment_sheet(client, **headers):
+    return client.post(
+        "/api/billing/create-payment-sheet",
+        json={"amount": 12.5},
+        headers={**csrf_headers(client), **headers},
+    )
+
+
+def test_payment_sheet_skips_retrieve_and_runs_calls_concurrently(
+    auth_client, user, fake_stripe
+):
+    body = _payment_sheet(auth_client).get_json()
+    assert body["customer"] == user.stripe_customer_id == "cus_1"
+    assert body["paymentIntent"].startswith("pi_")
+    assert body["ephemeralKey"].startswith("ek_test_")
+
+    fake_stripe.calls.clear()
+    _payment_sheet(auth_client)
+    # Returning customer: no Customer.retrieve, and the two creates overlap
+    assert sorted(path for _, path, _ in fake_stripe.calls) == [
+        "/v1/ephemeral_keys",
+        "/v1/payment_intents",
+    ]
+    assert fake_stripe.max_concurrency == 2
+
+
+def test_idempotency_key_is_forwarded_to_stripe(auth_client, user, fake_stripe):
+    _payment_sheet(auth_client, **{"Idempotency-Key": "sheet-1"})
+    keys = {path: key for _, path, key in fake_stripe.calls}
+    assert keys["/v1/customers"] == f"customer:{user.id}:sheet-1"
+    assert keys["/v1/payment_intents"] == f"payment_intent:{user.id}:sheet-1"
+
+
+def test_stripe_failure_is_a_500(auth_client, user, fake_stripe):
+    user.stripe_customer_id = "cus_existing"
+    db.session.commit()
+    stripe_gateway.config["api_base"] = "http://127.0.0.1:9"  # Nothing listens
+    stripe_gateway.config["max_network_retries"] = 0
+    stripe_gateway.shutdown()
+
+    assert _payment_sheet(auth_client).status_code == 500
@@ -0,0 +1,87 @@
+from unittest import mock
+
+import jwt
+import pytest
+
+from backend.benchmarks.fake_jwks import FakeJWKS
+from backend.extensions import apple_jwks, verified_tokens
+from backend.src.auth import validate_apple_token
+from backend.src.token_memo import VerifiedTokenCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def idp(app):
+    with FakeJWKS() as idp:
+        apple_jwks.configure(url=idp.jwks_url)
+        app.debug = False
+        yield idp
+
+
+def _token(idp, **claims):
+    return idp.sign(
+        {"iss": "https://appleid.apple.com", "aud": "com.example", "sub": "a1", **claims}
+    )
+
+
+def test_repeat_tokens_skip_verification(idp):
+    token = _token(idp)
+    with mock.patch("backend.src.auth.jwt.decode", wraps=jwt.decode) as decode:
+        first = validate_apple_token(token, "com.example")
+        second = validate_apple_token(token, "com.example")
+    assert first == second
+    assert decode.call_count == 1
+    assert verified_tokens.stats["hits"] == 1
+
+
+def test_cached_claims_are_copies(idp):
+    token = _token(idp)
+    validate_apple_token(token, "com.example")["sub"] = "someone-else"
+    assert validate_apple_token(token, "com.example")["sub"] == "a1"
+
+
+def test_failures_are_not_cached(idp):
+    token = _token(idp)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            validate_apple_token(token, "com.other")
+    assert len(verified_tokens) == 0
+
+
+def test_settings_are_part_of_the_key(idp):
+    token = _token(idp)
+    validate_apple_token(token, "com.example")
+    with pytest.raises(ValueError):
+        validate_apple_token(token, "com.other")  # Not served from the memo
+
+
+def test_entries_end_at_token_expiry():
+    clock = Clock()
+    cache = VerifiedTokenCache(clock=clock)
+    cache.put(b"short", {"exp": clock.now + 10})
+    cache.put(b"long", {"exp": clock.now + 10_000})
+
+    clock.now += 11
+    assert cache.get(b"short") is None
+    assert cache.get(b"long") is not None
+    clock.now += cache.ttl
+    assert cache.get(b"long") is None  # Capped by the TTL
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = VerifiedTokenCache()
+    cache.maxsize = 2
+    cache.put(b"a", {})
+    cache.put(b"b", {})
+    cache.get(b"a")
+    cache.put(b"c", {})
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") is not None
+    assert len(cache) == 2
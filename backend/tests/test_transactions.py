@@ -0,0 +1,73 @@
+from sqlalchemy import text
+
+from backend.extensions import db
+from backend.models.billing import Transaction, TransactionType, UserBalance
+
+
+def _seed(user, count, application="speech"):
+    for i in range(count):
+        UserBalance.record(
+            user.id, "1.00", TransactionType.PURCHASE, application=application
+        )
+    db.session.commit()
+
+
+def _pages(client, query="", rows=10, limit=4):
+    pages, cursor = [], None
+    # A pagination bug must fail the test, not loop forever
+    for _ in range(rows // limit + 2):
+        url = f"/api/billing/transactions?limit={limit}{query}"
+        if cursor:
+            url += f"&cursor={cursor}"
+        body = client.get(url).get_json()
+        pages.append(body["transactions"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            return pages
+    raise AssertionError(f"Pagination did not terminate: {pages}")
+
+
+def test_keyset_pagination_visits_every_row_once(auth_client, user):
+    # Rows created within the same second share created_at; ids break the tie
+    _seed(user, 10)
+    created = {t.created_at for t in Transaction.query.all()}
+    assert len(created) < 10
+
+    pages = _pages(auth_client)
+
+    ids = [t["id"] for page in pages for t in page]
+    assert [len(page) for page in pages] == [4, 4, 2]
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 10
+
+
+def test_application_filter_and_page_size_cap(app, auth_client, user):
+    _seed(user, 3, application="speech")
+    _seed(user, 2, application="autodraft")
+    app.config["TRANSACTIONS_MAX_PAGE_SIZE"] = 2
+
+    pages = _pages(auth_client, "&application=autodraft", rows=2)
+    assert [[t["application"] for t in page] for page in pages] == [
+        ["autodraft", "autodraft"]
+    ]
+
+    body = auth_client.get("/api/billing/transactions?limit=100").get_json()
+    assert len(body["transactions"]) == 2
+
+
+def test_invalid_cursor(auth_client):
+    response = auth_client.get("/api/billing/transactions?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+def test_history_query_uses_composite_index(app, user):
+    plan = db.session.execute(
+        text(
+            "EXPLAIN QUERY PLAN SELECT * FROM \"transaction\" "
+            "WHERE user_id = 1 AND application = 'speech' "
+            "ORDER BY created_at DESC, id DESC LIMIT 5"
+        )
+    ).all()
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_transaction_user_app_created" in details
+    assert "TEMP B-TREE" not in details
@@ -0,0 +1,107 @@
+import random
+from decimal import Decimal
+
+from backend.benchmarks import count_queries
+from backend.cli import rebuild_summary
+from backend.extensions import db
+from backend.models.billing import (
+    InsufficientBalanceError,
+    TransactionStatus,
+    TransactionType,
+    UsageRollup,
+    UserBalance,
+)
+from backend.models.user import User
+
+
+def _rollup_rows():
+    return sorted(
+        (
+            r.user_id,
+            r.day.isoformat(),
+            r.application,
+            r.operation,
+            r.transaction_type.name,
+            r.count,
+            Decimal(r.total),
+        )
+        for r in UsageRollup.query.all()
+    )
+
+
+def _recomputed_rows():
+    return sorted(
+        (user_id, str(day), application, operation, kind.name, count, Decimal(total))
+        for user_id, day, application, operation, kind, count, total in db.session.execute(
+            UsageRollup.recompute()
+        )
+    )
+
+
+def _random_ledger(user_ids, entries=200):
+    random.seed(7)
+    for _ in range(entries):
+        kind = random.choice(list(TransactionType))
+        try:
+            UserBalance.record(
+                random.choice(user_ids),
+                f"{random.randint(1, 300) / 100:.2f}",
+                kind,
+                status=random.choice(
+                    [TransactionStatus.COMPLETED] * 4 + [TransactionStatus.FAILED]
+                ),
+                application=random.choice(["speech", "autodraft"]),
+                operation=random.choice([None, "transcribe", "draft"]),
+            )
+        except InsufficientBalanceError:
+            pass
+        db.session.commit()
+
+
+def test_incremental_rollups_match_a_full_recompute(app, user):
+    other = User(email="other@example.com", name="Other")
+    db.session.add(other)
+    db.session.commit()
+
+    _random_ledger([user.id, other.id])
+
+    assert _rollup_rows() == _recomputed_rows()
+    assert len(_rollup_rows()) > 10
+
+
+def test_rebuild_command_restores_the_rollup(app, user):
+    _random_ledger([user.id], entries=50)
+    expected = _rollup_rows()
+    db.session.execute(db.delete(UsageRollup))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(rebuild_summary)
+    assert result.exit_code == 0, result.output
+    assert _rollup_rows() == expected
+
+
+def test_summary_endpoint_reads_only_the_rollup(auth_client, user):
+    for amount, operation in [("1.50", "transcribe"), ("2.25", "transcribe"), ("1.00", None)]:
+        UserBalance.record(
+            user.id, amount, TransactionType.USAGE, application="speech", operation=operation
+        )
+    UserBalance.record(user.id, "10.00", TransactionType.PURCHASE, application="platform")
+    db.session.commit()
+
+    with count_queries(db.engine, '"transaction"') as queries:
+        body = auth_client.get("/api/billing/summary").get_json()
+    assert queries["count"] == 0
+
+    assert body["applications"]["speech"] == {
+        "purchase": 0.0,
+        "usage": 4.75,
+        "refund": 0.0,
+        "count": 3,
+    }
+    assert body["applications"]["platform"]["purchase"] == 10.0
+    transcribe = [d for d in body["daily"] if d["operation"] == "transcribe"]
+    assert transcribe[0]["count"] == 2 and transcribe[0]["total"] == 3.75
+
+    body = auth_client.get("/api/billing/summary?application=platform").get_json()
+    assert list(body["applications"]) == ["platform"]
+    assert auth_client.get("/api/billing/summary?since=soon").status_code == 400
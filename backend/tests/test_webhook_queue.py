@@ -0,0 +1,111 @@
+import json
+from datetime import timedelta
+
+from backend.extensions import db
+from backend.models.billing import Transaction, UserBalance, WebhookEvent, WebhookStatus
+from backend.src import webhook_queue
+
+
+def _event(event_id, user_id, event_type="payment_intent.succeeded", amount=1000):
+    return {
+        "id": event_id,
+        "type": event_type,
+        "data": {
+            "object": {
+                "id": f"pi_{event_id}",
+                "amount": amount,
+                "metadata": {"user_id": str(user_id)},
+            }
+        },
+    }
+
+
+def _post(client, event):
+    return client.post(
+        "/api/billing/payment-webhook",
+        data=json.dumps(event),
+        content_type="application/json",
+    )
+
+
+def test_webhook_acks_before_applying_and_dedupes_replays(client, user):
+    event = _event("evt_1", user.id)
+    for _ in range(3):  # Stripe retry/replay burst
+        assert _post(client, event).status_code == 200
+    assert _post(client, _event("evt_2", user.id, "charge.updated")).status_code == 200
+
+    assert WebhookEvent.query.count() == 1
+    assert Transaction.query.count() == 0
+
+    report = webhook_queue.drain()
+    assert report["processed"] == 1
+    assert UserBalance.query.filter_by(user_id=user.id).one().balance == 15
+    assert WebhookEvent.query.one().status == WebhookStatus.DONE
+
+    # Applied events are never applied again
+    assert _post(client, event).status_code == 200
+    assert webhook_queue.drain()["processed"] == 0
+    assert Transaction.query.count() == 1
+
+
+def test_failures_back_off_then_dead_letter(app, client, user):
+    app.config["WEBHOOK_MAX_ATTEMPTS"] = 2
+    event = _event("evt_bad", user.id)
+    event["data"]["object"]["metadata"] = {}  # No user to credit
+    _post(client, event)
+
+    assert webhook_queue.drain()["retrying"] == 1
+    queued = WebhookEvent.query.one()
+    assert queued.status == WebhookStatus.PENDING
+    assert "KeyError" in queued.last_error
+    # Not due again until the backoff has passed
+    assert webhook_queue.drain()["batches"] == 0
+
+    queued.available_at -= timedelta(seconds=60)
+    db.session.commit()
+    assert webhook_queue.drain()["dead"] == 1
+    assert webhook_queue.queue_stats()["dead"] == 1
+    assert Transaction.query.count() == 0
+
+    assert webhook_queue.requeue_dead() == 1
+    assert WebhookEvent.query.one().status == WebhookStatus.PENDING
+
+
+def test_expired_lease_is_reclaimed(app, client, user):
+    _post(client, _event("evt_1", user.id))
+    # A worker claims the event and dies before processing it
+    assert webhook_queue.claim_batch(10, lease_seconds=60)
+    assert webhook_queue.drain()["batches"] == 0
+
+    claimed = WebhookEvent.query.one()
+    claimed.available_at -= timedelta(seconds=120)
+    db.session.commit()
+    assert webhook_queue.drain()["processed"] == 1
+    assert WebhookEvent.query.one().attempts == 2
+
+
+def test_worker_that_lost_its_lease_does_not_credit_again(client, user, monkeypatch):
+    apply = webhook_queue.HANDLERS["payment_intent.succeeded"]
+    calls = []
+
+    def slow_handler(payment_intent):
+        calls.append(payment_intent["id"])
+        if len(calls) == 1:
+            # The lease runs out mid-handler and another worker finishes the event
+            claimed = WebhookEvent.query.one()
+            claimed.available_at -= timedelta(seconds=120)
+            db.session.commit()
+            assert webhook_queue.drain()["processed"] == 1
+        apply(payment_intent)
+
+    monkeypatch.setitem(webhook_queue.HANDLERS, "payment_intent.succeeded", slow_handler)
+    _post(client, _event("evt_1", user.id))
+
+    report = webhook_queue.drain()
+
+    assert report["lease_lost"] == 1 and report["processed"] == 0
+    assert len(calls) == 2
+    assert Transaction.query.count() == 1
+    assert UserBalance.query.filter_by(user_id=user.id).one().balance == 15
+    event = WebhookEvent.query.one()
+    assert (event.status, event.attempts) == (WebhookStatus.DONE, 2)